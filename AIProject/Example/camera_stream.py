@@ -1,18 +1,40 @@
+import argparse
+import sys
+from pathlib import Path
+
 import cv2
 
+# Shared frame sources (webcam, video file, image folder, synthetic) live in SAM3_GUI
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "SAM3_GUI"))
+from frame_source import add_source_arguments, open_source, source_options
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Camera stream viewer")
+    parser.add_argument("source", nargs="?", default="0",
+                        help="camera index, video file, image folder or synthetic[:WxH[@FPS]]")
+    add_source_arguments(parser)
+    return parser.parse_args()
+
+
 def main():
-    # Open the default camera (usually index 0)
-    cap = cv2.VideoCapture(0)
+    args = parse_args()
+
+    # Open the source (usually camera index 0) with a background prefetch thread
+    cap = open_source(args.source, **source_options(args))
 
-    if not cap.isOpened():
+    if not cap.start():
         print("Error: Could not open camera.")
         return
 
+    print(f"Source: {cap.describe()}")
+    for key, (wanted, got) in cap.info.get('mismatch', {}).items():
+        print(f"Warning: requested {key} {wanted}, camera gave {got}")
     print("Press 'q' to quit.")
 
     while True:
         # Capture frame-by-frame
-        ret, frame = cap.read()
+        ret, frame, _ = cap.read()
 
         if not ret:
             print("Error: Can't receive frame (stream end?). Exiting ...")
@@ -1,19 +1,15 @@
 import customtkinter as ctk
 import cv2
 from PIL import Image, ImageTk
-import numpy as np
 import threading
 import os
+import sys
 import time
-import warnings
-from tf_keras.models import load_model
+from pathlib import Path
 
-# Environment setup to suppress warnings
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
-import tensorflow as tf
-tf.get_logger().setLevel('ERROR')
-warnings.filterwarnings("ignore")
+# Shared Teachable Machine engine (Keras, or TFLite when TM_BACKEND=float16|int8) lives at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tm_engine import load_engine
 
 # Configuration
 MODEL_PATH = r"D:\AWORKSPACE\Github\Project2026-01-08\HarryAIProject\keras_model.h5"
@@ -42,8 +38,7 @@ class AIApp(ctk.CTk):
         # Variables
         self.cap = None
         self.is_running = False
-        self.model = None
-        self.class_names = []
+        self.engine = None
         self.current_frame = None
 
         # --- Sidebar ---
@@ -115,11 +110,8 @@ class AIApp(ctk.CTk):
             if not os.path.exists(labels_path):
                  raise FileNotFoundError(f"Labels not found at {labels_path}")
             
-            self.model = load_model(model_path, compile=False)
-            
-            with open(labels_path, "r", encoding="utf-8") as f:
-                self.class_names = [line.strip() for line in f.readlines()]
-                
+            self.engine = load_engine(model_path, labels_path)
+
             self.load_info_label.configure(text="Model Loaded Successfully", text_color="green")
             self.status_label.configure(text="Status: Ready")
         except Exception as e:
@@ -173,27 +165,12 @@ class AIApp(ctk.CTk):
             self.after(30, self.update_video)
 
     def process_inference(self, pil_image):
-        if self.model and self.class_names:
+        if self.engine:
             try:
-                # Prepare image for model (224x224)
-                # Resize/Crop logic similar to tm.py
-                size = (224, 224)
-                image = pil_image.copy() # Use the PIL image we already have
-                image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
-                image_array = np.asarray(image)
-                normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
-                
-                data = np.ndarray(shape=(1, 224, 224, 3), dtype=np.float32)
-                data[0] = normalized_image_array
-
-                # Predict
-                prediction = self.model.predict(data, verbose=0)
-                index = np.argmax(prediction)
-                class_name = self.class_names[index]
-                confidence_score = prediction[0][index]
+                # Center-crop to 224x224, normalize and predict (same as tm.py)
+                (display_name, confidence_score), = self.engine.classify(pil_image, top_k=1)
 
                 # Update UI
-                display_name = class_name.split(" ", 1)[1] if " " in class_name else class_name
                 self.prediction_label.configure(text=display_name)
                 
                 # Update Bar color based on confidence
@@ -210,8 +187,6 @@ class AIApp(ctk.CTk):
             except Exception as e:
                 print(f"Inference Error: {e}")
 
-from PIL import ImageOps # Added missing import
-
 if __name__ == "__main__":
     app = AIApp()
     app.mainloop()
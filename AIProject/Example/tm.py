@@ -1,86 +1,206 @@
+import argparse
+import csv
+import json
 import os
-import warnings
-import numpy as np
-import tensorflow as tf
-from tf_keras.models import load_model
-from PIL import Image, ImageOps
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-# Suppress TensorFlow logging and warnings
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0' # Disable oneDNN custom operations messages
-tf.get_logger().setLevel('ERROR')
-warnings.filterwarnings("ignore")
+import cv2
+import numpy as np
 
-# Disable scientific notation for clarity
-np.set_printoptions(suppress=True)
+# Shared Teachable Machine engine (Keras, or TFLite when TM_BACKEND=float16|int8) lives at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tm_engine import list_images, load_engine, preprocess_frame
 
 # Try to find the files
 # 1. First try the path you provided
 # 2. If not found, try the directory where the script is located
-model_path = r"D:\AWORKSPACE\Github\Project2026-01-08\HarryAIProject\keras_model.h5"
-labels_path = r"D:\AWORKSPACE\Github\Project2026-01-08\HarryAIProject\labels.txt"
-
-if not os.path.exists(model_path):
-    # Fallback to local directory
-    local_model = os.path.join(os.path.dirname(__file__), "keras_model.h5")
-    if os.path.exists(local_model):
-        model_path = local_model
-        labels_path = os.path.join(os.path.dirname(__file__), "labels.txt")
-    else:
-        print(f"Error: Model file not found!")
-        print(f"Looked in: {model_path}")
-        print(f"And also: {local_model}")
+MODEL_PATH = r"D:\AWORKSPACE\Github\Project2026-01-08\HarryAIProject\keras_model.h5"
+LABELS_PATH = r"D:\AWORKSPACE\Github\Project2026-01-08\HarryAIProject\labels.txt"
+
+# Replace this with the path to your image (used when no paths are given on the command line)
+IMAGE_PATH = r"D:\user\Pictures\Camera Roll\WIN_20260108_14_19_16_Pro.jpg"
+
+
+def find_model_files(model_path=None, labels_path=None):
+    if model_path:
+        return model_path, labels_path
+    model_path, labels_path = MODEL_PATH, LABELS_PATH
+    if not os.path.exists(model_path):
+        # Fallback to local directory
+        local_model = os.path.join(os.path.dirname(__file__), "keras_model.h5")
+        if os.path.exists(local_model):
+            model_path = local_model
+            labels_path = os.path.join(os.path.dirname(__file__), "labels.txt")
+        else:
+            print(f"Error: Model file not found!")
+            print(f"Looked in: {model_path}")
+            print(f"And also: {local_model}")
+            exit()
+
+    if not os.path.exists(labels_path):
+        print(f"Error: Labels file not found at {labels_path}")
         exit()
+    return model_path, labels_path
 
-if not os.path.exists(labels_path):
-    print(f"Error: Labels file not found at {labels_path}")
-    exit()
-
-# Load the model
-model = load_model(model_path, compile=False)
-
-# Load the labels
-with open(labels_path, "r", encoding="utf-8") as f:
-    class_names = [line.strip() for line in f.readlines()]
 
-# Create the array of the right shape to feed into the keras model
-# The 'length' or number of images you can put into the array is
-# determined by the first position in the shape tuple, in this case 1
-data = np.ndarray(shape=(1, 224, 224, 3), dtype=np.float32)
+def read_image(path):
+    """BGR image or None; imdecode instead of imread so non-ASCII Windows paths work"""
+    try:
+        return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except (OSError, cv2.error):
+        return None
 
-# Replace this with the path to your image
-image_path = r"D:\user\Pictures\Camera Roll\WIN_20260108_14_19_16_Pro.jpg"
 
-if image_path == "<IMAGE_PATH>" or not os.path.exists(image_path):
-    print(f"Error: Please update <IMAGE_PATH> with a valid image file path. (Current: {image_path})")
-    exit()
-
-try:
-    image = Image.open(image_path).convert("RGB")
-except Exception as e:
-    print(f"Error opening image: {e}")
-    exit()
-
-# resizing the image to be at least 224x224 and then cropping from the center
-size = (224, 224)
-image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+def classify_one(engine, image_path, top_k):
+    image = read_image(image_path)
+    if image is None:
+        print(f"Error opening image: {image_path}")
+        exit()
 
-# turn the image into a numpy array
-image_array = np.asarray(image)
+    # Center-crop to the model input size, normalize and predict
+    for class_name, confidence_score in engine.classify(image, top_k=top_k):
+        # Print prediction and confidence score
+        print(f"Class: {class_name}")
+        print(f"Confidence Score: {confidence_score:.4f}")
+
+
+class ResultWriter:
+    """Streams one row per image to CSV (path, label_1, score_1, ..., error) or JSONL; "-" is CSV on stdout"""
+
+    def __init__(self, path, top_k):
+        self.jsonl = path.lower().endswith((".jsonl", ".ndjson"))
+        self.top_k = top_k
+        self.file = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        if not self.jsonl:
+            self.csv = csv.writer(self.file)
+            header = ["path"]
+            for rank in range(1, top_k + 1):
+                header += [f"label_{rank}", f"score_{rank}"]
+            self.csv.writerow(header + ["error"])
+
+    def write(self, path, results=(), error=""):
+        if self.jsonl:
+            row = {"path": path, "top_k": [{"label": name, "score": round(score, 6)} for name, score in results]}
+            if error:
+                row["error"] = error
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            row = [path]
+            for name, score in results:
+                row += [name, f"{score:.6f}"]
+            row += [""] * (1 + 2 * self.top_k - len(row))
+            self.csv.writerow(row + [error])
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def classify_batches(engine, files, writer, batch_size=32, workers=4, top_k=1):
+    """Decode + preprocess on a thread pool while the previous batch is in the model
+
+    Two (batch, h, w, 3) buffers alternate: the workers fill one (imdecode and resize
+    release the GIL) while the engine runs the other. Returns a summary dict.
+    """
+    width, height = engine.input_size
+    buffers = [np.empty((batch_size, height, width, 3), dtype=np.float32) for _ in range(2)]
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    stats = {"images": 0, "failed": 0, "infer_s": 0.0}
+
+    def load(buffer, index, path):
+        image = read_image(path)
+        if image is None:
+            return False
+        preprocess_frame(image, buffer[index])
+        return True
+
+    def submit(pool, number):
+        buffer = buffers[number % 2]
+        return [pool.submit(load, buffer, i, path) for i, path in enumerate(batches[number])]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = submit(pool, 0) if batches else []
+        for number, paths in enumerate(batches):
+            loaded = [future.result() for future in pending]
+            buffer = buffers[number % 2]
+            if number + 1 < len(batches):
+                pending = submit(pool, number + 1)
+
+            # Unreadable images leave gaps; pack the decoded slots to the front before predicting
+            good = [i for i, ok in enumerate(loaded) if ok]
+            if len(good) < len(loaded):
+                buffer[:len(good)] = buffer[good]
+            infer_start = time.perf_counter()
+            probs = engine.predict(buffer[:len(good)]) if good else []
+            stats["infer_s"] += time.perf_counter() - infer_start
+
+            results = iter(probs)
+            for path, ok in zip(paths, loaded):
+                if ok:
+                    writer.write(path, engine.top_k(next(results), top_k))
+                else:
+                    writer.write(path, error="unreadable")
+            writer.flush()
+
+            stats["images"] += len(good)
+            stats["failed"] += len(loaded) - len(good)
+            done = stats["images"] + stats["failed"]
+            rate = done / (time.perf_counter() - start)
+            print(f"\r{done}/{len(files)} images  {rate:.1f} img/s", end="", file=sys.stderr, flush=True)
+
+    stats["elapsed_s"] = time.perf_counter() - start
+    if files:
+        print(file=sys.stderr)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify images with a Teachable Machine model")
+    parser.add_argument("paths", nargs="*", help="image files, directories (recursive) or glob patterns")
+    parser.add_argument("--model", help="keras_model.h5 or .tflite (default: MODEL_PATH, then this folder)")
+    parser.add_argument("--labels", help="labels.txt (default: next to the model)")
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="decode/preprocess threads")
+    parser.add_argument("--output", default="-", help="results .csv or .jsonl (default: CSV to stdout)")
+    args = parser.parse_args()
+
+    model_path, labels_path = find_model_files(args.model, args.labels)
+
+    if not args.paths:
+        if IMAGE_PATH == "<IMAGE_PATH>" or not os.path.exists(IMAGE_PATH):
+            print(f"Error: Please update <IMAGE_PATH> with a valid image file path. (Current: {IMAGE_PATH})")
+            exit()
+        # Load the model and the labels
+        classify_one(load_engine(model_path, labels_path), IMAGE_PATH, args.top_k)
+        return
+
+    files = list_images(args.paths)
+    if not files:
+        print(f"Error: No images found in {args.paths}")
+        exit()
+    print(f"{len(files)} images, batch {args.batch_size}, {args.workers} workers", file=sys.stderr)
 
-# Normalize the image
-normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
+    # Load the model and the labels
+    engine = load_engine(model_path, labels_path, batch_size=args.batch_size)
+    writer = ResultWriter(args.output, args.top_k)
+    try:
+        stats = classify_batches(engine, files, writer, args.batch_size, args.workers, args.top_k)
+    finally:
+        writer.close()
 
-# Load the image into the array
-data[0] = normalized_image_array
+    elapsed = stats["elapsed_s"]
+    print(f"Classified {stats['images']} images ({stats['failed']} unreadable) in {elapsed:.1f} s: "
+          f"{stats['images'] / elapsed:.1f} img/s, model busy {stats['infer_s'] / elapsed:.0%} of the time",
+          file=sys.stderr)
 
-# Predicts the model
-prediction = model.predict(data, verbose=0)
-index = np.argmax(prediction)
-class_name = class_names[index]
-confidence_score = prediction[0][index]
 
-# Print prediction and confidence score
-display_name = class_name.split(" ", 1)[1] if " " in class_name else class_name
-print(f"Class: {display_name}")
-print(f"Confidence Score: {confidence_score:.4f}")
+if __name__ == "__main__":
+    main()
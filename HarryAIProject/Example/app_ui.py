@@ -1,16 +1,14 @@
 import customtkinter as ctk
 import cv2
 from PIL import Image, ImageOps
-import numpy as np
 import os
+import sys
 import threading
+from pathlib import Path
 
-# 嘗試匯入 tf_keras，如果失敗則提示使用者
-try:
-    from tf_keras.models import load_model
-except ImportError:
-    print("請先安裝 tf-keras: pip install tf-keras")
-    exit()
+# 共用的 Teachable Machine 引擎 (Keras，或 TM_BACKEND=float16 / int8 時用 TFLite) 放在專案根目錄
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tm_engine import load_engine
 
 class App(ctk.CTk):
     def __init__(self):
@@ -25,8 +23,7 @@ class App(ctk.CTk):
         ctk.set_default_color_theme("blue")
 
         # --- 載入模型 (背景執行以免卡住介面) ---
-        self.model = None
-        self.class_names = []
+        self.engine = None
         self.load_model_thread = threading.Thread(target=self.load_ai_model)
         self.load_model_thread.start()
 
@@ -100,11 +97,8 @@ class App(ctk.CTk):
             labels_path = os.path.join(project_root, "labels.txt")
 
             print(f"Loading model from: {model_path}...")
-            self.model = load_model(model_path, compile=False)
-            
-            with open(labels_path, "r", encoding="utf-8") as f:
-                self.class_names = f.readlines()
-            
+            self.engine = load_engine(model_path, labels_path)
+
             print("Model loaded successfully!")
             # 更新 UI 狀態 (非必要，但可以提示使用者)
             self.result_label.configure(text="AI 準備就緒")
@@ -139,7 +133,7 @@ class App(ctk.CTk):
 
     def predict_frame(self):
         """按下按鈕時進行辨識"""
-        if self.model is None:
+        if self.engine is None:
             self.result_label.configure(text="模型載入中...")
             return
             
@@ -147,30 +141,12 @@ class App(ctk.CTk):
             return
 
         try:
-            # 準備圖片資料
-            data = np.ndarray(shape=(1, 224, 224, 3), dtype=np.float32)
-            
-            # 裁切並縮放至 224x224 (模型需求)
-            image = ImageOps.fit(self.current_pil_image, (224, 224), Image.Resampling.LANCZOS)
-            image_array = np.asarray(image)
-            
-            #正規化
-            normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
-            data[0] = normalized_image_array
-
-            # 預測
-            prediction = self.model.predict(data, verbose=0)
-            index = np.argmax(prediction)
-            class_name = self.class_names[index].strip()
-            confidence_score = prediction[0][index]
-
-            # 更新 UI (去除標籤前面的編號 0, 1, ... 如果有的話)
-            # 假設 labels.txt 格式是 "0 ClassName"
-            display_name = class_name[2:] if len(class_name) > 2 else class_name
-            
+            # 裁切並縮放至 224x224、正規化後預測 (標籤前面的編號已去除)
+            (display_name, confidence_score), = self.engine.classify(self.current_pil_image, top_k=1)
+
             result_text = f"類別: {display_name}\n信心: {confidence_score:.2%}"
             self.result_label.configure(text=result_text)
-            print(f"Predicted: {class_name} ({confidence_score})")
+            print(f"Predicted: {display_name} ({confidence_score})")
 
         except Exception as e:
             print(f"Prediction error: {e}")
@@ -1,25 +1,86 @@
 import customtkinter as ctk
 import cv2
-from PIL import Image, ImageOps
-import numpy as np
+from PIL import Image
 import os
+import sys
 import threading
 import time
 from datetime import datetime
+from pathlib import Path
+
+# 共用的 Teachable Machine 引擎 (Keras，或 TM_BACKEND=float16 / int8 時用 TFLite) 放在專案根目錄
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tm_engine import load_engine
 
 # 設定主題
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
-# 嘗試匯入 tf_keras
-try:
-    from tf_keras.models import load_model
-except ImportError:
-    try:
-        from tensorflow.keras.models import load_model
-    except:
-        print("請確認已安裝 tensorflow 或 tf-keras")
-        exit()
+DEFAULT_PREDICT_RATE = 2.0  # 自動偵測每秒推論次數
+RESULT_POLL_MS = 30         # 主執行緒取回推論結果的間隔
+STATS_INTERVAL = 5.0        # 自動偵測時每隔幾秒在 log 顯示延遲與略過數
+
+
+class InferenceWorker(threading.Thread):
+    """常駐的推論執行緒：只保留最新一幀 (slot)，還沒推論就被新畫面覆蓋的計為略過
+
+    結果只存最新一筆，由主執行緒的 after 迴圈以 take_result 取回，worker 不直接碰 Tk。
+    """
+
+    def __init__(self, engine):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.cond = threading.Condition()
+        self.frame = None
+        self.result = None
+        self.running = True
+        self.skipped = 0
+        self.latencies = []
+
+    def submit(self, frame):
+        with self.cond:
+            if self.frame is not None:
+                self.skipped += 1
+            self.frame = frame
+            self.cond.notify()
+
+    def take_result(self):
+        """(名稱, 信心, 延遲 ms)；沒有新結果時為 None"""
+        with self.cond:
+            result, self.result = self.result, None
+        return result
+
+    def take_stats(self):
+        """上次呼叫後的延遲列表 (ms) 與略過幀數"""
+        with self.cond:
+            latencies, self.latencies = self.latencies, []
+            skipped, self.skipped = self.skipped, 0
+        return latencies, skipped
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and self.frame is None:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                frame, self.frame = self.frame, None
+            try:
+                start = time.perf_counter()
+                (name, confidence), = self.engine.classify(frame, top_k=1)
+                latency = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                print(f"Inference error: {e}")
+                continue
+            with self.cond:
+                self.result = (name, confidence, latency)
+                self.latencies.append(latency)
+
 
 class ModernApp(ctk.CTk):
     def __init__(self):
@@ -30,10 +91,13 @@ class ModernApp(ctk.CTk):
         self.geometry("1200x720")
         
         # 載入模型相關變數
-        self.model = None
-        self.class_names = []
+        self.engine = None
+        self.worker = None
+        self.current_frame = None
         self.is_auto_predict = False
         self.last_predict_time = 0
+        self.predict_rate = DEFAULT_PREDICT_RATE
+        self.last_stats_time = time.time()
         self.confidence_threshold = 0.7
 
         # --- 介面佈局 ---
@@ -45,7 +109,7 @@ class ModernApp(ctk.CTk):
         # =============================
         self.sidebar_frame = ctk.CTkFrame(self, width=250, corner_radius=0)
         self.sidebar_frame.grid(row=0, column=0, sticky="nsew")
-        self.sidebar_frame.grid_rowconfigure(4, weight=1)
+        self.sidebar_frame.grid_rowconfigure(6, weight=1)
 
         self.logo_label = ctk.CTkLabel(self.sidebar_frame, text="AI VISION", 
                                        font=ctk.CTkFont(size=24, weight="bold", family="Impact"))
@@ -70,16 +134,24 @@ class ModernApp(ctk.CTk):
         self.threshold_slider.set(0.7)
         self.threshold_slider.grid(row=4, column=0, padx=20, pady=(0, 20), sticky="ew")
 
+        self.rate_label = ctk.CTkLabel(self.sidebar_frame, text=f"偵測頻率: {self.predict_rate:g} 次/秒", anchor="w")
+        self.rate_label.grid(row=5, column=0, padx=20, pady=(0, 0), sticky="w")
+
+        self.rate_slider = ctk.CTkSlider(self.sidebar_frame, from_=1, to=30, number_of_steps=29,
+                                         command=self.update_rate_label)
+        self.rate_slider.set(self.predict_rate)
+        self.rate_slider.grid(row=6, column=0, padx=20, pady=(0, 20), sticky="new")
+
         self.predict_btn = ctk.CTkButton(self.sidebar_frame, text="手動掃描 (SCAN)",
                                          height=50,
                                          fg_color="#2962FF", hover_color="#0039CB",
                                          font=ctk.CTkFont(size=16, weight="bold"),
                                          command=self.predict_frame)
-        self.predict_btn.grid(row=5, column=0, padx=20, pady=20, sticky="ew")
+        self.predict_btn.grid(row=7, column=0, padx=20, pady=20, sticky="ew")
 
         self.status_label = ctk.CTkLabel(self.sidebar_frame, text="系統狀態: 初始化...", 
                                          text_color="orange", anchor="w")
-        self.status_label.grid(row=6, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.status_label.grid(row=8, column=0, padx=20, pady=(0, 20), sticky="ew")
 
         # =============================
         # 2. 右側主內容區
@@ -149,14 +221,14 @@ class ModernApp(ctk.CTk):
             labels_path = os.path.join(project_root, "labels.txt")
 
             print(f"Loading model from: {model_path}")
-            self.model = load_model(model_path, compile=False)
-            
-            with open(labels_path, "r", encoding="utf-8") as f:
-                self.class_names = f.readlines()
-            
+            self.engine = load_engine(model_path, labels_path)
+            self.worker = InferenceWorker(self.engine)
+            self.worker.start()
+            self.after(RESULT_POLL_MS, self.poll_results)
+
             self.status_label.configure(text="狀態: 系統就緒", text_color="#00E676")
             self.log_message(f"Model loaded: {os.path.basename(model_path)}")
-            self.log_message(f"Classes found: {len(self.class_names)}")
+            self.log_message(f"Classes found: {len(self.engine.labels)}")
             
         except Exception as e:
             self.status_label.configure(text="狀態: 模型錯誤", text_color="red")
@@ -167,10 +239,17 @@ class ModernApp(ctk.CTk):
         self.confidence_threshold = value
         self.slider_label.configure(text=f"信心門檻: {int(value*100)}%")
 
+    def update_rate_label(self, value):
+        self.predict_rate = value
+        self.rate_label.configure(text=f"偵測頻率: {value:g} 次/秒")
+
     def toggle_auto_predict(self):
         self.is_auto_predict = self.auto_switch_var.get()
         if self.is_auto_predict:
-            self.log_message("Auto-detection mode: ON")
+            if self.worker:
+                self.worker.take_stats()  # 統計從開啟自動偵測時算起
+            self.last_stats_time = time.time()
+            self.log_message(f"Auto-detection mode: ON ({self.predict_rate:g}/s)")
             self.predict_btn.configure(state="disabled", fg_color="gray")
         else:
             self.log_message("Auto-detection mode: OFF")
@@ -190,7 +269,8 @@ class ModernApp(ctk.CTk):
             self.prev_time = curr_time
             self.fps_label.configure(text=f"FPS: {int(fps)}")
 
-            # 轉 RGB
+            # 推論直接用 BGR 畫面 (引擎自己做裁切縮放)，轉 RGB 只為了顯示
+            self.current_frame = frame
             image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             self.current_pil_image = Image.fromarray(image)
 
@@ -213,40 +293,36 @@ class ModernApp(ctk.CTk):
                 ctk_img = ctk.CTkImage(light_image=pil_resized, size=(new_w, new_h))
                 self.camera_label.configure(image=ctk_img)
 
-            if self.is_auto_predict and (curr_time - self.last_predict_time > 0.5):
+            if self.is_auto_predict and (curr_time - self.last_predict_time >= 1 / self.predict_rate):
                 self.predict_frame()
                 self.last_predict_time = curr_time
         
         self.after(10, self.update_camera)
 
     def predict_frame(self):
-        if self.model is None or not hasattr(self, 'current_pil_image'):
+        if self.worker is None or self.current_frame is None:
             return
-        
-        # 這裡推論使用線程是安全的，因為我們會在回調中使用 after 更新 UI
-        threading.Thread(target=self._run_inference).start()
 
-    def _run_inference(self):
-        try:
-            data = np.ndarray(shape=(1, 224, 224, 3), dtype=np.float32)
-            image = ImageOps.fit(self.current_pil_image, (224, 224), Image.Resampling.LANCZOS)
-            image_array = np.asarray(image)
-            normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
-            data[0] = normalized_image_array
+        # 交給常駐的推論執行緒；上一幀還沒開始推論時會被這一幀取代
+        self.worker.submit(self.current_frame)
 
-            prediction = self.model.predict(data, verbose=0)
-            index = np.argmax(prediction)
-            raw_class_name = self.class_names[index].strip()
-            confidence = prediction[0][index]
-            display_name = raw_class_name[2:] if len(raw_class_name) > 2 else raw_class_name
+    def poll_results(self):
+        """主執行緒唯一的結果回調：取回最新結果更新 UI，自動偵測時定期輸出延遲統計"""
+        result = self.worker.take_result()
+        if result is not None:
+            self._update_results(*result)
 
-            # 關鍵修正: 在主線程更新 UI
-            self.after(0, lambda: self._update_results(display_name, confidence))
+        now = time.time()
+        if self.is_auto_predict and now - self.last_stats_time >= STATS_INTERVAL:
+            latencies, skipped = self.worker.take_stats()
+            if latencies:
+                self.log_message(f"Inference: {len(latencies)} runs, avg {sum(latencies) / len(latencies):.1f} ms, "
+                                 f"max {max(latencies):.1f} ms, skipped {skipped} frames")
+            self.last_stats_time = now
 
-        except Exception as e:
-            print(f"Inference error: {e}")
+        self.after(RESULT_POLL_MS, self.poll_results)
 
-    def _update_results(self, name, confidence):
+    def _update_results(self, name, confidence, latency):
         if confidence < self.confidence_threshold:
             color = "#FF3D00"
             status_text = f"Low Confidence ({name})"
@@ -254,7 +330,7 @@ class ModernApp(ctk.CTk):
             color = "#00E676"
             status_text = name
             if not self.is_auto_predict:
-                 self.log_message(f"Detected: {name} ({confidence:.2%})")
+                 self.log_message(f"Detected: {name} ({confidence:.2%}, {latency:.0f} ms)")
             
         self.class_label.configure(text=status_text, text_color=color)
         self.conf_label.configure(text=f"Confidence: {confidence:.2%}")
@@ -262,6 +338,9 @@ class ModernApp(ctk.CTk):
         self.conf_bar.configure(progress_color=color)
 
     def on_closing(self):
+        if self.worker:
+            self.worker.stop()
+            self.worker.join(timeout=1.0)
         self.cap.release()
         self.destroy()
 
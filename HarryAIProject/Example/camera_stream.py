@@ -1,15 +1,37 @@
+import argparse
+import sys
+from pathlib import Path
+
 import cv2
 
+# 共用的影像來源 (攝影機、影片檔、圖片資料夾、合成畫面) 放在 SAM3_GUI
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "SAM3_GUI"))
+from frame_source import add_source_arguments, open_source, source_options
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="攝影機串流")
+    parser.add_argument("source", nargs="?", default="1",
+                        help="攝影機索引、影片檔、圖片資料夾或 synthetic[:WxH[@FPS]]")
+    add_source_arguments(parser)
+    return parser.parse_args()
+
+
 def main():
-    # 開啟攝影機 (0 通常是預設攝影機)
-    cap = cv2.VideoCapture(1)
-    if not cap.isOpened():
+    args = parse_args()
+
+    # 開啟影像來源 (0 通常是預設攝影機)，背景執行緒預先讀取
+    cap = open_source(args.source, **source_options(args))
+    if not cap.start():
         print("錯誤：無法開啟攝影機。")
         return
+    print(f"影像來源：{cap.describe()}")
+    for key, (wanted, got) in cap.info.get('mismatch', {}).items():
+        print(f"注意：要求 {key} {wanted}，實際為 {got}")
     print("攝影機已開啟。按下 'q' 鍵可退出視窗。")
     while True:
         # 逐幀捕獲影像
-        ret, frame = cap.read()
+        ret, frame, _ = cap.read()
         if not ret:
             print("錯誤：無法接收串流幀。")
             break
@@ -1,15 +1,15 @@
-from keras.models import load_model  # TensorFlow is required for Keras to work
-import cv2  # Install opencv-python
-import numpy as np
+import sys
+from pathlib import Path
 
-# Disable scientific notation for clarity
-np.set_printoptions(suppress=True)
+import cv2  # Install opencv-python
 
-# Load the model
-model = load_model("keras_Model.h5", compile=False)
+# 共用的 Teachable Machine 引擎 (Keras，或 TM_BACKEND=float16 / int8 時用 TFLite) 放在專案根目錄
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tm_engine import find_model, load_engine
 
-# Load the labels
-class_names = open("labels.txt", "r").readlines()
+# Load the model and the labels
+model_path, labels_path = find_model("keras_Model.h5", "keras_model.h5", Path(__file__).resolve().parents[1])
+engine = load_engine(model_path, labels_path)
 
 # CAMERA can be 0 or 1 based on default camera of your computer
 camera = cv2.VideoCapture(0)
@@ -18,27 +18,15 @@ while True:
     # Grab the webcamera's image.
     ret, image = camera.read()
 
-    # Resize the raw image into (224-height,224-width) pixels
-    image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_AREA)
-
     # Show the image in a window
     cv2.imshow("Webcam Image", image)
 
-    # Make the image a numpy array and reshape it to the models input shape.
-    image = np.asarray(image, dtype=np.float32).reshape(1, 224, 224, 3)
-
-    # Normalize the image array
-    image = (image / 127.5) - 1
-
-    # Predicts the model
-    prediction = model.predict(image)
-    index = np.argmax(prediction)
-    class_name = class_names[index]
-    confidence_score = prediction[0][index]
+    # Center-crop to the model input size, normalize and predict
+    (class_name, confidence_score), = engine.classify(image, top_k=1)
 
     # Print prediction and confidence score
-    print("Class:", class_name[2:], end="")
-    print("Confidence Score:", str(np.round(confidence_score * 100))[:-2], "%")
+    print("Class:", class_name, end=" ")
+    print("Confidence Score:", f"{confidence_score * 100:.0f}", "%")
 
     # Listen to the keyboard for presses.
     keyboard_input = cv2.waitKey(1)
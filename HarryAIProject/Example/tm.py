@@ -1,11 +1,11 @@
-from tf_keras.models import load_model  # TensorFlow is required for Keras to work
-from PIL import Image, ImageOps  # Install pillow instead of PIL
-import numpy as np
 import cv2
 import os
+import sys
+from pathlib import Path
 
-# Disable scientific notation for clarity
-np.set_printoptions(suppress=True)
+# 共用的 Teachable Machine 引擎 (Keras，或 TM_BACKEND=float16 / int8 時用 TFLite) 放在專案根目錄
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tm_engine import load_engine
 
 # Determine the path relative to this script file
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,13 +16,7 @@ model_path = os.path.join(project_root, "keras_model.h5")
 labels_path = os.path.join(project_root, "labels.txt")
 
 print(f"Loading model from: {model_path}")
-model = load_model(model_path, compile=False)
-
-# Load the labels
-class_names = open(labels_path, "r", encoding="utf-8").readlines()
-
-# Create the array of the right shape to feed into the keras model
-data = np.ndarray(shape=(1, 224, 224, 3), dtype=np.float32)
+engine = load_engine(model_path, labels_path)
 
 # Open camera
 cap = cv2.VideoCapture(0)
@@ -39,31 +33,11 @@ while True:
         print("Can't receive frame (stream end?). Exiting ...")
         break
 
-    # OpenCV image is BGR, convert to RGB for PIL
-    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    image = Image.fromarray(image)
-
-    # resizing the image to be at least 224x224 and then cropping from the center
-    size = (224, 224)
-    image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
-
-    # turn the image into a numpy array
-    image_array = np.asarray(image)
-
-    # Normalize the image
-    normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
-
-    # Load the image into the array
-    data[0] = normalized_image_array
-
-    # Predicts the model
-    prediction = model.predict(data, verbose=0)
-    index = np.argmax(prediction)
-    class_name = class_names[index].strip()
-    confidence_score = prediction[0][index]
+    # 中心裁切縮放到 224x224、正規化後推理 (BGR 畫面直接傳入)
+    (class_name, confidence_score), = engine.classify(frame, top_k=1)
 
     # Print prediction and confidence score
-    text = f"Class: {class_name[2:]} Conf: {confidence_score:.2f}"
+    text = f"Class: {class_name} Conf: {confidence_score:.2f}"
     print(text)
 
     # Display result on frame
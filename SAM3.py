@@ -1,15 +1,41 @@
+import sys
+from pathlib import Path
+
 import cv2
-from ultralytics.models.sam import SAM3SemanticPredictor
-
-# 載入 SAM3 模型 (使用 GPU + 半精度加速)
-predictor = SAM3SemanticPredictor(overrides=dict(
-    conf=0.25,
-    task="segment",
-    mode="predict",
-    model="sam3.pt",
-    device=0,       # 使用 GPU
-    half=True       # 半精度加速
-))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "SAM3_GUI"))
+import device_profile
+from frame_source import open_source
+import model_loader
+from overlay import OverlayRenderer, extract_detections
+from prompt_cache import PromptEmbeddingCache
+from tracker import KeyframeTracker
+
+# 執行設定檔: "auto" (有 CUDA 用 GPU 半精度，否則 CPU int8)、"gpu" 或 "cpu"
+PROFILE = "auto"
+IMGSZ = None     # 模型輸入尺寸 (14 的倍數)，None 使用設定檔預設值
+THREADS = None   # CPU intra-op 執行緒數，None 使用設定檔預設值
+SOURCE = 0       # 攝影機索引、影片檔、圖片資料夾或 "synthetic" (沒有攝影機時重播錄影測試)
+PACE = "realtime"  # 錄影來源的播放節奏: "realtime" 依時間戳，"fast" 盡可能快
+WARMUP_RUNS = 1  # 載入後以假畫面暖機的次數，第一個真實畫面即為穩定速度
+
+# 載入 SAM3 模型
+profile = device_profile.resolve_profile(PROFILE, imgsz=IMGSZ, threads=THREADS)
+predictor, startup = model_loader.load_predictor("sam3.pt", profile, progress=print)
+startup.update(model_loader.warmup(predictor, WARMUP_RUNS))
+print(f"執行設定: {device_profile.describe(profile)}")
+print(f"啟動計時: {model_loader.format_startup(startup)}")
+
+# 文字提示 embedding 快取 (同一個 prompt 只編碼一次)
+prompt_cache = PromptEmbeddingCache()
+prompt_cache.install(predictor)
+
+# 以 NumPy 一次合成所有 mask，取代 results[0].plot()
+overlay = OverlayRenderer()
+
+# 追蹤模式: 每 N 幀 (或場景變化) 跑一次完整模型，其間以光流傳遞 mask 並維持 ID
+tracker = KeyframeTracker()
+use_tracking = True
 
 # 文字提示（可以修改成你要偵測的物件）
 TEXT_PROMPT = ["dice"]
@@ -44,15 +70,17 @@ def mouse_callback(event, x, y, flags, param):
         if abs(x2 - x1) > 10 and abs(y2 - y1) > 10:  # 確保框選區域夠大
             exemplar_bbox = [x1, y1, x2, y2]
             use_text_only = False
+            tracker.reset()
             print(f"已設定範例區域: {exemplar_bbox}")
             print(f"模式: 文字 '{TEXT_PROMPT}' + 範例框")
 
-# 開啟攝影機
-cap = cv2.VideoCapture(0)
+# 開啟影像來源 (背景預取)
+cap = open_source(SOURCE, pace=PACE)
 
-if not cap.isOpened():
+if not cap.start():
     print("無法開啟攝影機")
     exit()
+print(f"影像來源: {cap.describe()}")
 
 # 設定視窗和滑鼠回調
 cv2.namedWindow("SAM3 Dice Detection")
@@ -67,37 +95,43 @@ print("  - 啟動後自動用文字偵測")
 print("  - 用滑鼠框選可加入範例輔助")
 print("  - 按 't' 切換純文字模式")
 print("  - 按 'c' 清除範例")
+print("  - 按 'k' 切換關鍵幀追蹤模式")
 print("  - 按 'q' 退出程式")
 print("=" * 50)
 
 while True:
-    ret, frame = cap.read()
+    ret, frame, _ = cap.read()
     if not ret:
         print("無法讀取畫面")
         break
 
-    # 設定當前幀
-    predictor.set_image(frame)
-
-    # 根據模式進行預測
-    try:
-        if use_text_only:
-            # 純文字模式
+    if use_tracking and not tracker.needs_keyframe(frame):
+        # 非關鍵幀: 光流傳遞上一次的結果
+        detections = tracker.propagate(frame)
+    else:
+        # 設定當前幀
+        predictor.set_image(frame)
+
+        # 根據模式進行預測
+        try:
+            if use_text_only:
+                # 純文字模式
+                results = predictor(text=TEXT_PROMPT)
+            elif exemplar_bbox is not None:
+                # 文字 + 範例模式
+                results = predictor(text=TEXT_PROMPT, bboxes=[exemplar_bbox], labels=[1])
+            else:
+                results = None
+        except Exception as e:
+            # 如果組合模式失敗，退回純文字模式
             results = predictor(text=TEXT_PROMPT)
-        elif exemplar_bbox is not None:
-            # 文字 + 範例模式
-            results = predictor(text=TEXT_PROMPT, bboxes=[exemplar_bbox], labels=[1])
-        else:
-            results = None
-    except Exception as e:
-        # 如果組合模式失敗，退回純文字模式
-        results = predictor(text=TEXT_PROMPT)
+
+        detections = extract_detections(results[0]) if results and len(results) > 0 else None
+        if use_tracking:
+            detections = tracker.update_keyframe(frame, detections)
 
     # 繪製結果
-    if results and len(results) > 0:
-        annotated_frame = results[0].plot()
-    else:
-        annotated_frame = frame.copy()
+    annotated_frame = overlay.render(frame, detections)
 
     # 繪製正在框選的矩形
     if drawing and start_point and end_point:
@@ -115,6 +149,8 @@ while True:
 
     # 顯示目前模式
     mode_text = f"Mode: Text '{TEXT_PROMPT[0]}'" if use_text_only else f"Mode: Text + Exemplar"
+    if use_tracking:
+        mode_text += f" | Track N={tracker.interval} drift={tracker.last_drift:.2f}"
     cv2.putText(annotated_frame, mode_text, (10, 30),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
@@ -125,13 +161,22 @@ while True:
     key = cv2.waitKey(1) & 0xFF
     if key == ord('q'):
         break
+    elif key == ord('k'):
+        use_tracking = not use_tracking
+        tracker.reset()
+        print(f"關鍵幀追蹤模式: {'開' if use_tracking else '關'}")
     elif key == ord('c'):
+        tracker.reset()
         exemplar_bbox = None
         use_text_only = True
         print("已清除範例，切換到純文字模式")
     elif key == ord('t'):
+        tracker.reset()
         use_text_only = True
         print(f"切換到純文字模式: {TEXT_PROMPT}")
 
+stats = prompt_cache.stats()
+print(f"Prompt cache: {stats['hits']} hit / {stats['misses']} miss")
+
 cap.release()
 cv2.destroyAllWindows()
@@ -0,0 +1,161 @@
+import numpy as np
+
+from tracker import box_iou
+
+
+class RingBuffer:
+    """固定容量的 numpy 環形緩衝區 (structured dtype)，寫滿後覆寫最舊的紀錄，不會隨執行時間成長"""
+
+    def __init__(self, capacity, dtype):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.head = 0
+        self.size = 0
+
+    def append(self, row):
+        self.data[self.head] = row
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def view(self):
+        """依寫入順序 (舊 → 新) 的紀錄"""
+        if self.size < self.capacity:
+            return self.data[:self.size]
+        return np.concatenate([self.data[self.head:], self.data[:self.head]])
+
+    def since(self, t):
+        rows = self.view()
+        return rows[rows['t'] >= t]
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+class ObjectAnalytics:
+    """串流物件統計: 滑動視窗內各類別的數量、進場數、停留時間與處理量
+
+    輸入為每幀的結構化結果 (compact_detections) 與其擷取時間戳。有 'ids' (追蹤模式)
+    時直接以 ID 辨識同一個物件，否則以同類別 box 的 IoU 與上一幀配對。
+    物件超過 max_age 秒沒出現即視為離場，停留時間 = 最後出現 - 第一次出現。
+    所有紀錄都放在固定容量的 RingBuffer，長時間運轉 (輸送帶計數) 記憶體固定。
+    """
+
+    def __init__(self, window=60.0, max_classes=64, capacity=4096, max_age=1.0, iou_threshold=0.3):
+        self.window = window
+        self.max_classes = max_classes
+        self.max_age = max_age
+        self.iou_threshold = iou_threshold
+        self.frames = RingBuffer(capacity, [('t', 'f8'), ('counts', 'u2', (max_classes,))])
+        self.arrivals = RingBuffer(capacity, [('t', 'f8'), ('cls', 'i4')])
+        self.departures = RingBuffer(capacity, [('t', 'f8'), ('cls', 'i4'), ('dwell', 'f4')])
+        self.reset()
+
+    def reset(self):
+        self.frames.clear()
+        self.arrivals.clear()
+        self.departures.clear()
+        self.names = {}
+        self.tracks = {}  # key → {'cls', 'first', 'last', 'box'}
+        self.next_key = 0
+        self.last_t = None
+        self.totals = np.zeros(self.max_classes, dtype=np.int64)  # 啟動以來的累計進場數
+
+    def update(self, result, t):
+        """加入一幀的結果 (None 表示沒有偵測到物件)"""
+        if result:
+            boxes = np.asarray(result['boxes'], dtype=np.float32).reshape(-1, 4)
+            classes = np.asarray(result['classes'], dtype=np.int64) % self.max_classes
+            self.names.update(result.get('names', {}))
+            keys = self._match(boxes, classes, result.get('ids'))
+        else:
+            boxes = np.zeros((0, 4), dtype=np.float32)
+            classes = np.zeros(0, dtype=np.int64)
+            keys = []
+
+        for key, box, cls in zip(keys, boxes, classes):
+            track = self.tracks.get(key)
+            if track is None:
+                self.tracks[key] = {'cls': int(cls), 'first': t, 'last': t, 'box': box}
+                self.arrivals.append((t, cls))
+                self.totals[cls] += 1
+            else:
+                track['last'] = t
+                track['box'] = box
+
+        for key in [k for k, track in self.tracks.items() if t - track['last'] > self.max_age]:
+            track = self.tracks.pop(key)
+            self.departures.append((track['last'], track['cls'], track['last'] - track['first']))
+
+        self.frames.append((t, np.bincount(classes, minlength=self.max_classes)))
+        self.last_t = t
+
+    def _match(self, boxes, classes, ids):
+        if ids is not None:
+            return [('id', int(i)) for i in ids]
+
+        # 沒有追蹤 ID: 與仍在場的物件以同類別的 IoU 貪婪配對
+        keys = [None] * len(boxes)
+        active = list(self.tracks)
+        if active and len(boxes):
+            iou = box_iou(np.array([self.tracks[k]['box'] for k in active]), boxes)
+            active_cls = np.array([self.tracks[k]['cls'] for k in active])
+            iou[active_cls[:, None] != classes[None, :]] = 0
+            while iou.size and iou.max() > self.iou_threshold:
+                i, j = np.unravel_index(iou.argmax(), iou.shape)
+                keys[j] = active[i]
+                iou[i, :] = 0
+                iou[:, j] = 0
+        for j in range(len(keys)):
+            if keys[j] is None:
+                keys[j] = ('auto', self.next_key)
+                self.next_key += 1
+        return keys
+
+    def snapshot(self, t=None):
+        """視窗內的統計: {'fps', 'throughput', 'classes': [...]}；throughput 為每分鐘進場數"""
+        t = self.last_t if t is None else t
+        if t is None:
+            return {'fps': 0.0, 'throughput': 0.0, 'classes': []}
+        start = t - self.window
+        frames = self.frames.since(start)
+        arrivals = self.arrivals.since(start)
+        departures = self.departures.since(start)
+        span = max(t - frames['t'][0], 1e-6) if len(frames) > 1 else self.window
+
+        present = frames['counts'][-1] if len(frames) else np.zeros(self.max_classes, dtype=np.uint16)
+        mean_present = frames['counts'].mean(axis=0) if len(frames) else present
+        arrived = np.bincount(arrivals['cls'], minlength=self.max_classes)
+        active_cls = np.unique(np.array([track['cls'] for track in self.tracks.values()], dtype=np.int64))
+
+        classes = []
+        seen = set(np.flatnonzero(arrived | present)) | set(active_cls) | set(self.names)
+        for cls in sorted(int(c) for c in seen if int(c) < self.max_classes):
+            dwell = departures['dwell'][departures['cls'] == cls]
+            classes.append({
+                'class': cls,
+                'name': self.names.get(cls, str(cls)),
+                'present': int(present[cls]),
+                'mean_present': float(mean_present[cls]),
+                'arrivals': int(arrived[cls]),
+                'total': int(self.totals[cls]),
+                'per_minute': float(arrived[cls] / span * 60),
+                'dwell_mean': float(dwell.mean()) if len(dwell) else 0.0,
+                'dwell_p95': float(np.percentile(dwell, 95)) if len(dwell) else 0.0,
+            })
+        return {
+            'fps': float((len(frames) - 1) / span) if len(frames) > 1 else 0.0,
+            'throughput': float(len(arrivals) / span * 60),
+            'classes': classes,
+        }
+
+    def summary_lines(self, t=None):
+        snap = self.snapshot(t)
+        lines = [f"{snap['fps']:.1f} fps  {snap['throughput']:.0f} obj/min  ({self.window:.0f}s window)"]
+        for item in snap['classes']:
+            lines.append(f"{item['name'][:12]:<12} now {item['present']:>2}  +{item['arrivals']:<3} "
+                         f"{item['per_minute']:.0f}/min  dwell {item['dwell_mean']:.1f}s")
+        return lines
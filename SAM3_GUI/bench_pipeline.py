@@ -0,0 +1,305 @@
+"""管線基準測試: 以替身 predictor 取代 SAM3，量測 CameraThread → InferenceThread → display_frame 本身的效能
+
+不需要 GPU、sam3.pt 或顯示器 (Qt offscreen)，可在一般 Linux CI 上執行，用來比較佇列策略、
+執行緒與顯示路徑的調整，並抓出管線本身的效能退化。替身的 set_image / decode 依設定的
+延遲與抖動 sleep (與 GPU 推理一樣不占 GIL)，回傳固定數量的 box 與原始解析度 mask。
+
+用法:
+    python bench_pipeline.py
+    python bench_pipeline.py --cameras 2 --encode-ms 40 --decode-ms 15 --jitter 0.3 --duration 20
+    python bench_pipeline.py --tracking --json bench.json --max-p95 150 --min-fps 8
+
+輸出 Markdown: 擷取 / 推理 / 顯示速率、各階段 p50/p95/p99 延遲與各處的丟幀率。
+指定 --max-p95 / --min-fps 時，未達門檻以 exit code 1 結束 (CI 用)。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QApplication
+
+import device_profile
+from latency import STAGES
+from main import SAM3GUI
+from scheduler import LatencyBudgetScheduler
+
+
+class StandInArray:
+    """模仿 torch.Tensor 的 .cpu().numpy()"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def __len__(self):
+        return len(self.array)
+
+
+class StandInBoxes:
+    def __init__(self, boxes, scores, classes):
+        self.xyxy = StandInArray(boxes)
+        self.conf = StandInArray(scores)
+        self.cls = StandInArray(classes)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class StandInMasks:
+    def __init__(self, masks):
+        self.data = StandInArray(masks)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class StandInResult:
+    """extract_detections 會用到的 Results 欄位"""
+
+    def __init__(self, boxes, scores, classes, masks, names):
+        self.boxes = StandInBoxes(boxes, scores, classes)
+        self.masks = StandInMasks(masks)
+        self.names = names
+
+
+class StandInPredictor:
+    """SAM3SemanticPredictor 的替身: 延遲 = 基準 × (imgsz / 基準 imgsz)² × (1 + jitter × N(0,1))
+
+    延遲隨 imgsz 平方縮放 (與 ViT token 數成正比)，延遲預算調度降低 imgsz 時可看到效果。
+    沒有 model 屬性，prompt 快取與範例框 embedding 庫不會掛入。
+    """
+
+    def __init__(self, encode_ms=60.0, decode_ms=20.0, jitter=0.2, objects=4, imgsz=1008, seed=0):
+        self.args = SimpleNamespace(conf=0.25, imgsz=imgsz)
+        self.model = None
+        self.encode_ms = encode_ms
+        self.decode_ms = decode_ms
+        self.jitter = jitter
+        self.objects = objects
+        self.base_imgsz = imgsz
+        self.rng = np.random.default_rng(seed)
+        self.shape = None
+        self.outputs = {}  # (h, w, 類別數) → 預先產生的 box / mask，不把合成成本算進推理時間
+        self.calls = 0
+
+    def sleep(self, ms):
+        imgsz = self.args.imgsz if isinstance(self.args.imgsz, int) else max(self.args.imgsz)
+        ms *= (imgsz / self.base_imgsz) ** 2
+        ms *= max(0.0, 1.0 + self.jitter * self.rng.standard_normal())
+        time.sleep(ms / 1000)
+
+    def set_image(self, image):
+        self.sleep(self.encode_ms)
+        self.shape = image.shape[:2]
+
+    def __call__(self, source=None, text=None, bboxes=None, labels=None, **kwargs):
+        names = list(text) if text else ["object"]
+        if source is not None:
+            # 與 SAM3 相同: 影像逐張前處理與推理
+            results = []
+            for image in (source if isinstance(source, list) else [source]):
+                self.set_image(image)
+                self.sleep(self.decode_ms)
+                results.append(self.result(image.shape[:2], names))
+            return results
+        self.sleep(self.decode_ms)
+        return [self.result(self.shape, names)]
+
+    def result(self, shape, names):
+        self.calls += 1
+        key = (*shape, len(names))
+        if key not in self.outputs:
+            h, w = shape
+            n = self.objects
+            cols = int(np.ceil(np.sqrt(n)))
+            rows = int(np.ceil(n / cols))
+            cell_w, cell_h = w / cols, h / rows
+            boxes = np.array([[(i % cols + 0.2) * cell_w, (i // cols + 0.2) * cell_h,
+                               (i % cols + 0.8) * cell_w, (i // cols + 0.8) * cell_h] for i in range(n)],
+                             dtype=np.float32)
+            masks = np.zeros((n, h, w), dtype=np.float32)
+            for k, (x1, y1, x2, y2) in enumerate(boxes.astype(int)):
+                masks[k, y1:y2, x1:x2] = 1.0
+            scores = np.linspace(0.9, 0.5, n).astype(np.float32)
+            classes = (np.arange(n) % len(names)).astype(np.float32)
+            self.outputs[key] = (boxes, scores, classes, masks)
+        boxes, scores, classes, masks = self.outputs[key]
+        return StandInResult(boxes, scores, classes, masks, names)
+
+
+def percentile_table(records):
+    """各階段 p50 / p95 / p99 / max (ms)"""
+    table = {}
+    for stage in STAGES:
+        values = np.array([row[stage] for row in records if stage in row])
+        if len(values):
+            table[stage] = {
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+                'p99': float(np.percentile(values, 99)),
+                'max': float(values.max()),
+            }
+    return table
+
+
+def run(args):
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    predictor = StandInPredictor(args.encode_ms, args.decode_ms, args.jitter, args.objects, args.imgsz, args.seed)
+    scheduler = LatencyBudgetScheduler(budget_ms=args.latency_budget, max_fps=args.max_fps, imgsz=args.imgsz)
+    profile = device_profile.resolve_profile("cpu", imgsz=args.imgsz)
+    source = f"synthetic:{args.width}x{args.height}@{args.fps:g}"
+    window = SAM3GUI([source] * args.cameras, profile, scheduler, 0, {'pace': args.pace}, predictor=predictor)
+    window.resize(1200, 800)
+    window.show()
+
+    window.text_input.setText(", ".join(args.prompt))
+    window.apply_settings()
+    window.tracking_check.setChecked(args.tracking)
+    window.roi_check.setChecked(args.roi)
+    window.motion_check.setChecked(args.reuse_static)
+
+    capture_starts = []  # 每個擷取幀的 capture_start 時間戳
+    window.start_camera()
+    for thread in window.camera_threads:
+        # 直接在攝影機執行緒讀取時間戳 (之後 slot 可能已被重複使用)
+        thread.frame_ready.connect(lambda _, slot: capture_starts.append(slot.stamps['capture_start']),
+                                   Qt.ConnectionType.DirectConnection)
+
+    state = {}
+
+    def start_measuring():
+        # 丟掉暖機期間 (來源開啟、第一次配置緩衝區) 的數據
+        window.latency.reset()
+        state['ring'] = sum(t.ring.dropped for t in window.camera_threads)
+        state['calls'] = predictor.calls
+        state['start'] = time.perf_counter()
+
+    def finish():
+        state['end'] = time.perf_counter()
+        state['elapsed'] = state['end'] - state['start']
+        state['ring'] = sum(t.ring.dropped for t in window.camera_threads) - state['ring']
+        state['calls'] = predictor.calls - state['calls']
+        state['records'] = list(window.latency.records)
+        state['counters'] = dict(window.latency.counters)
+        app.quit()
+
+    QTimer.singleShot(int(args.warmup * 1000), start_measuring)
+    QTimer.singleShot(int((args.warmup + args.duration) * 1000), finish)
+    app.exec()
+    window.close()
+
+    elapsed = state['elapsed']
+    counters = state['counters']
+    start, end = state['start'], state['end']
+    captured = sum(1 for t in capture_starts if start <= t < end)
+    total_captured = max(captured, 1)
+
+    # 整體丟幀率只看量測開始後擷取的幀 (分子分母相同條件)；結束前最長延遲內擷取的幀可能仍在處理中，兩邊都不計
+    presented_at = [(r['t'] - r['total'] / 1000, r['total'] / 1000) for r in state['records'] if 'total' in r]
+    cutoff = end - max((latency for _, latency in presented_at), default=0.0)
+    window_captured = sum(1 for t in capture_starts if start <= t < cutoff)
+    window_presented = sum(1 for t, _ in presented_at if start <= t < cutoff)
+    return {
+        'config': {k: v for k, v in vars(args).items() if k not in ('json',)},
+        'elapsed_s': elapsed,
+        'captured_fps': captured / elapsed,
+        'inference_fps': state['calls'] / elapsed,
+        'presented_fps': counters['frames'] / elapsed,
+        'captured': captured,
+        'presented': counters['frames'],
+        'drop_rate': {
+            'inference': counters['inference_dropped'] / total_captured,
+            'present': counters['present_dropped'] / total_captured,
+            'ring': state['ring'] / (total_captured + state['ring']),
+            'overall': 1.0 - window_presented / window_captured if window_captured else 0.0,
+        },
+        'latency_ms': percentile_table(state['records']),
+        'imgsz': predictor.args.imgsz,
+    }
+
+
+def print_report(report):
+    config = report['config']
+    print(f"{config['cameras']} x synthetic {config['width']}x{config['height']}@{config['fps']:g} | "
+          f"stand-in encode {config['encode_ms']} ms + decode {config['decode_ms']} ms, jitter {config['jitter']} | "
+          f"{report['elapsed_s']:.1f} s\n")
+    print("| rate | fps |")
+    print("|---|---|")
+    for key in ('captured', 'inference', 'presented'):
+        print(f"| {key} | {report[key + '_fps']:.1f} |")
+
+    print("\n| stage | p50 ms | p95 ms | p99 ms | max ms |")
+    print("|---|---|---|---|---|")
+    for stage, row in report['latency_ms'].items():
+        print(f"| {stage} | {row['p50']:.1f} | {row['p95']:.1f} | {row['p99']:.1f} | {row['max']:.1f} |")
+
+    print("\n| dropped | rate |")
+    print("|---|---|")
+    for key, value in report['drop_rate'].items():
+        print(f"| {key} | {value:.1%} |")
+    if report['imgsz'] != config['imgsz']:
+        print(f"\nimgsz adjusted by latency budget: {config['imgsz']} → {report['imgsz']}")
+
+
+def check_thresholds(report, max_p95=None, min_fps=None):
+    failures = []
+    total = report['latency_ms'].get('total')
+    if max_p95 is not None and (total is None or total['p95'] > max_p95):
+        failures.append(f"total p95 {total['p95'] if total else float('nan'):.1f} ms > {max_p95} ms")
+    if min_fps is not None and report['presented_fps'] < min_fps:
+        failures.append(f"presented {report['presented_fps']:.1f} fps < {min_fps} fps")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=1)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=float, default=30.0, help="合成來源的 FPS")
+    parser.add_argument("--pace", default="realtime", choices=["realtime", "fast"])
+    parser.add_argument("--encode-ms", type=float, default=60.0, help="替身 set_image 延遲")
+    parser.add_argument("--decode-ms", type=float, default=20.0, help="替身 prompt/decoder 延遲")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延遲的相對標準差")
+    parser.add_argument("--objects", type=int, default=4, help="每幀回傳的物件數")
+    parser.add_argument("--prompt", nargs="+", default=["dice"])
+    parser.add_argument("--imgsz", type=int, default=1008)
+    parser.add_argument("--latency-budget", type=float, help="延遲預算 (ms)，測試調度器")
+    parser.add_argument("--max-fps", type=float, default=30)
+    parser.add_argument("--tracking", action="store_true", help="開啟關鍵幀追蹤")
+    parser.add_argument("--roi", action="store_true", help="開啟 ROI 模式")
+    parser.add_argument("--reuse-static", action="store_true", help="開啟靜止畫面沿用特徵")
+    parser.add_argument("--warmup", type=float, default=2.0, help="開始計時前的秒數")
+    parser.add_argument("--duration", type=float, default=10.0, help="量測秒數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="將結果另存為 JSON")
+    parser.add_argument("--max-p95", type=float, help="total p95 門檻 (ms)")
+    parser.add_argument("--min-fps", type=float, help="顯示速率門檻")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(report, args.max_p95, args.min_fps)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""比較各執行設定檔的延遲與準確度
+
+用法:
+    python bench_profiles.py --prompt dice
+    python bench_profiles.py --images "../runs/segment/predict*/image0.jpg" --cpu-imgsz 644 1008
+
+以參考設定 (有 CUDA 時為 GPU 半精度，否則 CPU fp32 / imgsz 1008) 的結果為基準，
+輸出 Markdown 表格: 平均/中位延遲、與基準的前景 IoU 與偵測數差異。
+"""
+import argparse
+import glob
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import device_profile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def union_mask(result, shape):
+    if result is None or result.masks is None or len(result.masks) == 0:
+        return np.zeros(shape, dtype=bool)
+    mask = result.masks.data.any(0).cpu().numpy().astype(np.uint8)
+    if mask.shape != shape:
+        mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+    return mask.astype(bool)
+
+
+def run_profile(profile, model_path, images, prompt, warmup=1):
+    from ultralytics.models.sam import SAM3SemanticPredictor
+
+    device_profile.prepare_runtime(profile)
+    predictor = SAM3SemanticPredictor(overrides=device_profile.predictor_overrides(profile, model_path))
+    predictor.setup_model()
+    device_profile.apply_profile(predictor, profile)
+
+    for image in images[:warmup]:
+        predictor.set_image(image)
+        predictor(text=prompt)
+
+    latencies, masks, counts = [], [], []
+    for image in images:
+        start = time.perf_counter()
+        predictor.set_image(image)
+        results = predictor(text=prompt)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        result = results[0] if results else None
+        masks.append(union_mask(result, image.shape[:2]))
+        counts.append(0 if result is None or result.boxes is None else len(result.boxes))
+    return latencies, masks, counts
+
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else np.logical_and(a, b).sum() / union
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(ROOT / "runs" / "segment" / "predict*" / "image0.jpg"))
+    parser.add_argument("--model", default=str(ROOT / "sam3.pt"))
+    parser.add_argument("--prompt", nargs="+", default=["dice"])
+    parser.add_argument("--cpu-imgsz", type=int, nargs="+", default=[644])
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    images = [cv2.imread(p) for p in paths]
+    images = [im for im in images if im is not None]
+    if not images:
+        raise SystemExit(f"No images found: {args.images}")
+
+    if device_profile.cuda_available():
+        reference = device_profile.resolve_profile("gpu")
+    else:
+        reference = device_profile.resolve_profile("cpu", imgsz=1008, quantize=False)
+    candidates = [reference]
+    for imgsz in args.cpu_imgsz:
+        for quantize in (False, True):
+            candidates.append(device_profile.resolve_profile(
+                "cpu", imgsz=imgsz, threads=args.threads, quantize=quantize))
+
+    print(f"{len(images)} images, prompt {args.prompt}\n")
+    print("| profile | mean ms | p50 ms | mean IoU vs ref | count diff |")
+    print("|---|---|---|---|---|")
+
+    ref_masks = ref_counts = None
+    for profile in candidates:
+        latencies, masks, counts = run_profile(profile, args.model, images, args.prompt)
+        if ref_masks is None:
+            ref_masks, ref_counts = masks, counts
+        mean_iou = np.mean([iou(a, b) for a, b in zip(masks, ref_masks)])
+        count_diff = np.mean([abs(a - b) for a, b in zip(counts, ref_counts)])
+        label = device_profile.describe(profile) + (" (ref)" if profile is reference else "")
+        print(f"| {label} | {np.mean(latencies):.1f} | {np.median(latencies):.1f} "
+              f"| {mean_iou:.3f} | {count_diff:.2f} |")
+
+
+if __name__ == "__main__":
+    main()
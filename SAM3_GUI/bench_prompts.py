@@ -0,0 +1,113 @@
+"""量測 prompt 數量增加時的推理成本 (共用影像編碼，各 prompt 分別 decode)
+
+用法:
+    python bench_prompts.py
+    python bench_prompts.py --prompts screw nut washer bolt spring gear --counts 1 3 6
+
+每張圖只跑一次 set_image，再以 k 個 prompt 一次 decode；對照組為每個 prompt 各自
+set_image + decode (成本隨 k 線性成長)。輸出 Markdown 表格: 編碼、decode、總計、
+每個 prompt 的平均成本，以及相對線性成長的比例 (< 1 表示次線性)。
+線性成長的基準為另外量測的單一 prompt (--prompts 的第一個) 的總計，與 --counts 無關。
+"""
+import argparse
+import glob
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import device_profile
+import model_loader
+from overlay import extract_detections, summarize_classes
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PROMPTS = ["screw", "nut", "washer", "bolt", "spring", "gear", "bearing", "clip", "pin", "rivet"]
+
+
+def timed(predictor, fn):
+    """fn 的耗時 (ms)；前後都等 GPU kernel 完成，非同步執行的成本才不會算到下一段"""
+    model_loader._sync(predictor)
+    start = time.perf_counter()
+    value = fn()
+    model_loader._sync(predictor)
+    return value, (time.perf_counter() - start) * 1000
+
+
+def fan_out(predictor, image, prompts):
+    """影像編碼一次，所有 prompt 在同一次 decode 中處理"""
+    _, encode_ms = timed(predictor, lambda: predictor.set_image(image))
+    results, decode_ms = timed(predictor, lambda: predictor(text=prompts))
+    return encode_ms, decode_ms, extract_detections(results[0]) if results else None
+
+
+def per_prompt(predictor, image, prompts):
+    """對照組: 每個 prompt 各自 set_image + decode"""
+    total = 0.0
+    for prompt in prompts:
+        _, ms = timed(predictor, lambda: (predictor.set_image(image), predictor(text=[prompt])))
+        total += ms
+    return total
+
+
+def measure(predictor, images, prompts, repeat, baseline=True):
+    """回傳 (平均編碼 ms, 平均 decode ms, 對照組平均 ms 或 None, 最後一張圖的 detections)"""
+    encode, decode, per = [], [], []
+    last = None
+    for _ in range(repeat):
+        for image in images:
+            e, d, last = fan_out(predictor, image, prompts)
+            encode.append(e)
+            decode.append(d)
+            if baseline:
+                per.append(per_prompt(predictor, image, prompts))
+    return np.mean(encode), np.mean(decode), np.mean(per) if per else None, last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(ROOT / "runs" / "segment" / "predict*" / "image0.jpg"))
+    parser.add_argument("--model", default=str(ROOT / "sam3.pt"))
+    parser.add_argument("--prompts", nargs="+", default=DEFAULT_PROMPTS)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--profile", default="auto", choices=["auto", *device_profile.PROFILES])
+    parser.add_argument("--imgsz", type=int)
+    args = parser.parse_args()
+    if min(args.counts) < 1 or max(args.counts) > len(args.prompts):
+        parser.error(f"--counts must be between 1 and the number of --prompts ({len(args.prompts)})")
+
+    paths = sorted(glob.glob(args.images))
+    images = [cv2.imread(p) for p in paths]
+    images = [im for im in images if im is not None]
+    if not images:
+        raise SystemExit(f"No images found: {args.images}")
+
+    profile = device_profile.resolve_profile(args.profile, imgsz=args.imgsz)
+    predictor, _ = model_loader.load_predictor(args.model, profile)
+    model_loader.warmup(predictor, runs=1, prompt=args.prompts[:max(args.counts)])
+
+    print(f"{len(images)} images x {args.repeat}, {device_profile.describe(profile)}\n")
+    print("| prompts | encode ms | decode ms | total ms | ms / prompt | per-prompt baseline ms | vs linear |")
+    print("|---|---|---|---|---|---|---|")
+
+    # 線性成長的基準: 永遠另外量測單一 prompt，不取 --counts 的第一個值
+    encode, decode, _, _ = measure(predictor, images, args.prompts[:1], args.repeat, baseline=False)
+    single_total = encode + decode
+
+    last = None
+    for k in args.counts:
+        prompts = args.prompts[:k]
+        encode, decode, baseline, last = measure(predictor, images, prompts, args.repeat)
+        total = encode + decode
+        linear = single_total * len(prompts)
+        print(f"| {len(prompts)} | {encode:.1f} | {decode:.1f} | {total:.1f} "
+              f"| {total / len(prompts):.1f} | {baseline:.1f} | {total / linear:.2f} |")
+
+    print("\nlast image, per class:")
+    for item in summarize_classes(last, args.prompts[:args.counts[-1]]):
+        print(f"  {item['name']:<12} {item['count']:>3}  mean score {item['mean_score']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# SAM3 執行設定檔：GPU 半精度 / CPU (int8 動態量化、較小輸入、執行緒數)
+# imgsz 需為 patch size 14 的倍數
+PROFILES = {
+    'gpu': dict(device=0, half=True, imgsz=1008, quantize=False, threads=None),
+    'cpu': dict(device="cpu", half=False, imgsz=644, quantize=True, threads=4),
+}
+
+
+def cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def resolve_profile(name="auto", imgsz=None, threads=None, quantize=None):
+    """回傳實際使用的設定；auto 時沒有 CUDA 就退回 CPU"""
+    if name == "auto":
+        name = "gpu" if cuda_available() else "cpu"
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile: {name} (choose from auto, {', '.join(PROFILES)})")
+
+    profile = dict(PROFILES[name], name=name)
+    if name == "gpu" and not cuda_available():
+        # 指定 GPU 但沒有 CUDA：退回 CPU，而非在載入時直接失敗
+        profile = dict(PROFILES['cpu'], name="cpu")
+    if imgsz:
+        profile['imgsz'] = imgsz
+    if threads:
+        profile['threads'] = threads
+    if quantize is not None:
+        profile['quantize'] = quantize
+    return profile
+
+
+def predictor_overrides(profile, model_path, conf=0.25):
+    return dict(
+        conf=conf,
+        task="segment",
+        mode="predict",
+        model=str(model_path),
+        device=profile['device'],
+        half=profile['half'],
+        imgsz=profile['imgsz'],
+    )
+
+
+def prepare_runtime(profile):
+    """在建立 predictor 之前呼叫：設定 intra-op 執行緒數"""
+    if profile.get('threads'):
+        import torch
+        torch.set_num_threads(profile['threads'])
+
+
+def apply_profile(predictor, profile):
+    """在 setup_model 之後呼叫：CPU 上將 Linear 層動態量化為 int8 (ViT 編碼器主要是 Linear)"""
+    if not profile.get('quantize') or profile['device'] != "cpu":
+        return False
+
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    quantize_dynamic(predictor.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return True
+
+
+def set_imgsz(predictor, imgsz):
+    """執行中變更模型輸入尺寸 (延遲預算調度用)"""
+    predictor.args.imgsz = imgsz
+    model = getattr(predictor, "model", None)
+    if model is not None and hasattr(model, "set_imgsz"):
+        model.set_imgsz((imgsz, imgsz))
+
+
+def describe(profile):
+    threads = profile.get('threads') or "default"
+    quant = "int8" if profile.get('quantize') and profile['device'] == "cpu" else (
+        "fp16" if profile['half'] else "fp32")
+    return f"{profile['name']} | imgsz {profile['imgsz']} | {quant} | threads {threads}"
@@ -0,0 +1,158 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+SET_SUFFIX = ".npz"
+
+
+class ExemplarBank:
+    """範例框 embedding 庫：存 sample 時在來源畫面上跑一次 geometry encoder，之後每幀直接沿用
+
+    SAM3 的範例框會經過 geometry encoder (ROI align + 對影像特徵的 cross-attention)，
+    原本每幀都拿同一組座標在新畫面上重算，座標也只對框選的那一幀有意義。
+    這裡改為在框選當下的畫面上編碼一次，把 (tokens, mask) 存起來，之後的每一幀
+    (任何攝影機、之後的 session) 都直接把這些 token 接在文字 prompt 後面，不再重算。
+    """
+
+    def __init__(self):
+        self.model = None
+        self.predictor = None
+        self.entries = []     # 目前啟用的 embedding (numpy，與裝置無關)
+        self.active = None    # 合併後放在模型裝置上的 (tokens, mask)，第一次使用時建立
+        self.capturing = False
+        self.captured = None
+        self.installed = False
+
+    def install(self, predictor):
+        """掛入 model.forward_grounding 與 model._encode_prompt，回傳是否成功"""
+        model = getattr(predictor, "model", None)
+        if model is None or self.installed:
+            return self.installed
+        if not callable(getattr(model, "forward_grounding", None)) or \
+                not callable(getattr(model, "_encode_prompt", None)):
+            return False
+
+        self.model = model
+        self.predictor = predictor
+        model.forward_grounding = self.wrap_grounding(model.forward_grounding)
+        model._encode_prompt = self.wrap_encode_prompt(model._encode_prompt)
+        self.installed = True
+        return True
+
+    def wrap_grounding(self, grounding_fn):
+        """有啟用的 embedding 但這次呼叫沒有範例框時，補一個空的 geometric prompt 讓 _encode_prompt 被呼叫"""
+        bank = self
+
+        def grounding(backbone_out, text_ids, geometric_prompt=None):
+            if bank.entries and geometric_prompt is None and not bank.capturing:
+                geometric_prompt = bank.predictor._get_dummy_prompt(len(text_ids))
+            return grounding_fn(backbone_out, text_ids, geometric_prompt)
+
+        grounding.__wrapped__ = grounding_fn
+        return grounding
+
+    def wrap_encode_prompt(self, encode_fn):
+        bank = self
+
+        def encode_prompt(img_feats, img_pos_embeds, vis_feat_sizes, geometric_prompt, *args, **kwargs):
+            if bank.capturing:
+                tokens, mask = encode_fn(img_feats, img_pos_embeds, vis_feat_sizes, geometric_prompt,
+                                         *args, **kwargs)
+                bank.captured = (tokens, mask)
+                return tokens, mask
+            if not bank.entries:
+                return encode_fn(img_feats, img_pos_embeds, vis_feat_sizes, geometric_prompt, *args, **kwargs)
+
+            batch = img_feats[-1].shape[1]
+            tokens, mask = bank.tensors(img_feats[-1].device, img_feats[-1].dtype)
+            tokens = tokens.expand(-1, batch, -1)
+            mask = mask.expand(batch, -1)
+            if geometric_prompt is not None and geometric_prompt.box_embeddings.shape[0] > 0:
+                # 同時有即時框選的範例框: 照常編碼後接上庫中的 token
+                import torch
+                live_tokens, live_mask = encode_fn(img_feats, img_pos_embeds, vis_feat_sizes, geometric_prompt,
+                                                   *args, **kwargs)
+                tokens = torch.cat([live_tokens, tokens], dim=0)
+                mask = torch.cat([live_mask, mask], dim=1)
+            return tokens, mask
+
+        encode_prompt.__wrapped__ = encode_fn
+        return encode_prompt
+
+    def tensors(self, device, dtype):
+        if self.active is None or self.active[0].device != device or self.active[0].dtype != dtype:
+            import torch
+            tokens = np.concatenate([e['tokens'] for e in self.entries], axis=0)
+            mask = np.concatenate([e['mask'] for e in self.entries], axis=0)
+            self.active = (torch.from_numpy(tokens).to(device=device, dtype=dtype)[:, None, :],
+                           torch.from_numpy(mask).to(device=device)[None, :])
+        return self.active
+
+    def encode(self, frame, bbox, is_positive):
+        """在來源畫面上編碼一個範例框 (推理執行緒呼叫)，回傳 {'tokens': (N, C), 'mask': (N,)}"""
+        if not self.installed:
+            return None
+        self.capturing = True
+        self.captured = None
+        try:
+            self.predictor.set_image(frame)
+            self.predictor(bboxes=[bbox], labels=[1 if is_positive else 0])
+        finally:
+            self.capturing = False
+        if self.captured is None:
+            return None
+
+        tokens, mask = self.captured
+        self.captured = None
+        return {
+            'tokens': tokens[:, 0].float().cpu().numpy(),
+            'mask': mask[0].cpu().numpy().astype(bool),
+        }
+
+    def set_entries(self, entries):
+        self.entries = [e for e in entries if e is not None]
+        self.active = None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def save_sample_set(path, samples, meta=None):
+    """將 sample (bbox、正負向、裁切圖、embedding) 存成單一 .npz"""
+    path = Path(path).with_suffix(SET_SUFFIX)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {}
+    info = {'samples': [], **(meta or {})}
+    for i, sample in enumerate(samples):
+        arrays[f"crop_{i}"] = sample['crop']
+        embedding = sample.get('embedding')
+        if embedding is not None:
+            arrays[f"tokens_{i}"] = embedding['tokens']
+            arrays[f"mask_{i}"] = embedding['mask']
+        info['samples'].append({
+            'bbox': [int(v) for v in sample['bbox']],
+            'is_positive': bool(sample['is_positive']),
+            'embedding': embedding is not None,
+        })
+    arrays['meta'] = np.array(json.dumps(info, ensure_ascii=False))
+    np.savez_compressed(path, **arrays)
+    return path
+
+
+def load_sample_set(path):
+    """回傳 (samples, meta)；samples 與 save_sample_set 的輸入格式相同 (不含 pixmap)"""
+    with np.load(path, allow_pickle=False) as data:
+        info = json.loads(str(data['meta']))
+        samples = []
+        for i, item in enumerate(info.pop('samples')):
+            embedding = None
+            if item['embedding']:
+                embedding = {'tokens': data[f"tokens_{i}"], 'mask': data[f"mask_{i}"]}
+            samples.append({
+                'bbox': item['bbox'],
+                'is_positive': item['is_positive'],
+                'crop': data[f"crop_{i}"],
+                'embedding': embedding,
+            })
+    return samples, info
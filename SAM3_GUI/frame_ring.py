@@ -0,0 +1,72 @@
+import threading
+import time
+
+
+class FrameSlot:
+    """環形緩衝區中的一個影格；array 為來源交出的陣列 (以參考保存)，持有者用 retain/release 管理參考計數"""
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        self.array = None
+        self.refcount = 0
+        self.stamps = {}  # 各階段的 perf_counter 時間戳 (見 latency.STAGES)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def stamp(self, name, t=None):
+        self.stamps[name] = time.perf_counter() if t is None else t
+
+    def retain(self):
+        self.ring._retain(self)
+        return self
+
+    def release(self):
+        self.ring._release(self)
+
+
+class FrameRing:
+    """固定數量的影格 slot，限制同時在管線中的幀數
+
+    slot 不預先配置記憶體，只以參考包裝來源交出的陣列；推理與顯示共用同一份記憶體不再複製。
+    """
+
+    def __init__(self, num_slots=8):
+        self.slots = [FrameSlot(self, i) for i in range(num_slots)]
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.dropped = 0  # 所有 slot 都被占用而丟掉的幀數
+
+    def acquire(self):
+        """取得一個空閒 slot (refcount=1，array 為 None，由呼叫端設定)；全部占用時回傳 None"""
+        with self.lock:
+            for offset in range(len(self.slots)):
+                slot = self.slots[(self.next_index + offset) % len(self.slots)]
+                if slot.refcount == 0:
+                    self.next_index = (slot.index + 1) % len(self.slots)
+                    slot.refcount = 1
+                    slot.stamps = {}
+                    slot.array = None  # 不保留上一幀的陣列
+                    return slot
+            self.dropped += 1
+            return None
+
+    def _retain(self, slot):
+        with self.lock:
+            slot.refcount += 1
+
+    def _release(self, slot):
+        with self.lock:
+            if slot.refcount > 0:
+                slot.refcount -= 1
+
+    def in_use(self):
+        with self.lock:
+            return sum(1 for slot in self.slots if slot.refcount > 0)
+
+
+def frame_array(frame):
+    """FrameSlot 或 ndarray 都取出底層 ndarray"""
+    return frame.array if isinstance(frame, FrameSlot) else frame
@@ -0,0 +1,467 @@
+"""影格來源: 攝影機、影片檔、圖片資料夾、合成畫面
+
+每個來源都有背景預取執行緒與時間戳節奏控制，介面與 cv2.VideoCapture 類似:
+
+    source = open_source("line1.mp4", pace="realtime")
+    source.start()
+    while True:
+        ok, frame, pts = source.read()
+        if not ok:
+            break
+    source.close()
+
+- 即時來源 (攝影機、RTSP) 只保留最新一幀，讀取端拿到的永遠是最新畫面。
+- 錄影來源 (影片、圖片資料夾、合成) 不丟幀；pace="realtime" 依媒體時間戳播放，
+  pace="fast" 盡可能快 (吞吐量測試)。
+"""
+import glob
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+PACES = ("realtime", "fast")
+RETRY_DELAY = 0.05  # 即時來源讀取失敗後的第一次等待 (秒)，之後加倍
+RETRY_MAX_DELAY = 1.0
+REOPEN_AFTER = 10  # 即時來源連續失敗幾次後重新開啟 cv2.VideoCapture
+
+
+def fourcc_code(fourcc):
+    """'MJPG' → int；int 原樣回傳"""
+    if isinstance(fourcc, str):
+        return cv2.VideoWriter_fourcc(*fourcc[:4].ljust(4))
+    return int(fourcc)
+
+
+def fourcc_name(code):
+    code = int(code)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ") or "-"
+
+
+class FrameSource:
+    """來源基底類別；子類別實作 _open / _grab / _close
+
+    _grab() 回傳 (frame, pts 秒) 或 None (串流結束)。即時來源只在 close() 後回傳 None，
+    掉幀或網路中斷由 _grab 重試，不會結束串流。
+    """
+
+    live = False
+
+    def __init__(self, pace="realtime", prefetch=4, size=None):
+        if pace not in PACES:
+            raise ValueError(f"Unknown pace: {pace} (choose from {', '.join(PACES)})")
+        self.pace = pace
+        self.prefetch = max(1, prefetch)
+        self.size = tuple(size) if size else None  # 輸出尺寸 (w, h)，None 保持原尺寸
+        self.fps = 0.0
+        self.width = 0
+        self.height = 0
+        self.info = {}  # 協商結果等附加資訊
+
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.finished = False
+        self.dropped = 0  # 即時來源: 讀取端來不及取走而被覆蓋的幀數
+
+        self.clock_start = None  # (wall, pts)：realtime 節奏的基準
+        self.opened = False
+
+    # --- 子類別實作 ---
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _grab(self):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    # --- 公開介面 ---
+
+    def open(self):
+        if not self.opened:
+            self.opened = bool(self._open())
+            if self.opened and self.size:
+                self.info['native'] = (self.width, self.height)
+                self.width, self.height = self.size
+        return self.opened
+
+    def isOpened(self):
+        return self.opened
+
+    def start(self):
+        """開啟來源並啟動預取執行緒"""
+        if not self.open():
+            return False
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self.thread.start()
+        return True
+
+    def _prefetch_loop(self):
+        while self.running:
+            try:
+                item = self._grab()
+            except Exception:
+                if self.live and self.running:
+                    # 即時來源的單次錯誤不結束串流 (_grab 自行重試與重新連線)
+                    time.sleep(RETRY_DELAY)
+                    continue
+                item = None
+            if item is None:
+                break
+            frame, pts = item
+            if self.size and (frame.shape[1], frame.shape[0]) != self.size:
+                frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+
+            with self.cond:
+                if self.live:
+                    # 只保留最新一幀
+                    if self.queue:
+                        self.queue.clear()
+                        self.dropped += 1
+                else:
+                    while self.running and len(self.queue) >= self.prefetch:
+                        self.cond.wait(0.1)
+                self.queue.append((frame, pts, time.perf_counter()))
+                self.cond.notify_all()
+
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def read(self, timeout=None):
+        """回傳 (ok, frame, pts)；frame 是預取執行緒解碼出的陣列本身，之後不再被來源改寫"""
+        if self.thread is None and not self.start():
+            return False, None, None
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self.cond:
+            while not self.queue and not self.finished:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False, None, None
+                self.cond.wait(remaining if remaining is not None else 0.1)
+            if not self.queue:
+                return False, None, None
+            frame, pts, _ = self.queue.popleft()
+            self.cond.notify_all()
+
+        self._pace(pts)
+        return True, frame, pts
+
+    def _pace(self, pts):
+        """realtime: 依 pts 與第一幀的差距等待，使播放速率與錄製時相同"""
+        if self.live or self.pace != "realtime" or pts is None:
+            return
+        wall = time.perf_counter()
+        if self.clock_start is None or pts < self.clock_start[1]:  # 第一幀或循環播放回到開頭
+            self.clock_start = (wall, pts)
+            return
+        delay = self.clock_start[0] + (pts - self.clock_start[1]) - wall
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.5:
+            self.clock_start = (wall, pts)  # 落後太多 (例如暫停過) 時重新對齊，不追趕
+
+    def close(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.opened:
+            self._close()
+        self.opened = False
+        self.queue.clear()
+
+    release = close  # 與 cv2.VideoCapture 相同的名稱
+
+    def describe(self):
+        kind = type(self).__name__.replace("Source", "").lower()
+        text = f"{kind} {self.width}x{self.height} @ {self.fps:.1f} fps"
+        if 'fourcc' in self.info:
+            text += f" {self.info['fourcc']}"
+        return text
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureSource(FrameSource):
+    """cv2.VideoCapture 包裝 (攝影機索引、影片檔、RTSP/HTTP URL)"""
+
+    def __init__(self, target, width=None, height=None, fps=None, fourcc=None, api=cv2.CAP_ANY,
+                 loop=False, live=None, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target
+        self.request = {'width': width, 'height': height, 'fps': fps, 'fourcc': fourcc}
+        self.api = api
+        self.loop = loop
+        self.live = live if live is not None else not (isinstance(target, str) and Path(target).is_file())
+        self.cap = None
+        self.index = 0
+
+    def _open(self):
+        self.cap = cv2.VideoCapture(self.target, self.api)
+        if not self.cap.isOpened():
+            return False
+        if self.live:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.negotiate()
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.info['fourcc'] = fourcc_name(self.cap.get(cv2.CAP_PROP_FOURCC))
+        if not self.live:
+            self.info['frames'] = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return True
+
+    def negotiate(self):
+        """依序設定 FOURCC → 解析度 → FPS (許多 UVC 攝影機要先切 MJPG 才支援高解析度)，再讀回實際值"""
+        request = self.request
+        if request['fourcc']:
+            self.cap.set(cv2.CAP_PROP_FOURCC, fourcc_code(request['fourcc']))
+        if request['width'] and request['height']:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, request['width'])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, request['height'])
+        if request['fps']:
+            self.cap.set(cv2.CAP_PROP_FPS, request['fps'])
+
+        actual = {
+            'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': self.cap.get(cv2.CAP_PROP_FPS),
+            'fourcc': fourcc_name(self.cap.get(cv2.CAP_PROP_FOURCC)),
+        }
+        mismatch = {}
+        for key, wanted in request.items():
+            if not wanted:
+                continue
+            got = actual[key]
+            same = got.upper() == str(wanted).upper() if key == 'fourcc' else abs(got - wanted) < 0.5
+            if not same:
+                mismatch[key] = (wanted, got)
+        self.info['negotiated'] = actual
+        self.info['mismatch'] = mismatch
+        return actual
+
+    def _grab(self):
+        if self.live:
+            frame = self._grab_live()
+            if frame is None:
+                return None
+            self.index += 1
+            return frame, time.perf_counter()
+
+        ret, frame = self.cap.read()
+        if not ret:
+            if self.loop and self.index > 0:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self.index = 0
+                ret, frame = self.cap.read()
+            if not ret:
+                return None
+
+        msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        pts = msec / 1000.0 if msec > 0 or self.index == 0 else self.index / (self.fps or 30.0)
+        self.index += 1
+        return frame, pts
+
+    def _grab_live(self):
+        """攝影機 / RTSP: 讀取失敗時以遞增間隔重試，連續 REOPEN_AFTER 次失敗就重新開啟；close() 後回傳 None"""
+        failures = 0
+        delay = RETRY_DELAY
+        while self.running:
+            ret, frame = self.cap.read() if self.cap is not None else (False, None)
+            if ret:
+                return frame
+            failures += 1
+            self.info['read_failures'] = self.info.get('read_failures', 0) + 1
+            if failures % REOPEN_AFTER == 0:
+                self._reopen()
+                delay = RETRY_DELAY
+                continue
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+        return None
+
+    def _reopen(self):
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = cv2.VideoCapture(self.target, self.api)
+        self.info['reconnects'] = self.info.get('reconnects', 0) + 1
+        if self.cap.isOpened():
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.negotiate()
+
+    def _close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageDirSource(FrameSource):
+    """圖片資料夾 (或 glob)，依檔名排序，以指定 fps 作為時間戳"""
+
+    def __init__(self, path, fps=30.0, loop=False, **kwargs):
+        super().__init__(**kwargs)
+        self.path = str(path)
+        self.fps = float(fps)
+        self.loop = loop
+        self.files = []
+        self.index = 0
+        self.cycle = 0
+
+    def _open(self):
+        path = Path(self.path)
+        if path.is_dir():
+            files = [p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS]
+        else:
+            files = [Path(p) for p in glob.glob(self.path) if Path(p).suffix.lower() in IMAGE_EXTENSIONS]
+        self.files = sorted(files)
+        if not self.files:
+            return False
+        first = cv2.imread(str(self.files[0]))
+        if first is None:
+            return False
+        self.height, self.width = first.shape[:2]
+        self.info['frames'] = len(self.files)
+        return True
+
+    def _grab(self):
+        while True:
+            if self.index >= len(self.files):
+                if not self.loop:
+                    return None
+                self.index = 0
+                self.cycle += 1
+            path = self.files[self.index]
+            self.index += 1
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                pts = (self.cycle * len(self.files) + self.index - 1) / self.fps
+                return frame, pts
+
+
+class SyntheticSource(FrameSource):
+    """合成畫面: 在雜訊背景上移動的彩色方塊/圓形 (固定亂數種子，可重現)
+
+    沒有攝影機的機器上做吞吐量測試用；frames=None 表示無限。
+    """
+
+    def __init__(self, width=1280, height=720, fps=30.0, frames=None, objects=6, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        self.width, self.height = int(width), int(height)
+        self.fps = float(fps)
+        self.frames = frames
+        self.rng = np.random.default_rng(seed)
+        self.objects = objects
+        self.index = 0
+        self.background = None
+        self.shapes = None
+
+    def _open(self):
+        h, w = self.height, self.width
+        noise = self.rng.integers(0, 40, size=(h // 8 + 1, w // 8 + 1, 3), dtype=np.uint8)
+        self.background = cv2.resize(noise, (w, h), interpolation=cv2.INTER_LINEAR) + 60
+        side = min(w, h)
+        self.shapes = [{
+            'pos': self.rng.uniform([0, 0], [w, h]),
+            'vel': self.rng.uniform(-4, 4, size=2) * side / 480,
+            'size': int(self.rng.uniform(0.05, 0.15) * side),
+            'color': tuple(int(c) for c in self.rng.integers(80, 256, size=3)),
+            'circle': bool(self.rng.integers(0, 2)),
+        } for _ in range(self.objects)]
+        if self.frames is not None:
+            self.info['frames'] = self.frames
+        return True
+
+    def _grab(self):
+        if self.frames is not None and self.index >= self.frames:
+            return None
+        frame = self.background.copy()
+        limits = np.array([self.width, self.height], dtype=np.float64)
+        for shape in self.shapes:
+            shape['pos'] += shape['vel']
+            bounce = (shape['pos'] < 0) | (shape['pos'] > limits)
+            shape['vel'][bounce] *= -1
+            shape['pos'] = np.clip(shape['pos'], 0, limits)
+            x, y = (int(v) for v in shape['pos'])
+            r = shape['size'] // 2
+            if shape['circle']:
+                cv2.circle(frame, (x, y), r, shape['color'], -1)
+            else:
+                cv2.rectangle(frame, (x - r, y - r), (x + r, y + r), shape['color'], -1)
+        pts = self.index / self.fps
+        self.index += 1
+        return frame, pts
+
+
+def parse_synthetic(spec):
+    """'synthetic' / 'synthetic:1280x720' / 'synthetic:1280x720@60' → 參數 dict"""
+    options = {}
+    _, _, rest = spec.partition(":")
+    if rest:
+        size, _, fps = rest.partition("@")
+        if size:
+            w, _, h = size.lower().partition("x")
+            options['width'], options['height'] = int(w), int(h)
+        if fps:
+            options['fps'] = float(fps)
+    return options
+
+
+def open_source(spec, pace="realtime", prefetch=4, size=None, width=None, height=None, fps=None,
+                fourcc=None, loop=False):
+    """依描述建立來源 (尚未開啟)
+
+    - 整數或數字字串 → 攝影機 (width/height/fps/fourcc 為協商請求)
+    - 'synthetic[:WxH[@FPS]]' → 合成畫面
+    - 資料夾或含萬用字元的路徑 → 圖片資料夾 (fps 為播放速率，預設 30)
+    - 其他 (影片檔、RTSP/HTTP URL) → cv2.VideoCapture
+    """
+    common = dict(pace=pace, prefetch=prefetch, size=size)
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CaptureSource(int(spec), width=width, height=height, fps=fps, fourcc=fourcc, live=True, **common)
+
+    spec = str(spec)
+    if spec == "synthetic" or spec.startswith("synthetic:"):
+        options = parse_synthetic(spec)
+        if fps and 'fps' not in options:
+            options['fps'] = fps
+        return SyntheticSource(**options, **common)
+    if Path(spec).is_dir() or any(c in spec for c in "*?["):
+        return ImageDirSource(spec, fps=fps or 30.0, loop=loop, **common)
+    return CaptureSource(spec, width=width, height=height, fps=fps, fourcc=fourcc, loop=loop, **common)
+
+
+def add_source_arguments(parser):
+    """argparse 共用參數 (GUI、SAM3.py、camera_stream.py)"""
+    parser.add_argument("--pace", default="realtime", choices=PACES,
+                        help="錄影來源的播放節奏: realtime 依時間戳，fast 盡可能快")
+    parser.add_argument("--width", type=int, help="攝影機要求的寬度")
+    parser.add_argument("--height", type=int, help="攝影機要求的高度")
+    parser.add_argument("--fps", type=float, help="攝影機要求的 FPS / 圖片資料夾播放速率")
+    parser.add_argument("--fourcc", help="攝影機要求的編碼，如 MJPG、YUYV")
+    parser.add_argument("--loop", action="store_true", help="影片/圖片資料夾播完後從頭循環")
+    return parser
+
+
+def source_options(args):
+    """由 add_source_arguments 解析結果取出 open_source 的參數"""
+    return dict(pace=args.pace, width=args.width, height=args.height, fps=args.fps,
+                fourcc=args.fourcc, loop=args.loop)
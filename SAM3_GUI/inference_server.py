@@ -0,0 +1,358 @@
+"""SAM3 推理伺服器 (獨立行程)：一個已載入的模型服務多個 GUI / 無介面 client
+
+影格經 multiprocessing.shared_memory 傳送 (client 建立 slot，伺服器直接讀取，不經 pickle)，
+回傳的是精簡結果: box、分數、類別與 RLE 編碼的 mask。GUI 的繪製與前後處理不再和推理搶同一個 GIL。
+
+連線以 multiprocessing 的 HMAC 金鑰驗證 (訊息經 pickle，金鑰外洩等於可在伺服器上執行任意程式碼)：
+金鑰由環境變數 SAM3_AUTHKEY 或 --authkey 指定，都沒有時伺服器產生隨機金鑰並印出；
+預設只允許綁定 loopback 位址，綁定其他介面需加 --allow-remote。
+
+用法:
+    export SAM3_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(16))")
+    python inference_server.py --address 127.0.0.1:6000
+    python main.py 0 --server 127.0.0.1:6000        # GUI 改用遠端推理 (同樣讀 SAM3_AUTHKEY)
+
+    client = InferenceClient("127.0.0.1:6000")      # authkey 預設讀 SAM3_AUTHKEY
+    client.connect()
+    client.configure(prompt=["dice"], conf=0.3)
+    request_id = client.submit(frame)
+    for request_id, detections, timing in client.poll(timeout=5):
+        ...
+"""
+import argparse
+import ipaddress
+import itertools
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+import device_profile
+import model_loader
+from mask_store import compact_detections, expand_detections
+from overlay import extract_detections
+from prompt_cache import PromptEmbeddingCache
+
+DEFAULT_ADDRESS = "127.0.0.1:6000"
+AUTHKEY_ENV = "SAM3_AUTHKEY"
+
+
+def parse_address(address):
+    """'host:port' → (host, port)"""
+    if isinstance(address, tuple):
+        return address
+    host, _, port = str(address).rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def resolve_authkey(authkey=None):
+    """明確指定的金鑰 → 環境變數 SAM3_AUTHKEY → None"""
+    authkey = authkey or os.environ.get(AUTHKEY_ENV)
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    return authkey or None
+
+
+def is_loopback(host):
+    """host 解析後的所有位址都是 loopback (127.0.0.0/8、::1) 時為 True"""
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(info[4][0].split('%')[0]).is_loopback for info in infos)
+
+
+def attach_shared_memory(name):
+    """附掛 client 建立的 shared memory；伺服器不擁有它，不能讓 resource_tracker 在結束時刪除"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class ClientSession:
+    """伺服器端的一個 client 連線: shared memory slot 與各自的推理設定"""
+
+    def __init__(self, conn, client_id):
+        self.conn = conn
+        self.client_id = client_id
+        self.send_lock = threading.Lock()
+        self.shm = None
+        self.slot_bytes = 0
+        self.config = {'prompt': [], 'conf': 0.25, 'bboxes': [], 'labels': []}
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def attach(self, name, slot_bytes):
+        self.detach()
+        self.shm = attach_shared_memory(name)
+        self.slot_bytes = slot_bytes
+
+    def frame(self, slot, shape, dtype):
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def detach(self):
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                pass  # 推理執行緒仍持有這塊記憶體的 view；行程結束時釋放
+            self.shm = None
+
+
+class InferenceServer:
+    """一個模型、多個 client；所有請求依到達順序由同一個推理執行緒處理"""
+
+    def __init__(self, model_path, profile=None, address=DEFAULT_ADDRESS, authkey=None,
+                 warmup_runs=1, allow_remote=False):
+        """authkey 為 None 時讀 SAM3_AUTHKEY，仍沒有則產生隨機金鑰 (serve_forever 時印出)；
+        allow_remote=False 時拒絕綁定非 loopback 位址"""
+        self.model_path = model_path
+        self.profile = profile or device_profile.resolve_profile()
+        self.address = parse_address(address)
+        if not allow_remote and not is_loopback(self.address[0]):
+            raise ValueError(f"Refusing to listen on non-loopback address {self.address[0]} "
+                             f"(use --allow-remote on a trusted network)")
+        self.authkey = resolve_authkey(authkey)
+        self.generated_key = self.authkey is None
+        if self.generated_key:
+            self.authkey = secrets.token_hex(16).encode()
+        self.warmup_runs = warmup_runs
+        self.predictor = None
+        self.prompt_cache = PromptEmbeddingCache()  # 所有 client 共用
+        self.requests = queue.Queue()
+        self.client_ids = itertools.count()
+        self.running = False
+        self.served = 0
+
+    def load(self):
+        predictor, startup = model_loader.load_predictor(self.model_path, self.profile, progress=print)
+        startup.update(model_loader.warmup(predictor, self.warmup_runs))
+        self.prompt_cache.install(predictor)
+        self.predictor = predictor
+        print(f"執行設定: {device_profile.describe(self.profile)}")
+        print(f"啟動計時: {model_loader.format_startup(startup)}")
+
+    def serve_forever(self):
+        if self.predictor is None:
+            self.load()
+        self.running = True
+        threading.Thread(target=self.worker_loop, daemon=True).start()
+
+        with connection.Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Listening on {self.address[0]}:{self.address[1]}")
+            if self.generated_key:
+                print(f"Authkey (set {AUTHKEY_ENV} to this on clients): {self.authkey.decode()}")
+            while self.running:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, connection.AuthenticationError):
+                    continue
+                session = ClientSession(conn, next(self.client_ids))
+                threading.Thread(target=self.client_loop, args=(session,), daemon=True).start()
+
+    def client_loop(self, session):
+        """接收單一 client 的訊息；infer 請求排入共用佇列"""
+        session.send(('ready', device_profile.describe(self.profile)))
+        print(f"client {session.client_id} connected")
+        try:
+            while self.running:
+                message = session.conn.recv()
+                kind = message[0]
+                if kind == 'attach':
+                    _, name, slot_bytes = message
+                    session.attach(name, slot_bytes)
+                elif kind == 'config':
+                    session.config.update(message[1])
+                elif kind == 'infer':
+                    self.requests.put((session, message, {**session.config, **message[5]}))
+                elif kind == 'close':
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            # 佇列中仍可能有這個 client 的請求；推理執行緒看到 shm 為 None 時略過
+            session.detach()
+            session.conn.close()
+            print(f"client {session.client_id} disconnected")
+
+    def worker_loop(self):
+        while self.running:
+            session, message, config = self.requests.get()
+            _, request_id, slot, shape, dtype, _ = message
+            try:
+                if session.shm is None:
+                    continue
+                frame = session.frame(slot, shape, dtype)
+                detections, timing = self.infer(frame, config)
+                del frame
+                session.send(('result', request_id, slot, compact_detections(detections), timing))
+                self.served += 1
+            except (EOFError, OSError, BrokenPipeError):
+                pass
+            except Exception as e:
+                try:
+                    session.send(('error', request_id, slot, str(e)[:200]))
+                except Exception:
+                    pass
+
+    def infer(self, frame, config):
+        """單幀推理；timing 為 encode / decode 耗時 (秒)"""
+        predictor = self.predictor
+        predictor.args.conf = config['conf']
+        prompt, bboxes, labels = config['prompt'], config['bboxes'], config['labels']
+
+        start = time.perf_counter()
+        predictor.set_image(frame)
+        encoded = time.perf_counter()
+
+        if prompt and bboxes:
+            results = predictor(text=prompt, bboxes=bboxes, labels=labels)
+        elif prompt:
+            results = predictor(text=prompt)
+        elif bboxes:
+            results = predictor(bboxes=bboxes, labels=labels)
+        else:
+            results = None
+
+        detections = extract_detections(results[0]) if results and len(results) > 0 else None
+        decoded = time.perf_counter()
+        return detections, {'encode': encoded - start, 'decode': decoded - encoded}
+
+
+class InferenceClient:
+    """連到 InferenceServer；影格寫入自己建立的 shared memory slot，只傳送 slot 索引"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, slots=4):
+        """authkey 為 None 時讀 SAM3_AUTHKEY；兩者都沒有時無法連線"""
+        self.address = parse_address(address)
+        self.authkey = resolve_authkey(authkey)
+        if self.authkey is None:
+            raise ValueError(f"No authkey: set {AUTHKEY_ENV} to the server's key")
+        self.num_slots = slots
+        self.conn = None
+        self.shm = None
+        self.slot_bytes = 0
+        self.free_slots = []
+        self.pending = {}  # request_id → slot
+        self.request_ids = itertools.count()
+        self.server_info = None
+
+    def connect(self):
+        self.conn = connection.Client(self.address, authkey=self.authkey)
+        message = self.conn.recv()
+        self.server_info = message[1] if message[0] == 'ready' else None
+        return self.server_info
+
+    def configure(self, **config):
+        """prompt / conf / bboxes / labels；之後送出的請求都套用"""
+        self.conn.send(('config', config))
+
+    def _ensure_capacity(self, nbytes):
+        if self.shm is not None and nbytes <= self.slot_bytes:
+            return True
+        if self.pending:
+            return False  # 仍有請求在使用舊的 slot，等全部回來再重新配置
+        self._release_shm()
+        self.slot_bytes = nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes * self.num_slots)
+        self.free_slots = list(range(self.num_slots))
+        self.conn.send(('attach', self.shm.name, self.slot_bytes))
+        return True
+
+    def submit(self, frame, **overrides):
+        """送出一幀 (overrides 只套用在這一幀，例如 bboxes=[])；沒有空閒 slot 時回傳 None"""
+        frame = np.ascontiguousarray(frame)
+        if not self._ensure_capacity(frame.nbytes) or not self.free_slots:
+            return None
+        slot = self.free_slots.pop()
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        np.copyto(view, frame)
+
+        request_id = next(self.request_ids)
+        self.pending[request_id] = slot
+        self.conn.send(('infer', request_id, slot, frame.shape, frame.dtype.str, overrides))
+        return request_id
+
+    def poll(self, timeout=0.0):
+        """取回已完成的結果: [(request_id, detections 或 None, timing 或錯誤訊息), ...]"""
+        results = []
+        deadline = time.perf_counter() + timeout
+        while self.pending:
+            remaining = deadline - time.perf_counter()
+            if not self.conn.poll(max(0.0, remaining) if not results else 0):
+                break
+            message = self.conn.recv()
+            kind, request_id, slot = message[:3]
+            self.free_slots.append(slot)
+            self.pending.pop(request_id, None)
+            if kind == 'result':
+                results.append((request_id, expand_detections(message[3]), message[4]))
+            else:
+                results.append((request_id, None, message[3]))
+        return results
+
+    def _release_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(('close',))
+            except Exception:
+                pass
+            self.conn.close()
+            self.conn = None
+        self._release_shm()
+        self.pending.clear()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="監聽位址 host:port")
+    parser.add_argument("--authkey", help=f"連線驗證金鑰 (client 需相同)；預設讀 {AUTHKEY_ENV}，都沒有時產生隨機金鑰")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="允許綁定非 loopback 位址 (僅限可信任的網路，金鑰即執行權限)")
+    parser.add_argument("--model", default="sam3.pt")
+    parser.add_argument("--profile", default="auto", choices=["auto", *device_profile.PROFILES])
+    parser.add_argument("--imgsz", type=int)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--warmup", type=int, default=1)
+    args = parser.parse_args()
+
+    profile = device_profile.resolve_profile(args.profile, imgsz=args.imgsz, threads=args.threads)
+    try:
+        server = InferenceServer(args.model, profile, args.address, args.authkey, args.warmup, args.allow_remote)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n已處理 {server.served} 幀")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+def now():
+    return time.perf_counter()
+
+
+# 各階段 = (起點時間戳, 終點時間戳)；時間戳由 FrameSlot.stamp() 在各執行緒打上
+STAGES = {
+    'capture': ('capture_start', 'captured'),
+    'queue': ('queued', 'dequeued'),
+    'set_image': ('dequeued', 'encoded'),
+    'decode': ('encoded', 'decoded'),
+    'deliver': ('decoded', 'received'),
+    'vsync': ('received', 'render_start'),
+    'render': ('render_start', 'rendered'),
+    'present': ('rendered', 'presented'),
+    'total': ('capture_start', 'presented'),
+}
+
+
+class LatencyRecorder:
+    """記錄每幀各階段耗時 (ms)，提供 p50/p95 與 CSV/JSONL 匯出"""
+
+    def __init__(self, window=300, history=10000):
+        self.window = window
+        self.stage_ms = {stage: deque(maxlen=window) for stage in STAGES}
+        self.records = deque(maxlen=history)
+        self.counters = {'frames': 0, 'inference_dropped': 0, 'present_dropped': 0, 'ring_dropped': 0}
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """清除所有紀錄與計數 (例如 benchmark 丟掉暖機期間的數據)"""
+        with self.lock:
+            for values in self.stage_ms.values():
+                values.clear()
+            self.records.clear()
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_counter(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def record(self, camera_id, stamps):
+        """一幀顯示完成後呼叫；缺少時間戳的階段不列入統計"""
+        row = {'camera': camera_id, 't': stamps.get('presented', now())}
+        for stage, (begin, end) in STAGES.items():
+            if begin in stamps and end in stamps:
+                row[stage] = max(0.0, (stamps[end] - stamps[begin]) * 1000)
+        with self.lock:
+            self.counters['frames'] += 1
+            self.records.append(row)
+            for stage in STAGES:
+                if stage in row:
+                    self.stage_ms[stage].append(row[stage])
+
+    def percentiles(self):
+        with self.lock:
+            snapshot = {stage: np.array(values) for stage, values in self.stage_ms.items() if values}
+        return {stage: (float(np.percentile(v, 50)), float(np.percentile(v, 95)))
+                for stage, v in snapshot.items()}
+
+    def summary_lines(self):
+        lines = [f"{'stage':<10}{'p50':>8}{'p95':>8}  ms"]
+        for stage, (p50, p95) in self.percentiles().items():
+            lines.append(f"{stage:<10}{p50:>8.1f}{p95:>8.1f}")
+        with self.lock:
+            counters = dict(self.counters)
+        lines.append(" | ".join(f"{k} {v}" for k, v in counters.items()))
+        return lines
+
+    def export(self, path):
+        """副檔名 .csv 輸出 CSV，其餘輸出 JSONL"""
+        with self.lock:
+            rows = list(self.records)
+        path = str(path)
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['camera', 't', *STAGES])
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row) + '\n')
+        return len(rows)
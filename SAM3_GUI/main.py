@@ -1,16 +1,32 @@
 import sys
+import argparse
 import cv2
 import numpy as np
 from pathlib import Path
-from queue import Queue, Empty
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLineEdit, QLabel, QSlider, QFrame, QScrollArea,
-    QButtonGroup, QRadioButton
+    QButtonGroup, QRadioButton, QCheckBox, QGridLayout, QFileDialog
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QMutex, QPoint, QRect
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QMutex, QWaitCondition, QPoint, QRect
 from PyQt6.QtGui import QImage, QPixmap, QFont, QPainter, QPen, QColor
 
+from analytics import ObjectAnalytics
+import device_profile
+from exemplar_bank import SET_SUFFIX, ExemplarBank, load_sample_set, save_sample_set
+import model_loader
+from frame_ring import FrameRing, FrameSlot, frame_array
+from frame_source import add_source_arguments, open_source, source_options
+from inference_server import InferenceClient
+from latency import LatencyRecorder, now
+from mask_store import compact_detections
+from motion_gate import MotionGate
+from overlay import OverlayRenderer, extract_detections, summarize_classes
+from prompt_cache import PromptEmbeddingCache
+from roi import RoiPlanner, merge_roi_detections, roi_imgsz
+from scheduler import LatencyBudgetScheduler
+from tracker import KeyframeTracker
+
 
 class VideoLabel(QLabel):
     """可框選的影像顯示元件"""
@@ -29,8 +45,13 @@ class VideoLabel(QLabel):
     def set_original_size(self, width, height):
         self.original_size = (width, height)
 
-    def set_current_frame(self, frame):
-        self.current_frame = frame
+    def set_current_frame(self, slot):
+        # 持有目前畫面的 slot 供框選裁切，釋放上一個
+        if isinstance(slot, FrameSlot):
+            slot.retain()
+        if isinstance(self.current_frame, FrameSlot):
+            self.current_frame.release()
+        self.current_frame = slot
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -53,7 +74,7 @@ class VideoLabel(QLabel):
                 if bbox and self.current_frame is not None:
                     self.temp_bbox = bbox
                     x1, y1, x2, y2 = bbox
-                    cropped = self.current_frame[y1:y2, x1:x2].copy()
+                    cropped = frame_array(self.current_frame)[y1:y2, x1:x2].copy()
                     self.bbox_selected.emit(bbox, cropped)
             self.update()
 
@@ -158,80 +179,217 @@ class SampleItem(QFrame):
 
 
 class CameraThread(QThread):
-    frame_ready = pyqtSignal(np.ndarray)
+    frame_ready = pyqtSignal(int, object)  # camera_id, FrameSlot (接收端負責 release)
+    source_info = pyqtSignal(int, str)     # camera_id, 來源描述 (含解析度/FOURCC 協商結果)
 
-    def __init__(self):
+    def __init__(self, source=0, camera_id=0, ring_slots=8, scheduler=None, options=None):
         super().__init__()
         self.running = False
-        self.camera = None
+        self.source = source
+        self.options = options or {}
+        self.camera_id = camera_id
+        self.ring = FrameRing(ring_slots)
+        self.scheduler = scheduler
+        self.frame_source = None
+
+    def wait_for_demand(self):
+        """等推理端要求下一幀；即時來源的預取執行緒在此期間持續更新最新畫面"""
+        interval = self.scheduler.min_interval or 0.03
+        while self.running:
+            if self.scheduler.wait_for_demand(self.camera_id, interval):
+                return True
+        return False
 
     def run(self):
-        self.camera = cv2.VideoCapture(0)
+        self.frame_source = open_source(self.source, **self.options)
         self.running = True
+        if not self.frame_source.start():
+            self.source_info.emit(self.camera_id, f"Cannot open {self.source}")
+            return
 
-        while self.running:
-            if self.camera and self.camera.isOpened():
-                ret, frame = self.camera.read()
-                if ret:
-                    self.frame_ready.emit(frame.copy())
-            self.msleep(30)
+        description = self.frame_source.describe()
+        mismatch = self.frame_source.info.get('mismatch')
+        if mismatch:
+            description += " (requested " + ", ".join(f"{k} {w}" for k, (w, _) in mismatch.items()) + ")"
+        self.source_info.emit(self.camera_id, description)
 
-        if self.camera:
-            self.camera.release()
+        last_capture = 0.0
+
+        if self.scheduler:
+            self.scheduler.register(self.camera_id)
+
+        while self.running:
+            if self.scheduler:
+                if not self.wait_for_demand():
+                    break
+                wait = self.scheduler.min_interval - (now() - last_capture)
+                if wait > 0:
+                    self.msleep(int(wait * 1000))
+                last_capture = now()
+
+            capture_start = now()
+            slot = self.ring.acquire()
+            if slot is None:
+                # slot 全部占用: 仍取走一幀，避免錄影來源的節奏落後
+                ok, _, _ = self.frame_source.read(timeout=0.5)
+            else:
+                slot.stamp('capture_start', capture_start)
+                # 預取執行緒解碼好的陣列直接交給 slot (不複製)
+                ok, frame, _ = self.frame_source.read(timeout=0.5)
+                if ok:
+                    slot.array = frame
+                    slot.stamp('captured')
+                    self.frame_ready.emit(self.camera_id, slot)
+                else:
+                    slot.release()
+            if not ok and self.frame_source.finished:
+                self.source_info.emit(self.camera_id, "End of stream")
+                break
+
+        self.frame_source.close()
 
     def stop(self):
         self.running = False
         self.wait()
 
 
+class ModelLoaderThread(QThread):
+    """在背景匯入 ultralytics、載入權重並暖機，GUI 與攝影機不必等待"""
+    progress = pyqtSignal(str)
+    loaded = pyqtSignal(object, object)  # predictor, 啟動計時 (秒)
+    failed = pyqtSignal(str)
+
+    def __init__(self, model_path, profile=None, conf=0.25, warmup_runs=1):
+        super().__init__()
+        self.model_path = model_path
+        self.profile = profile
+        self.conf = conf
+        self.warmup_runs = warmup_runs
+
+    def run(self):
+        start = now()
+        try:
+            predictor, timings = model_loader.load_predictor(
+                self.model_path, self.profile, self.conf, progress=self.progress.emit)
+            timings.update(model_loader.warmup(predictor, self.warmup_runs, progress=self.progress.emit))
+            timings['ready'] = now() - start
+            self.loaded.emit(predictor, timings)
+        except Exception as e:
+            self.failed.emit(str(e)[:30])
+
+
 class InferenceThread(QThread):
-    result_ready = pyqtSignal(np.ndarray)
+    result_ready = pyqtSignal(int, object, object)  # camera_id, FrameSlot, detections (None 表示無結果)
+    structured_ready = pyqtSignal(int, float, object)  # camera_id, 擷取時間戳, compact_detections(rle=False)
     status_update = pyqtSignal(str)
+    exemplar_encoded = pyqtSignal(int, object)  # sample id, embedding (None 表示失敗)
 
-    def __init__(self):
+    EXEMPLAR_CAMERA = 0  # 範例框是在第一台攝影機畫面上框選的
+
+    def __init__(self, latency=None, scheduler=None):
         super().__init__()
         self.running = False
         self.predictor = None
         self.model_loaded = False
-        self.frame_queue = Queue(maxsize=2)
+        self.loader = None
+        self.profile = None
+        self.startup = {}  # 啟動計時 (見 model_loader.format_startup)
+        self.latency = latency or LatencyRecorder()
+        self.scheduler = scheduler or LatencyBudgetScheduler()
+        self.timings = {}  # camera_id → 本輪推理的時間戳，送出前併入 slot.stamps
+
+        # 每台攝影機只保留最新一幀，推理時一次取走全部組成 batch
+        self.latest_frames = {}
+        self.frame_mutex = QMutex()
+        self.frame_available = QWaitCondition()
 
         self.text_prompt = []
         self.exemplar_bboxes = []  # list of [x1,y1,x2,y2]
         self.exemplar_labels = []  # list of 1 or 0
+        self.exemplar_embeddings = []  # 已編碼的範例 (ExemplarBank entries)，對所有畫面有效
+        self.pending_bank = False
+        self.pending_encodes = []  # (sample id, 來源畫面, bbox, is_positive)
         self.confidence = 0.25
         self.mutex = QMutex()
 
-    def load_model(self, model_path):
-        try:
-            from ultralytics.models.sam import SAM3SemanticPredictor
-            self.status_update.emit("Loading model...")
-
-            self.predictor = SAM3SemanticPredictor(overrides=dict(
-                conf=self.confidence,
-                task="segment",
-                mode="predict",
-                model=str(model_path),
-                device=0,
-                half=True
-            ))
-            self.model_loaded = True
-            self.status_update.emit("Ready")
-            return True
-        except Exception as e:
-            self.status_update.emit(f"Load failed: {str(e)[:30]}")
-            return False
+        # 靜止畫面沿用影像特徵
+        self.motion_gate = MotionGate()
+        self.motion_gate_enabled = False
+        self.feature_camera = None  # predictor 目前快取的是哪台攝影機的影像特徵
+
+        # 文字提示 embedding 快取
+        self.prompt_cache = PromptEmbeddingCache()
+        self.pending_precompute = False
+
+        # 關鍵幀 + 光流追蹤 (每台攝影機一個)
+        self.trackers = {}
+        self.tracking_enabled = False
+        self.pending_tracker_reset = False
+
+        # ROI 模式: 只編碼已知物件周圍的區域 (每台攝影機一個 planner)
+        self.roi_planners = {}
+        self.roi_enabled = False
+
+        # 範例框 embedding 庫
+        self.exemplar_bank = ExemplarBank()
+
+    def load_model(self, model_path, profile=None, warmup_runs=1):
+        """非同步載入；載入期間畫面照常顯示 (只是沒有偵測結果)"""
+        self.profile = profile or device_profile.resolve_profile()
+        self.loader = ModelLoaderThread(model_path, self.profile, self.confidence, warmup_runs)
+        self.loader.progress.connect(self.status_update.emit)
+        self.loader.loaded.connect(self.on_model_loaded)
+        self.loader.failed.connect(lambda message: self.status_update.emit(f"Load failed: {message}"))
+        self.loader.start()
+
+    def on_model_loaded(self, predictor, timings):
+        # 暖機之後才掛上快取，暖機用的假 prompt 不會占用快取與命中統計
+        self.prompt_cache.install(predictor)
+        self.exemplar_bank.install(predictor)
+
+        self.mutex.lock()
+        predictor.args.conf = self.confidence  # 載入期間可能已調整過
+        self.predictor = predictor
+        self.pending_precompute = True
+        self.startup = timings
+        self.model_loaded = True
+        self.mutex.unlock()
+
+        report = model_loader.format_startup(timings)
+        self.status_update.emit(f"Ready ({device_profile.describe(self.profile)}) | {report}")
 
     def set_prompt(self, text_prompt):
         self.mutex.lock()
         self.text_prompt = text_prompt
+        self.pending_precompute = True
+        self.pending_tracker_reset = True
         self.mutex.unlock()
 
-    def set_exemplars(self, bboxes, labels):
+    def set_exemplars(self, bboxes, labels, embeddings=()):
+        """bboxes/labels: 尚未編碼的範例框 (只對第一台攝影機有效)；embeddings: 已編碼的範例"""
         self.mutex.lock()
         self.exemplar_bboxes = bboxes
         self.exemplar_labels = labels
+        self.exemplar_embeddings = list(embeddings)
+        self.pending_bank = True
+        self.pending_tracker_reset = True
         self.mutex.unlock()
 
+    def encode_exemplar(self, sample_id, frame, bbox, is_positive):
+        """排入推理執行緒，在來源畫面上編碼一次；完成後發出 exemplar_encoded"""
+        self.mutex.lock()
+        self.pending_encodes.append((sample_id, frame, bbox, is_positive))
+        self.mutex.unlock()
+
+    def run_pending_encodes(self, encodes):
+        for sample_id, frame, bbox, is_positive in encodes:
+            try:
+                embedding = self.exemplar_bank.encode(frame, bbox, is_positive)
+            except:
+                embedding = None
+            self.feature_camera = None  # set_image 已覆寫影像特徵
+            self.exemplar_encoded.emit(sample_id, embedding)
+
     def set_confidence(self, conf):
         self.mutex.lock()
         self.confidence = conf
@@ -239,83 +397,409 @@ class InferenceThread(QThread):
             self.predictor.args.conf = conf
         self.mutex.unlock()
 
-    def add_frame(self, frame):
+    def set_tracking(self, enabled):
+        self.mutex.lock()
+        self.tracking_enabled = enabled
+        self.pending_tracker_reset = True
+        self.mutex.unlock()
+
+    def set_roi_mode(self, enabled):
+        self.mutex.lock()
+        self.roi_enabled = enabled
+        self.pending_tracker_reset = True
+        self.mutex.unlock()
+
+    def set_motion_gate(self, enabled, threshold=None):
+        self.mutex.lock()
+        self.motion_gate_enabled = enabled
+        if threshold is not None:
+            self.motion_gate.threshold = threshold
+        self.motion_gate.reset()
+        self.mutex.unlock()
+
+    def add_frame(self, slot, camera_id=0):
+        slot.retain()
+        slot.stamp('queued')
+        self.frame_mutex.lock()
+        dropped = self.latest_frames.get(camera_id)
+        self.latest_frames[camera_id] = slot
+        self.frame_available.wakeOne()
+        self.frame_mutex.unlock()
+        if dropped is not None:
+            self.latency.count('inference_dropped')
+            dropped.release()
+
+    def take_frames(self, timeout_ms=100):
+        self.frame_mutex.lock()
+        if not self.latest_frames:
+            # 推理端空閒，才要求攝影機擷取下一幀
+            self.scheduler.request_frames()
+            self.frame_available.wait(self.frame_mutex, timeout_ms)
+        frames = self.latest_frames
+        self.latest_frames = {}
+        self.frame_mutex.unlock()
+        for slot in frames.values():
+            slot.stamp('dequeued')
+        return frames
+
+    def infer_single(self, camera_id, frame, current_prompt, current_bboxes, current_labels, gate_enabled):
+        has_exemplars = len(current_bboxes) > 0
+
+        # 畫面靜止時跳過影像編碼器，只重跑 prompt/decoder
+        if self.feature_camera != camera_id:
+            self.motion_gate.reset()
+        static = gate_enabled and self.motion_gate.is_static(frame)
+        reuse = static and self.feature_camera == camera_id
+        if not reuse:
+            self.predictor.set_image(frame)
+            self.feature_camera = camera_id
+        self.timings[camera_id] = {'encoded': now()}
+
+        if current_prompt and has_exemplars:
+            results = self.predictor(
+                text=current_prompt,
+                bboxes=current_bboxes,
+                labels=current_labels
+            )
+        elif current_prompt:
+            results = self.predictor(text=current_prompt)
+        elif has_exemplars:
+            results = self.predictor(
+                bboxes=current_bboxes,
+                labels=current_labels
+            )
+        else:
+            results = None
+
+        detections = extract_detections(results[0]) if results and len(results) > 0 else None
+        self.timings[camera_id]['decoded'] = now()
+        return detections
+
+    def infer_batch(self, frames, current_prompt):
+        """多台攝影機的最新幀合成一個 batch，只呼叫一次 predictor"""
+        results = self.predictor(source=list(frames.values()), text=current_prompt)
+        # batch 推理會覆寫 predictor 內的影像特徵
+        self.feature_camera = None
+
+        # batch 呼叫無法拆開編碼與解碼，整段計入 set_image
+        encoded = now()
+        outputs = {}
+        for camera_id, result in zip(frames, results or []):
+            outputs[camera_id] = extract_detections(result)
+        decoded = now()
+        for camera_id in frames:
+            self.timings[camera_id] = {'encoded': encoded, 'decoded': decoded}
+        return outputs
+
+    def infer_rois(self, camera_id, frame, rois, current_prompt):
+        """只編碼 ROI 裁切 (以接近原生解析度的 imgsz 一次 batch)，再映射回整張畫面座標"""
+        crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in rois]
+        full_imgsz = self.predictor.args.imgsz
+        max_imgsz = full_imgsz if isinstance(full_imgsz, int) else max(full_imgsz)
+
+        device_profile.set_imgsz(self.predictor, roi_imgsz(rois, max_imgsz))
         try:
-            if self.frame_queue.full():
+            results = self.predictor(source=crops, text=current_prompt)
+        finally:
+            device_profile.set_imgsz(self.predictor, max_imgsz)
+        self.feature_camera = None
+        encoded = now()
+
+        parts = [(roi, extract_detections(result)) for roi, result in zip(rois, results or [])]
+        detections = merge_roi_detections(parts, frame.shape)
+        self.timings[camera_id] = {'encoded': encoded, 'decoded': now()}
+        return detections
+
+    def infer_frames(self, frames, current_prompt, current_bboxes, current_labels, gate_enabled,
+                     roi_enabled=False):
+        has_exemplars = len(current_bboxes) > 0
+        outputs = {}
+        batch = dict(frames)
+
+        # ROI 模式 (需要文字提示): 有已知物件時只跑裁切區域，定期全畫面
+        roi_cameras = set()
+        if roi_enabled and current_prompt:
+            for camera_id, frame in frames.items():
+                planner = self.roi_planners.setdefault(camera_id, RoiPlanner())
+                exemplars = current_bboxes if camera_id == self.EXEMPLAR_CAMERA else None
+                rois = planner.plan(frame.shape, exemplars)
+                if not rois:
+                    continue
                 try:
-                    self.frame_queue.get_nowait()
-                except Empty:
-                    pass
-            self.frame_queue.put_nowait(frame)
-        except:
-            pass
+                    outputs[camera_id] = self.infer_rois(camera_id, frame, rois, current_prompt)
+                except:
+                    outputs[camera_id] = None
+                roi_cameras.add(camera_id)
+                del batch[camera_id]
+
+        # 範例框只對框選的那台攝影機有意義，單獨走 set_image 路徑
+        single = {}
+        if has_exemplars and self.EXEMPLAR_CAMERA in batch:
+            single[self.EXEMPLAR_CAMERA] = batch.pop(self.EXEMPLAR_CAMERA)
+        if len(batch) == 1 or not current_prompt:
+            single.update(batch)
+            batch = {}
+
+        for camera_id, frame in single.items():
+            bboxes = current_bboxes if camera_id == self.EXEMPLAR_CAMERA else []
+            labels = current_labels if camera_id == self.EXEMPLAR_CAMERA else []
+            if not current_prompt and not bboxes:
+                continue
+            try:
+                outputs[camera_id] = self.infer_single(
+                    camera_id, frame, current_prompt, bboxes, labels, gate_enabled)
+            except:
+                pass
+
+        if batch:
+            try:
+                outputs.update(self.infer_batch(batch, current_prompt))
+            except:
+                pass
+
+        if roi_enabled:
+            for camera_id in frames:
+                planner = self.roi_planners.setdefault(camera_id, RoiPlanner())
+                planner.update(outputs.get(camera_id), full_frame=camera_id not in roi_cameras)
+        return outputs
+
+    def observe_keyframes(self, slots, keyframes):
+        """回報完整推理耗時，必要時依延遲預算變更 imgsz"""
+        for camera_id in keyframes:
+            timing = self.timings.get(camera_id, {})
+            if 'decoded' in timing and 'dequeued' in slots[camera_id].stamps:
+                self.scheduler.observe_inference(
+                    (timing['decoded'] - slots[camera_id].stamps['dequeued']) * 1000)
+
+        imgsz = self.scheduler.update_imgsz()
+        if imgsz:
+            device_profile.set_imgsz(self.predictor, imgsz)
+            self.feature_camera = None
+            self.status_update.emit(f"imgsz → {imgsz}")
 
     def run(self):
         self.running = True
 
         while self.running:
+            slots = {}
             try:
-                frame = self.frame_queue.get(timeout=0.1)
+                slots = self.take_frames()
+                if not slots:
+                    continue
+                frames = {camera_id: slot.array for camera_id, slot in slots.items()}
 
                 self.mutex.lock()
                 current_prompt = self.text_prompt.copy() if self.text_prompt else []
                 current_bboxes = self.exemplar_bboxes.copy()
                 current_labels = self.exemplar_labels.copy()
+                gate_enabled = self.motion_gate_enabled
+                precompute = self.pending_precompute
+                self.pending_precompute = False
+                tracking_enabled = self.tracking_enabled
+                roi_enabled = self.roi_enabled
+                bank_entries = self.exemplar_embeddings if self.pending_bank else None
+                self.pending_bank = False
+                encodes = self.pending_encodes if self.model_loaded else []
+                if encodes:
+                    self.pending_encodes = []
+                reset_trackers = self.pending_tracker_reset
+                self.pending_tracker_reset = False
                 self.mutex.unlock()
 
-                has_exemplars = len(current_bboxes) > 0
-
-                if self.model_loaded and (current_prompt or has_exemplars):
+                # prompt 變更時先跑一次 text encoder，之後每幀都命中快取
+                if self.model_loaded and precompute and current_prompt:
                     try:
-                        self.predictor.set_image(frame)
-
-                        if current_prompt and has_exemplars:
-                            results = self.predictor(
-                                text=current_prompt,
-                                bboxes=current_bboxes,
-                                labels=current_labels
-                            )
-                        elif current_prompt:
-                            results = self.predictor(text=current_prompt)
-                        elif has_exemplars:
-                            results = self.predictor(
-                                bboxes=current_bboxes,
-                                labels=current_labels
-                            )
-                        else:
-                            results = None
-
-                        if results and len(results) > 0:
-                            frame = results[0].plot()
+                        self.prompt_cache.precompute(current_prompt)
                     except:
                         pass
 
-                self.result_ready.emit(frame)
+                # 新存的範例框先在來源畫面上編碼，之後每幀直接沿用 embedding
+                if encodes:
+                    self.run_pending_encodes(encodes)
+                if bank_entries is not None:
+                    self.exemplar_bank.set_entries(bank_entries)
+                if not current_prompt and len(self.exemplar_bank):
+                    current_prompt = ["visual"]  # 只有範例時 SAM3 需要這個佔位文字提示
+
+                outputs = {}
+                if self.model_loaded and (current_prompt or current_bboxes):
+                    if reset_trackers:
+                        for tracker in self.trackers.values():
+                            tracker.reset()
+                        for planner in self.roi_planners.values():
+                            planner.reset()
+
+                    # 追蹤模式: 非關鍵幀以光流傳遞，只有關鍵幀送進模型
+                    keyframes = dict(frames)
+                    if tracking_enabled:
+                        for camera_id, frame in frames.items():
+                            tracker = self.trackers.setdefault(camera_id, KeyframeTracker())
+                            if not tracker.needs_keyframe(frame):
+                                encoded = now()
+                                outputs[camera_id] = tracker.propagate(frame)
+                                self.timings[camera_id] = {'encoded': encoded, 'decoded': now()}
+                                del keyframes[camera_id]
+
+                    if keyframes:
+                        detections = self.infer_frames(
+                            keyframes, current_prompt, current_bboxes, current_labels, gate_enabled,
+                            roi_enabled)
+                        self.observe_keyframes(slots, keyframes)
+                        for camera_id, frame in keyframes.items():
+                            if tracking_enabled:
+                                outputs[camera_id] = self.trackers[camera_id].update_keyframe(
+                                    frame, detections.get(camera_id))
+                            else:
+                                outputs[camera_id] = detections.get(camera_id)
+
+                # 只送出原始影格 slot 與偵測資料，繪製交給顯示端在顯示解析度完成
+                for camera_id in list(slots):
+                    self.emit_result(camera_id, slots.pop(camera_id), outputs.get(camera_id))
 
-            except Empty:
-                continue
             except:
                 continue
+            finally:
+                # 例外時未交出的 slot 也要歸還
+                for slot in slots.values():
+                    slot.release()
+
+    def emit_result(self, camera_id, slot, detections):
+        slot.stamps.update(self.timings.pop(camera_id, {}))
+        # 不在推理執行緒做 RLE：mask 以參照送出，需要時接收端呼叫 mask_store.encode_masks
+        t = slot.stamps.get('capture_start', now())
+        self.structured_ready.emit(camera_id, t, compact_detections(detections, rle=False))
+        self.result_ready.emit(camera_id, slot, detections)
 
     def stop(self):
         self.running = False
+        if self.loader:
+            self.loader.wait()
         self.wait()
 
 
+class RemoteInferenceThread(InferenceThread):
+    """推理交給另一個行程的 InferenceServer；影格經 shared memory 傳送，只收回精簡結果
+
+    只支援文字提示、範例框與信心度；追蹤、ROI、靜止畫面沿用與 embedding 庫需在本機推理。
+    """
+
+    def __init__(self, address, latency=None, scheduler=None):
+        super().__init__(latency, scheduler)
+        self.address = address
+        self.client = None
+
+    def load_model(self, model_path=None, profile=None, warmup_runs=1):
+        pass  # 模型由伺服器載入；連線在 run() 中進行，不阻塞 GUI
+
+    def connect(self):
+        try:
+            self.client = InferenceClient(self.address)
+            info = self.client.connect()
+        except Exception as e:
+            self.client = None
+            self.status_update.emit(f"Server unavailable: {str(e)[:30]}")
+            return False
+        self.model_loaded = True
+        self.status_update.emit(f"Connected to {self.address} ({info})")
+        return True
+
+    def run(self):
+        self.running = True
+        self.connect()
+        sent_config = None
+
+        while self.running:
+            slots = {}
+            try:
+                slots = self.take_frames()
+                if not slots:
+                    continue
+
+                self.mutex.lock()
+                config = {'prompt': list(self.text_prompt), 'conf': self.confidence,
+                          'bboxes': list(self.exemplar_bboxes), 'labels': list(self.exemplar_labels)}
+                self.mutex.unlock()
+
+                outputs = {}
+                if self.client and (config['prompt'] or config['bboxes']):
+                    if config != sent_config:
+                        self.client.configure(**config)
+                        sent_config = config
+
+                    # 範例框只對第一台攝影機有意義
+                    requests = {}
+                    for camera_id, slot in slots.items():
+                        overrides = {} if camera_id == self.EXEMPLAR_CAMERA else {'bboxes': [], 'labels': []}
+                        if not config['prompt'] and 'bboxes' in overrides:
+                            continue
+                        request_id = self.client.submit(slot.array, **overrides)
+                        if request_id is not None:
+                            requests[request_id] = camera_id
+
+                    deadline = now() + 5.0
+                    while requests and now() < deadline:
+                        for request_id, detections, timing in self.client.poll(timeout=0.1):
+                            camera_id = requests.pop(request_id, None)
+                            if camera_id is None:
+                                continue
+                            outputs[camera_id] = detections
+                            if isinstance(timing, dict):
+                                decoded = now()
+                                self.timings[camera_id] = {'encoded': decoded - timing['decode'], 'decoded': decoded}
+                                self.scheduler.observe_inference((timing['encode'] + timing['decode']) * 1000)
+                    if requests:
+                        self.status_update.emit("Server timeout")
+
+                for camera_id in list(slots):
+                    self.emit_result(camera_id, slots.pop(camera_id), outputs.get(camera_id))
+
+            except (EOFError, OSError):
+                self.model_loaded = False
+                self.client = None
+                self.status_update.emit("Server disconnected")
+            except:
+                continue
+            finally:
+                for slot in slots.values():
+                    slot.release()
+
+        if self.client:
+            self.client.close()
+
+
 class SAM3GUI(QMainWindow):
-    def __init__(self):
+    def __init__(self, sources=None, profile=None, scheduler=None, warmup_runs=1, source_options=None,
+                 server=None, predictor=None):
         super().__init__()
         self.setWindowTitle("ViT 測試")
         self.setMinimumSize(1200, 800)
 
-        self.camera_thread = None
+        self.sources = list(sources) if sources else [0]
+        self.source_options = source_options or {}
+        self.server = server  # InferenceServer 位址；None 表示在本行程推理
+        self.predictor = predictor  # 預先建立的 predictor (bench_pipeline.py 的替身)；None 表示載入 sam3.pt
+        self.profile = profile
+        self.warmup_runs = warmup_runs
+        self.overlay = OverlayRenderer()
+        self.latency = LatencyRecorder()
+        self.scheduler = scheduler or LatencyBudgetScheduler()
+        self.camera_threads = []
         self.inference_thread = None
         self.is_camera_on = False
+        self.text_prompt = []
+        self.class_summaries = {}  # camera_id → summarize_classes 結果
+        self.analytics = {}        # camera_id → ObjectAnalytics (滑動視窗計數、停留時間、處理量)
+
+        # 顯示合併: 每台攝影機只保留最新一個待顯示的結果，每個刷新週期最多繪製一次
+        self.pending_present = {}  # camera_id → (frame, detections)
+        self.present_cache = {}    # camera_id → 顯示尺寸、display_rect 與預先配置的緩衝區
 
         # Sample 相關
         self.pending_bbox = None
         self.pending_crop = None
-        self.samples = []  # list of {'bbox': [], 'crop': np.array, 'is_positive': bool}
+        self.samples = []  # list of {'id', 'bbox': [], 'crop': np.array, 'is_positive': bool, 'embedding'}
+        self.next_sample_id = 0
+        self.sample_set_dir = Path(__file__).parent / "sample_sets"
 
         self.init_ui()
         self.init_threads()
@@ -331,19 +815,53 @@ class SAM3GUI(QMainWindow):
         left_panel = QVBoxLayout()
         left_panel.setSpacing(10)
 
-        self.camera_label = VideoLabel()
-        self.camera_label.setMinimumSize(750, 560)
-        self.camera_label.setStyleSheet("""
+        # 每台攝影機一個畫面；第一個畫面可框選範例
+        views_layout = QGridLayout()
+        views_layout.setSpacing(10)
+        columns = 1 if len(self.sources) == 1 else 2
+        self.camera_labels = []
+        for i, source in enumerate(self.sources):
+            label = VideoLabel()
+            if len(self.sources) == 1:
+                label.setMinimumSize(750, 560)
+            else:
+                label.setMinimumSize(370, 278)
+            label.setStyleSheet("""
+                QLabel {
+                    background-color: #0a0a0a;
+                    border: 1px solid #333;
+                }
+            """)
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.setText("Camera Off")
+            label.setFont(QFont("Consolas", 14))
+            views_layout.addWidget(label, i // columns, i % columns)
+            self.camera_labels.append(label)
+
+        self.camera_label = self.camera_labels[0]
+        self.camera_label.bbox_selected.connect(self.on_bbox_selected)
+        left_panel.addLayout(views_layout)
+
+        # 延遲 HUD (疊在第一個畫面左上角)
+        self.hud_label = QLabel(self.camera_label)
+        self.hud_label.setStyleSheet("""
             QLabel {
-                background-color: #0a0a0a;
-                border: 1px solid #333;
+                background-color: rgba(0, 0, 0, 170); color: #0f0;
+                border: none; padding: 6px;
+                font-family: 'Consolas', monospace; font-size: 11px;
             }
         """)
-        self.camera_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.camera_label.setText("Camera Off")
-        self.camera_label.setFont(QFont("Consolas", 14))
-        self.camera_label.bbox_selected.connect(self.on_bbox_selected)
-        left_panel.addWidget(self.camera_label)
+        self.hud_label.move(8, 8)
+        self.hud_label.hide()
+        self.hud_timer = QTimer(self)
+        self.hud_timer.timeout.connect(self.update_hud)
+
+        screen = QApplication.primaryScreen()
+        refresh = screen.refreshRate() if screen else 60.0
+        self.present_timer = QTimer(self)
+        self.present_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.present_timer.setInterval(max(1, int(1000 / (refresh or 60.0))))
+        self.present_timer.timeout.connect(self.present_pending)
 
         self.status_label = QLabel("Ready")
         self.status_label.setStyleSheet("color: #666; font-size: 11px;")
@@ -408,6 +926,51 @@ class SAM3GUI(QMainWindow):
         conf_layout.addWidget(self.conf_value)
         right_panel.addLayout(conf_layout)
 
+        # Motion Gate
+        self.motion_check = QCheckBox("REUSE STATIC FRAMES")
+        self.motion_check.setStyleSheet("color: #888; font-size: 11px; font-weight: bold;")
+        self.motion_check.toggled.connect(self.on_motion_gate_changed)
+        right_panel.addWidget(self.motion_check)
+
+        motion_layout = QHBoxLayout()
+        self.motion_slider = QSlider(Qt.Orientation.Horizontal)
+        self.motion_slider.setMinimum(1)
+        self.motion_slider.setMaximum(40)
+        self.motion_slider.setValue(4)
+        self.motion_slider.setStyleSheet(self.conf_slider.styleSheet())
+        self.motion_slider.valueChanged.connect(self.on_motion_gate_changed)
+        motion_layout.addWidget(self.motion_slider)
+
+        self.motion_value = QLabel("2.0")
+        self.motion_value.setStyleSheet("color: #fff; font-size: 12px; min-width: 35px;")
+        motion_layout.addWidget(self.motion_value)
+        right_panel.addLayout(motion_layout)
+
+        # Latency HUD
+        hud_layout = QHBoxLayout()
+        self.hud_check = QCheckBox("LATENCY HUD")
+        self.hud_check.setStyleSheet("color: #888; font-size: 11px; font-weight: bold;")
+        self.hud_check.toggled.connect(self.toggle_hud)
+        hud_layout.addWidget(self.hud_check)
+
+        self.btn_export_latency = QPushButton("EXPORT")
+        self.btn_export_latency.setStyleSheet(self.get_button_style(secondary=True))
+        self.btn_export_latency.clicked.connect(self.export_latency)
+        hud_layout.addWidget(self.btn_export_latency)
+        right_panel.addLayout(hud_layout)
+
+        # ROI
+        self.roi_check = QCheckBox("ROI MODE")
+        self.roi_check.setStyleSheet("color: #888; font-size: 11px; font-weight: bold;")
+        self.roi_check.toggled.connect(self.on_roi_mode_changed)
+        right_panel.addWidget(self.roi_check)
+
+        # Tracking
+        self.tracking_check = QCheckBox("KEYFRAME TRACKING")
+        self.tracking_check.setStyleSheet("color: #888; font-size: 11px; font-weight: bold;")
+        self.tracking_check.toggled.connect(self.on_tracking_changed)
+        right_panel.addWidget(self.tracking_check)
+
         right_panel.addWidget(self.create_separator())
 
         # === SAMPLES 區域 ===
@@ -482,6 +1045,21 @@ class SAM3GUI(QMainWindow):
 
         right_panel.addLayout(sample_btn_layout)
 
+        # Sample set 存檔 / 載入 (含 embedding，之後的 session 不需重新編碼)
+        set_btn_layout = QHBoxLayout()
+
+        self.btn_save_set = QPushButton("SAVE SET")
+        self.btn_save_set.setStyleSheet(self.get_button_style(secondary=True))
+        self.btn_save_set.clicked.connect(self.save_sample_set)
+        set_btn_layout.addWidget(self.btn_save_set)
+
+        self.btn_load_set = QPushButton("LOAD SET")
+        self.btn_load_set.setStyleSheet(self.get_button_style(secondary=True))
+        self.btn_load_set.clicked.connect(self.load_sample_set)
+        set_btn_layout.addWidget(self.btn_load_set)
+
+        right_panel.addLayout(set_btn_layout)
+
         right_panel.addWidget(self.create_separator())
 
         # Apply
@@ -498,6 +1076,16 @@ class SAM3GUI(QMainWindow):
         self.current_settings.setWordWrap(True)
         right_panel.addWidget(self.current_settings)
 
+        # 各類別數量 / 平均分數 (同一次影像編碼，各 prompt 分別 decode)
+        classes_label = QLabel("CLASSES")
+        classes_label.setStyleSheet("color: #888; font-size: 11px; font-weight: bold;")
+        right_panel.addWidget(classes_label)
+
+        self.class_summary_label = QLabel("")
+        self.class_summary_label.setStyleSheet("color: #aaa; font-size: 10px; font-family: monospace;")
+        self.class_summary_label.setWordWrap(True)
+        right_panel.addWidget(self.class_summary_label)
+
         main_layout.addLayout(right_panel, stretch=1)
 
         # 全域樣式
@@ -555,13 +1143,22 @@ class SAM3GUI(QMainWindow):
             """
 
     def init_threads(self):
-        self.inference_thread = InferenceThread()
+        if self.server:
+            self.inference_thread = RemoteInferenceThread(self.server, self.latency, self.scheduler)
+        else:
+            self.inference_thread = InferenceThread(self.latency, self.scheduler)
         self.inference_thread.result_ready.connect(self.display_frame)
+        self.inference_thread.structured_ready.connect(self.on_structured_result)
         self.inference_thread.status_update.connect(self.update_status)
+        self.inference_thread.exemplar_encoded.connect(self.on_exemplar_encoded)
 
         model_path = Path(__file__).parent.parent / "sam3.pt"
-        self.inference_thread.load_model(model_path)
         self.inference_thread.start()
+        if self.predictor is not None:
+            self.inference_thread.profile = self.profile or device_profile.resolve_profile()
+            self.inference_thread.on_model_loaded(self.predictor, {})
+        else:
+            self.inference_thread.load_model(model_path, self.profile, self.warmup_runs)
 
     def toggle_camera(self):
         if self.is_camera_on:
@@ -570,52 +1167,157 @@ class SAM3GUI(QMainWindow):
             self.start_camera()
 
     def start_camera(self):
-        self.camera_thread = CameraThread()
-        self.camera_thread.frame_ready.connect(self.on_frame_captured)
-        self.camera_thread.start()
+        for camera_id, source in enumerate(self.sources):
+            camera_thread = CameraThread(source, camera_id, scheduler=self.scheduler,
+                                         options=self.source_options)
+            camera_thread.frame_ready.connect(self.on_frame_captured)
+            camera_thread.source_info.connect(self.on_source_info)
+            camera_thread.start()
+            self.camera_threads.append(camera_thread)
 
         self.is_camera_on = True
         self.btn_camera.setText("STOP")
         self.update_status("Camera on")
 
     def stop_camera(self):
-        if self.camera_thread:
-            self.camera_thread.stop()
-            self.camera_thread = None
+        for camera_thread in self.camera_threads:
+            camera_thread.stop()
+        self.camera_threads = []
 
         self.is_camera_on = False
         self.btn_camera.setText("START")
-        self.camera_label.setText("Camera Off")
-        self.camera_label.setPixmap(QPixmap())
+        for label in self.camera_labels:
+            label.setText("Camera Off")
+            label.setPixmap(QPixmap())
         self.update_status("Camera off")
 
-    def on_frame_captured(self, frame):
-        h, w = frame.shape[:2]
-        self.camera_label.set_original_size(w, h)
-        self.camera_label.set_current_frame(frame)
-
-        if self.inference_thread:
-            self.inference_thread.add_frame(frame.copy())
+    def on_source_info(self, camera_id, description):
+        prefix = f"cam{camera_id}: " if len(self.sources) > 1 else ""
+        self.update_status(prefix + description)
 
-    def display_frame(self, frame):
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame_rgb.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+    def on_frame_captured(self, camera_id, slot):
+        label = self.camera_labels[camera_id]
+        h, w = slot.shape[:2]
+        label.set_original_size(w, h)
+        label.set_current_frame(slot)
 
-        scaled_pixmap = QPixmap.fromImage(qt_image).scaled(
-            self.camera_label.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
+        if self.inference_thread:
+            self.inference_thread.add_frame(slot, camera_id)
+        slot.release()  # 釋放 CameraThread 的參考
+
+    def display_frame(self, camera_id, frame, detections=None):
+        """登記為待顯示 (取代尚未顯示的舊結果)；顯示端忙碌時延到下一個刷新週期才繪製"""
+        if isinstance(frame, FrameSlot):
+            frame.stamp('received')
+        replaced = self.pending_present.get(camera_id)
+        self.pending_present[camera_id] = (frame, detections)
+        if replaced is not None:
+            self.latency.count('present_dropped')
+            if isinstance(replaced[0], FrameSlot):
+                replaced[0].release()
+        if not self.present_timer.isActive():
+            # 空閒時立即繪製，之後一個刷新週期內到達的結果再合併
+            self.present_pending()
+            self.present_timer.start()
+
+    def present_pending(self):
+        if not self.pending_present:
+            self.present_timer.stop()
+            return
+        pending, self.pending_present = self.pending_present, {}
+        for camera_id, (frame, detections) in pending.items():
+            stamps = frame.stamps if isinstance(frame, FrameSlot) else {}
+            stamps['render_start'] = now()
+            try:
+                self.present_frame(camera_id, frame_array(frame), detections, stamps)
+                self.update_class_summary(camera_id, detections)
+                self.latency.record(camera_id, stamps)
+                if 'capture_start' in stamps:
+                    self.scheduler.observe_total((stamps['presented'] - stamps['capture_start']) * 1000)
+            finally:
+                if isinstance(frame, FrameSlot):
+                    frame.release()
+
+    def present_layout(self, camera_id, label, w, h):
+        """顯示尺寸與 display_rect 只在標籤或影格尺寸改變時重新計算，緩衝區同時重新配置"""
+        key = (label.width(), label.height(), w, h)
+        cache = self.present_cache.get(camera_id)
+        if cache is None or cache['key'] != key:
+            label_w, label_h = key[:2]
+            scale = min(label_w / w, label_h / h)
+            pix_w, pix_h = max(1, int(w * scale)), max(1, int(h * scale))
+            cache = {
+                'key': key,
+                'size': (pix_w, pix_h),
+                'buffer': np.empty((pix_h, pix_w, 3), dtype=np.uint8),
+            }
+            self.present_cache[camera_id] = cache
+            label.display_rect = QRect((label_w - pix_w) // 2, (label_h - pix_h) // 2, pix_w, pix_h)
+        return cache
 
-        label_w, label_h = self.camera_label.width(), self.camera_label.height()
-        pix_w, pix_h = scaled_pixmap.width(), scaled_pixmap.height()
-        dx = (label_w - pix_w) // 2
-        dy = (label_h - pix_h) // 2
-        self.camera_label.display_rect = QRect(dx, dy, pix_w, pix_h)
+    def present_frame(self, camera_id, frame, detections=None, stamps=None):
+        stamps = stamps if stamps is not None else {}
+        label = self.camera_labels[camera_id]
+        h, w = frame.shape[:2]
 
-        self.camera_label.setPixmap(scaled_pixmap)
+        # 縮放 (INTER_AREA) 與 mask 合成都直接寫進顯示尺寸的預先配置緩衝區
+        cache = self.present_layout(camera_id, label, w, h)
+        pix_w, pix_h = cache['size']
+        composed = self.overlay.render(frame, detections, (pix_w, pix_h), out=cache['buffer'])
+        stamps['rendered'] = now()
+
+        # 直接以 BGR 格式包裝，省去 cvtColor 的複製；fromImage 會複製一份，緩衝區可立即重複使用
+        bytes_per_line = composed.strides[0]
+        qt_image = QImage(composed.data, pix_w, pix_h, bytes_per_line, QImage.Format.Format_BGR888)
+        label.setPixmap(QPixmap.fromImage(qt_image))
+        stamps['presented'] = now()
+
+    def on_structured_result(self, camera_id, t, result):
+        analytics = self.analytics.get(camera_id)
+        if analytics is None:
+            analytics = self.analytics[camera_id] = ObjectAnalytics()
+        analytics.update(result, t)
+
+    def update_class_summary(self, camera_id, detections):
+        self.class_summaries[camera_id] = summarize_classes(detections, self.text_prompt)
+        lines = []
+        for cid, summary in sorted(self.class_summaries.items()):
+            prefix = f"cam{cid} " if len(self.sources) > 1 else ""
+            for item in summary:
+                lines.append(f"{prefix}{item['name'][:16]:<16} {item['count']:>3}  {item['mean_score']:.2f}")
+        for cid, analytics in sorted(self.analytics.items()):
+            prefix = f"cam{cid} " if len(self.sources) > 1 else ""
+            lines.append("")
+            lines.extend(prefix + line for line in analytics.summary_lines())
+        text = "\n".join(lines)
+        if text != self.class_summary_label.text():
+            self.class_summary_label.setText(text)
+
+    def toggle_hud(self, enabled):
+        if enabled:
+            self.update_hud()
+            self.hud_label.show()
+            self.hud_timer.start(500)
+        else:
+            self.hud_timer.stop()
+            self.hud_label.hide()
+
+    def update_hud(self):
+        ring_dropped = sum(t.ring.dropped for t in self.camera_threads)
+        self.latency.set_counter('ring_dropped', ring_dropped)
+        lines = self.latency.summary_lines() + [self.scheduler.status()]
+        if self.inference_thread and self.inference_thread.startup:
+            lines.append("startup " + model_loader.format_startup(self.inference_thread.startup))
+        self.hud_label.setText("\n".join(lines))
+        self.hud_label.adjustSize()
+        self.hud_label.raise_()
+
+    def export_latency(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export latency", "latency.csv", "CSV (*.csv);;JSONL (*.jsonl)")
+        if path:
+            count = self.latency.export(path)
+            self.update_status(f"Exported {count} frames → {Path(path).name}")
 
     def on_bbox_selected(self, bbox, cropped):
         self.pending_bbox = bbox
@@ -630,20 +1332,22 @@ class SAM3GUI(QMainWindow):
 
         is_positive = self.radio_positive.isChecked()
 
-        # 建立預覽圖
-        crop_rgb = cv2.cvtColor(self.pending_crop, cv2.COLOR_BGR2RGB)
-        h, w, ch = crop_rgb.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(crop_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(qt_image)
-
         # 儲存 sample
-        self.samples.append({
+        sample = {
+            'id': self.next_sample_id,
             'bbox': self.pending_bbox,
             'crop': self.pending_crop,
             'is_positive': is_positive,
-            'pixmap': pixmap
-        })
+            'pixmap': self.crop_pixmap(self.pending_crop),
+            'embedding': None,
+        }
+        self.next_sample_id += 1
+        self.samples.append(sample)
+
+        # 在框選的那一幀上編碼一次 (slot 之後會被重複使用，所以複製一份)
+        frame = frame_array(self.camera_label.current_frame)
+        if self.inference_thread and frame is not None:
+            self.inference_thread.encode_exemplar(sample['id'], frame.copy(), sample['bbox'], is_positive)
 
         # 更新 UI
         self.refresh_samples_ui()
@@ -659,6 +1363,59 @@ class SAM3GUI(QMainWindow):
         neg_count = len(self.samples) - pos_count
         self.update_status(f"Saved ({pos_count}+ / {neg_count}-)")
 
+    def crop_pixmap(self, crop):
+        crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        h, w, ch = crop_rgb.shape
+        bytes_per_line = ch * w
+        qt_image = QImage(crop_rgb.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+        return QPixmap.fromImage(qt_image)
+
+    def on_exemplar_encoded(self, sample_id, embedding):
+        for sample in self.samples:
+            if sample['id'] == sample_id:
+                sample['embedding'] = embedding
+                self.update_inference_exemplars()
+                self.update_status("Exemplar encoded" if embedding is not None else "Exemplar encode failed")
+                break
+
+    def save_sample_set(self):
+        if not self.samples:
+            self.update_status("No samples to save")
+            return
+        self.sample_set_dir.mkdir(parents=True, exist_ok=True)
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save sample set", str(self.sample_set_dir / f"samples{SET_SUFFIX}"),
+            f"Sample set (*{SET_SUFFIX})")
+        if not path:
+            return
+        meta = {'imgsz': self.profile['imgsz'] if self.profile else None}
+        path = save_sample_set(path, self.samples, meta)
+        pending = sum(1 for s in self.samples if s['embedding'] is None)
+        note = f" ({pending} not encoded yet)" if pending else ""
+        self.update_status(f"Saved set → {path.name}{note}")
+
+    def load_sample_set(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Load sample set", str(self.sample_set_dir), f"Sample set (*{SET_SUFFIX})")
+        if not path:
+            return
+        try:
+            samples, meta = load_sample_set(path)
+        except Exception as e:
+            self.update_status(f"Load failed: {str(e)[:30]}")
+            return
+
+        self.samples = []
+        for sample in samples:
+            sample['id'] = self.next_sample_id
+            sample['pixmap'] = self.crop_pixmap(sample['crop'])
+            self.next_sample_id += 1
+            self.samples.append(sample)
+
+        self.refresh_samples_ui()
+        self.update_inference_exemplars()
+        self.update_status(f"Loaded {Path(path).stem} ({len(self.samples)} samples)")
+
     def refresh_samples_ui(self):
         # 清除舊的
         while self.samples_layout.count():
@@ -694,9 +1451,12 @@ class SAM3GUI(QMainWindow):
 
     def update_inference_exemplars(self):
         if self.inference_thread:
-            bboxes = [s['bbox'] for s in self.samples]
-            labels = [1 if s['is_positive'] else 0 for s in self.samples]
-            self.inference_thread.set_exemplars(bboxes, labels)
+            # 已編碼的 sample 送 embedding；尚未編碼完成的暫時沿用原始 bbox
+            raw = [s for s in self.samples if s['embedding'] is None]
+            bboxes = [s['bbox'] for s in raw]
+            labels = [1 if s['is_positive'] else 0 for s in raw]
+            embeddings = [s['embedding'] for s in self.samples if s['embedding'] is not None]
+            self.inference_thread.set_exemplars(bboxes, labels, embeddings)
 
     def on_confidence_changed(self, value):
         conf = value / 100.0
@@ -705,15 +1465,39 @@ class SAM3GUI(QMainWindow):
         if self.inference_thread:
             self.inference_thread.set_confidence(conf)
 
+    def on_motion_gate_changed(self, *_):
+        threshold = self.motion_slider.value() / 2.0
+        self.motion_value.setText(f"{threshold:.1f}")
+
+        if self.inference_thread:
+            self.inference_thread.set_motion_gate(self.motion_check.isChecked(), threshold)
+
+    def on_roi_mode_changed(self, enabled):
+        if self.inference_thread:
+            self.inference_thread.set_roi_mode(enabled)
+
+    def on_tracking_changed(self, enabled):
+        if self.inference_thread:
+            self.inference_thread.set_tracking(enabled)
+
     def apply_settings(self):
         text = self.text_input.text().strip()
         text_prompt = [t.strip() for t in text.split(",") if t.strip()] if text else []
 
+        self.text_prompt = text_prompt
+        self.class_summaries = {}
+        for analytics in self.analytics.values():
+            analytics.reset()  # 類別索引隨 prompt 改變
         if self.inference_thread:
             self.inference_thread.set_prompt(text_prompt)
 
         self.update_current_settings()
-        self.update_status("Applied")
+
+        if self.inference_thread:
+            stats = self.inference_thread.prompt_cache.stats()
+            self.update_status(f"Applied (prompt cache {stats['hits']} hit / {stats['misses']} miss)")
+        else:
+            self.update_status("Applied")
 
     def update_current_settings(self):
         parts = []
@@ -735,12 +1519,41 @@ class SAM3GUI(QMainWindow):
         self.stop_camera()
         if self.inference_thread:
             self.inference_thread.stop()
+        self.present_timer.stop()
+        for frame, _ in self.pending_present.values():
+            if isinstance(frame, FrameSlot):
+                frame.release()
+        self.pending_present = {}
         event.accept()
 
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="SAM3 GUI")
+    parser.add_argument("sources", nargs="*", default=["0"],
+                        help="攝影機索引、影片路徑、圖片資料夾、RTSP URL 或 synthetic[:WxH[@FPS]] (可多個)")
+    parser.add_argument("--profile", default="auto", choices=["auto", *device_profile.PROFILES],
+                        help="執行設定檔；auto 在沒有 CUDA 時使用 cpu")
+    parser.add_argument("--imgsz", type=int, help="模型輸入尺寸 (14 的倍數)")
+    parser.add_argument("--threads", type=int, help="CPU intra-op 執行緒數")
+    parser.add_argument("--no-quantize", action="store_true", help="CPU 設定檔不做 int8 量化")
+    parser.add_argument("--latency-budget", type=float,
+                        help="glass-to-glass 延遲預算 (ms)；超過時自動降低 imgsz")
+    parser.add_argument("--max-fps", type=float, default=30, help="擷取速率上限")
+    parser.add_argument("--warmup", type=int, default=1, help="載入後以假畫面暖機的次數 (0 表示不暖機)")
+    parser.add_argument("--server", help="連到 inference_server.py (host:port)，推理在另一個行程執行")
+    add_source_arguments(parser)
+    return parser.parse_args(argv)
+
+
 def main():
     app = QApplication(sys.argv)
-    window = SAM3GUI()
+    args = parse_args(app.arguments()[1:])
+    profile = device_profile.resolve_profile(
+        args.profile, imgsz=args.imgsz, threads=args.threads,
+        quantize=False if args.no_quantize else None)
+    scheduler = LatencyBudgetScheduler(
+        budget_ms=args.latency_budget, max_fps=args.max_fps, imgsz=profile['imgsz'])
+    window = SAM3GUI(args.sources, profile, scheduler, args.warmup, source_options(args), args.server)
     window.show()
     sys.exit(app.exec())
 
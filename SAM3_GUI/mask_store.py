@@ -0,0 +1,242 @@
+import json
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# 索引檔: 每幀一筆固定長度紀錄，可直接以 np.fromfile 讀入做隨機存取
+INDEX_DTYPE = np.dtype([('frame', '<u8'), ('offset', '<u8'), ('length', '<u4')])
+HEADER = struct.Struct('<IHHI')  # 物件數, mask 高, mask 寬, meta JSON 長度
+
+
+def rle_encode(mask):
+    """二值 mask → 以 column-major 展開的交替長度 (由 0 開始，與 COCO RLE 相同)
+
+    只展開含有前景的欄位範圍，前後的全 0 欄位直接併入頭尾的長度。
+    """
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    cols = np.flatnonzero(mask.any(axis=0))
+    if not len(cols):
+        return np.array([h * w], dtype=np.uint32)
+    x1, x2 = cols[0], cols[-1] + 1
+    flat = mask[:, x1:x2].ravel(order='F')
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate([[0], change, [flat.size]]))
+    lead, tail = x1 * h, (w - x2) * h
+    if flat[0]:
+        counts = np.concatenate([[lead], counts])
+    else:
+        counts[0] += lead
+    if not flat[-1]:
+        counts[-1] += tail
+    elif tail:
+        counts = np.concatenate([counts, [tail]])
+    return counts.astype(np.uint32)
+
+
+def rle_decode(counts, shape):
+    values = np.zeros(len(counts), dtype=bool)
+    values[1::2] = True
+    flat = np.repeat(values, counts.astype(np.int64))
+    return flat.reshape(shape[::-1]).T
+
+
+def compact_detections(detections, rle=True):
+    """detections → 可 pickle / JSON 化的精簡格式 (mask 改為 RLE)
+
+    rle=False 時先不編碼：'rle' 為 None，mask 以 'masks' 參照原陣列 (不複製)，
+    只看 box/類別的接收端 (例如 ObjectAnalytics) 不必付 RLE 的成本；
+    需要 RLE 的接收端在自己的執行緒呼叫 encode_masks。
+    """
+    if not detections:
+        return None
+    masks = detections.get('masks')
+    compact = {
+        'boxes': detections['boxes'],
+        'scores': detections['scores'],
+        'classes': detections['classes'],
+        'names': detections.get('names', {}),
+        'mask_shape': masks.shape[1:] if masks is not None else None,
+        'rle': [rle_encode(m) for m in masks] if masks is not None and rle else None,
+    }
+    if masks is not None and not rle:
+        compact['masks'] = masks
+    if detections.get('ids') is not None:
+        compact['ids'] = detections['ids']
+    return compact
+
+
+def encode_masks(compact):
+    """補做 compact_detections(..., rle=False) 延後的 RLE 編碼；回傳新的 dict，不修改傳入的結果"""
+    if not compact or compact.get('masks') is None:
+        return compact
+    compact = dict(compact)
+    compact['rle'] = [rle_encode(m) for m in compact.pop('masks')]
+    return compact
+
+
+def expand_detections(compact):
+    """compact_detections 的反向，回傳與 extract_detections 相同格式"""
+    if not compact:
+        return None
+    masks = compact.get('masks')
+    if masks is None and compact['rle'] is not None:
+        shape = compact['mask_shape']
+        masks = np.zeros((len(compact['rle']), *shape), dtype=bool)
+        for i, counts in enumerate(compact['rle']):
+            masks[i] = rle_decode(counts, shape)
+    detections = {
+        'boxes': compact['boxes'],
+        'scores': compact['scores'],
+        'classes': compact['classes'],
+        'masks': masks,
+        'names': compact['names'],
+    }
+    if compact.get('ids') is not None:
+        detections['ids'] = compact['ids']
+    return detections
+
+
+def filter_detections(detections, min_score=None, classes=None):
+    """離線重新篩選 (不需 GPU)"""
+    if not detections:
+        return detections
+    keep = np.ones(len(detections['scores']), dtype=bool)
+    if min_score is not None:
+        keep &= detections['scores'] >= min_score
+    if classes is not None:
+        keep &= np.isin(detections['classes'], list(classes))
+    out = dict(detections)
+    for key in ('boxes', 'scores', 'classes', 'masks', 'ids'):
+        if out.get(key) is not None:
+            out[key] = out[key][keep]
+    return out
+
+
+class MaskStoreWriter:
+    """逐幀串流寫入的 mask 結果檔 (append-only)：<name>.rle 資料 + <name>.rle.idx 索引"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = open(self.path, 'ab')
+        self.index = open(self.path.with_name(self.path.name + '.idx'), 'ab')
+        self.offset = self.data.tell()
+
+    def write(self, frame, detections, prompt=None):
+        meta = {'prompt': list(prompt) if prompt else [], 'names': {}}
+        if detections:
+            boxes = np.asarray(detections['boxes'], dtype='<f4').reshape(-1, 4)
+            scores = np.asarray(detections['scores'], dtype='<f4')
+            classes = np.asarray(detections['classes'], dtype='<i4')
+            masks = detections.get('masks')
+            meta['names'] = {str(k): v for k, v in detections.get('names', {}).items()}
+            if detections.get('ids') is not None:
+                meta['ids'] = [int(i) for i in detections['ids']]
+        else:
+            boxes = np.zeros((0, 4), dtype='<f4')
+            scores = np.zeros(0, dtype='<f4')
+            classes = np.zeros(0, dtype='<i4')
+            masks = None
+
+        mh, mw = masks.shape[1:] if masks is not None and len(masks) else (0, 0)
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        parts = [HEADER.pack(len(scores), mh, mw, len(meta_bytes)), meta_bytes,
+                 boxes.tobytes(), scores.tobytes(), classes.tobytes()]
+        if mh:
+            for mask in masks:
+                counts = rle_encode(mask)
+                parts.append(struct.pack('<I', len(counts)))
+                parts.append(counts.astype('<u4').tobytes())
+
+        payload = zlib.compress(b''.join(parts), 6)
+        self.data.write(payload)
+        record = np.array([(frame, self.offset, len(payload))], dtype=INDEX_DTYPE)
+        self.index.write(record.tobytes())
+        self.offset += len(payload)
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MaskStoreReader:
+    """依幀號隨機讀取；回傳與 extract_detections 相同格式的 dict，可直接交給 OverlayRenderer"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        index = np.fromfile(self.path.with_name(self.path.name + '.idx'), dtype=INDEX_DTYPE)
+        # 同一幀若重複寫入，以最後一筆為準
+        self.records = {int(r['frame']): (int(r['offset']), int(r['length'])) for r in index}
+        self.data = open(self.path, 'rb')
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, frame):
+        return frame in self.records
+
+    def frames(self):
+        return sorted(self.records)
+
+    def read(self, frame, decode_masks=True):
+        offset, length = self.records[frame]
+        self.data.seek(offset)
+        raw = zlib.decompress(self.data.read(length))
+
+        n, mh, mw, meta_len = struct.unpack_from(HEADER.format, raw, 0)
+        pos = HEADER.size
+        meta = json.loads(raw[pos:pos + meta_len].decode('utf-8'))
+        pos += meta_len
+        boxes = np.frombuffer(raw, dtype='<f4', count=n * 4, offset=pos).reshape(n, 4)
+        pos += n * 16
+        scores = np.frombuffer(raw, dtype='<f4', count=n, offset=pos)
+        pos += n * 4
+        classes = np.frombuffer(raw, dtype='<i4', count=n, offset=pos)
+        pos += n * 4
+
+        masks = None
+        if mh and decode_masks:
+            masks = np.zeros((n, mh, mw), dtype=bool)
+            for k in range(n):
+                (count_len,) = struct.unpack_from('<I', raw, pos)
+                pos += 4
+                counts = np.frombuffer(raw, dtype='<u4', count=count_len, offset=pos)
+                pos += count_len * 4
+                masks[k] = rle_decode(counts, (mh, mw))
+
+        detections = {
+            'boxes': boxes,
+            'scores': scores,
+            'classes': classes,
+            'masks': masks,
+            'names': {int(k): v for k, v in meta.get('names', {}).items()},
+            'prompt': meta.get('prompt', []),
+        }
+        if 'ids' in meta:
+            detections['ids'] = np.array(meta['ids'], dtype=np.int32)
+        return detections
+
+    def __iter__(self):
+        for frame in self.frames():
+            yield frame, self.read(frame)
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+
+import device_profile
+
+
+def _elapsed(start):
+    return time.perf_counter() - start
+
+
+def _sync(predictor):
+    """GPU 上等待 kernel 完成，計時才準確"""
+    device = getattr(getattr(predictor, "args", None), "device", None)
+    if device in (None, "cpu"):
+        return
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+    except ImportError:
+        pass
+
+
+def load_predictor(model_path, profile=None, conf=0.25, progress=None):
+    """載入 SAM3 predictor；回傳 (predictor, timings)，timings 單位為秒
+
+    progress(message) 會在各步驟開始時呼叫 (可傳入 Qt signal 的 emit)。
+    """
+    progress = progress or (lambda message: None)
+    timings = {}
+
+    progress("Importing ultralytics...")
+    start = time.perf_counter()
+    from ultralytics.models.sam import SAM3SemanticPredictor
+    timings['import'] = _elapsed(start)
+
+    progress("Loading weights...")
+    start = time.perf_counter()
+    profile = profile or device_profile.resolve_profile()
+    device_profile.prepare_runtime(profile)
+    predictor = SAM3SemanticPredictor(overrides=device_profile.predictor_overrides(
+        profile, model_path, conf=conf))
+    predictor.setup_model()
+    device_profile.apply_profile(predictor, profile)
+    timings['weights'] = _elapsed(start)
+    return predictor, timings
+
+
+def warmup(predictor, runs=1, shape=(480, 640, 3), prompt=("object",), progress=None):
+    """以假畫面跑幾次完整推理 (set_image + 文字解碼)，讓 kernel 選擇與記憶體配置在第一個真實畫面前完成
+
+    回傳 timings: first_inference (第一次) 與 warm_inference (最後一次，接近穩定速度)，單位秒。
+    """
+    progress = progress or (lambda message: None)
+    timings = {}
+    if runs <= 0:
+        return timings
+
+    # 用雜訊而不是全黑畫面，避免模型走「沒有偵測」的捷徑
+    frame = np.random.default_rng(0).integers(0, 256, size=shape, dtype=np.uint8)
+    for i in range(runs):
+        progress(f"Warming up ({i + 1}/{runs})...")
+        start = time.perf_counter()
+        predictor.set_image(frame)
+        predictor(text=list(prompt))
+        _sync(predictor)
+        seconds = _elapsed(start)
+        if i == 0:
+            timings['first_inference'] = seconds
+        timings['warm_inference'] = seconds
+    return timings
+
+
+def format_startup(timings):
+    """啟動時間報告，例如 'import 2.1 s | weights 4.8 s | first inference 910 ms | warm 240 ms'"""
+    parts = []
+    for key, label in (('import', 'import'), ('weights', 'weights')):
+        if key in timings:
+            parts.append(f"{label} {timings[key]:.1f} s")
+    for key, label in (('first_inference', 'first inference'), ('warm_inference', 'warm')):
+        if key in timings:
+            parts.append(f"{label} {timings[key] * 1000:.0f} ms")
+    if 'ready' in timings:
+        parts.append(f"ready in {timings['ready']:.1f} s")
+    return " | ".join(parts)
@@ -0,0 +1,55 @@
+import cv2
+
+
+class MotionGate:
+    """以縮圖灰階絕對差判斷畫面是否靜止，靜止時沿用上一次的影像特徵"""
+
+    def __init__(self, threshold=2.0, size=(64, 48), max_reuse=150):
+        self.threshold = threshold  # 平均灰階差 (0-255)，低於此值視為靜止
+        self.size = size
+        self.max_reuse = max_reuse  # 連續沿用上限，避免光線緩慢變化累積
+        self.reference = None
+        self.reused = 0
+        self.last_diff = 0.0
+
+        # 統計
+        self.encoded_count = 0
+        self.reused_count = 0
+
+    def reset(self):
+        self.reference = None
+        self.reused = 0
+        self.last_diff = 0.0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def is_static(self, frame):
+        """回傳 True 表示可沿用快取特徵；False 表示需要重新編碼 (並更新參考畫面)"""
+        thumb = self._thumbnail(frame)
+
+        if self.reference is not None and self.reference.shape == thumb.shape:
+            # 與上次編碼的畫面比較，而非前一幀，避免緩慢移動被忽略
+            self.last_diff = float(cv2.absdiff(thumb, self.reference).mean())
+            if self.last_diff < self.threshold and self.reused < self.max_reuse:
+                self.reused += 1
+                self.reused_count += 1
+                return True
+
+        self.reference = thumb
+        self.reused = 0
+        self.encoded_count += 1
+        return False
+
+    def stats(self):
+        total = self.encoded_count + self.reused_count
+        ratio = self.reused_count / total if total else 0.0
+        return {
+            'encoded': self.encoded_count,
+            'reused': self.reused_count,
+            'reuse_ratio': ratio,
+            'last_diff': self.last_diff,
+        }
@@ -0,0 +1,215 @@
+import cv2
+import numpy as np
+
+# BGR 調色盤 (依類別索引循環使用)
+PALETTE = np.array([
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255),
+    (49, 210, 207), (10, 249, 72), (23, 204, 146), (134, 219, 61),
+    (211, 188, 52), (255, 194, 0), (255, 128, 0), (255, 87, 0),
+    (255, 0, 123), (199, 55, 255), (168, 0, 255), (236, 24, 255),
+], dtype=np.uint8)
+
+BOX_MARGIN = 2  # mask 取樣範圍在 box 外多留的顯示像素
+
+
+def scratch_buffer(scratch, key, shape, dtype):
+    """從 scratch dict 取出可重複使用的緩衝區，尺寸不符時重建；scratch 為 None 時回傳 None (由 OpenCV 配置)"""
+    if scratch is None:
+        return None
+    buffer = scratch.get(key)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = scratch[key] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+def resize_area(frame, size, out=None, scratch=None):
+    """縮放到顯示尺寸 size=(w,h)；縮小時做面積平均 (抗鋸齒)
+
+    OpenCV 的 INTER_AREA 只有整數倍率走快速路徑，非整數倍率慢上約一個數量級，
+    而單純 INTER_LINEAR 每個輸出像素只取 2x2 個來源像素，細紋理會產生鋸齒。
+    - 可整除的 2 倍以上: 先以整數倍 INTER_AREA 縮小，剩下不到 2 倍的部分以 INTER_LINEAR 補足
+    - 其他 (例如 1920x1080 → 1100x619): 先以 INTER_LINEAR 放大到顯示尺寸的整數倍，
+      再以整數倍 INTER_AREA 縮小
+    scratch 為 dict，存放可重複使用的中間緩衝區。
+    """
+    h, w = frame.shape[:2]
+    dw, dh = size
+    if dw >= w and dh >= h:
+        return cv2.resize(frame, size, dst=out, interpolation=cv2.INTER_LINEAR)
+
+    factor = min(w // dw, h // dh)
+    if factor >= 2 and w % factor == 0 and h % factor == 0:
+        if (w // factor, h // factor) == (dw, dh):
+            return cv2.resize(frame, size, dst=out, interpolation=cv2.INTER_AREA)
+        reduced = (h // factor, w // factor) + frame.shape[2:]
+        frame = cv2.resize(frame, reduced[1::-1], interpolation=cv2.INTER_AREA,
+                           dst=scratch_buffer(scratch, 'reduce', reduced, frame.dtype))
+        return cv2.resize(frame, size, dst=out, interpolation=cv2.INTER_LINEAR)
+
+    factor = max(-(-w // dw), -(-h // dh))
+    upsampled = (dh * factor, dw * factor) + frame.shape[2:]
+    frame = cv2.resize(frame, upsampled[1::-1], interpolation=cv2.INTER_LINEAR,
+                       dst=scratch_buffer(scratch, 'upsample', upsampled, frame.dtype))
+    return cv2.resize(frame, size, dst=out, interpolation=cv2.INTER_AREA)
+
+
+def class_names(names):
+    """SAM3 的 names 是 prompt 清單，其他模型是 dict；統一成 {class_id: name}"""
+    if not names:
+        return {}
+    if isinstance(names, dict):
+        return dict(names)
+    return dict(enumerate(names))
+
+
+def extract_detections(result):
+    """把 ultralytics Results 轉成純 numpy 資料，推理執行緒只產生資料不繪圖"""
+    if result is None or result.boxes is None or len(result.boxes) == 0:
+        return None
+
+    boxes = result.boxes
+    detections = {
+        'boxes': boxes.xyxy.cpu().numpy().astype(np.float32),
+        'scores': boxes.conf.cpu().numpy().astype(np.float32),
+        'classes': boxes.cls.cpu().numpy().astype(np.int32),
+        'masks': None,
+        'names': class_names(result.names),
+    }
+    if result.masks is not None and len(result.masks) > 0:
+        detections['masks'] = result.masks.data.cpu().numpy() > 0.5
+    return detections
+
+
+def summarize_classes(detections, prompt=None):
+    """每個類別的數量與平均分數 (不複製 mask)；prompt 中沒有偵測到的類別數量為 0
+
+    回傳依類別索引排序的 list: [{'class': i, 'name': str, 'count': int, 'mean_score': float}, ...]
+    """
+    names = dict(enumerate(prompt)) if prompt else {}
+    if detections:
+        names.update(detections.get('names', {}))
+        counts = np.bincount(detections['classes'], minlength=len(names))
+        sums = np.bincount(detections['classes'], weights=detections['scores'], minlength=len(names))
+    else:
+        counts = sums = np.zeros(len(names))
+
+    summary = []
+    for i in range(max(len(names), len(counts))):
+        count = int(counts[i]) if i < len(counts) else 0
+        summary.append({
+            'class': i,
+            'name': names.get(i, str(i)),
+            'count': count,
+            'mean_score': float(sums[i] / count) if count else 0.0,
+        })
+    return summary
+
+
+def split_by_class(detections, prompt=None):
+    """依類別拆開: {name: {'count', 'mean_score', 'boxes', 'scores', 'masks'}}，一次 decode 的多個 prompt 各自一份"""
+    out = {}
+    for item in summarize_classes(detections, prompt):
+        keep = detections['classes'] == item['class'] if detections else None
+        masks = detections.get('masks') if detections else None
+        out[item['name']] = {
+            'count': item['count'],
+            'mean_score': item['mean_score'],
+            'boxes': detections['boxes'][keep] if detections else np.zeros((0, 4), dtype=np.float32),
+            'scores': detections['scores'][keep] if detections else np.zeros(0, dtype=np.float32),
+            'masks': masks[keep] if masks is not None else None,
+        }
+    return out
+
+
+class OverlayRenderer:
+    """將所有 mask 合成一張類別索引圖，在顯示解析度上一次完成 alpha 混合"""
+
+    def __init__(self, alpha=0.45, palette=PALETTE, draw_boxes=True, draw_labels=True):
+        self.alpha = alpha
+        self.palette = palette
+        self.draw_boxes = draw_boxes
+        self.draw_labels = draw_labels
+        # 調色盤索引 → 顏色的查表 (cv2.applyColorMap 用)，0 為背景
+        self.lut = np.zeros((256, 1, 3), dtype=np.uint8)
+        self.lut[1:, 0] = palette[np.arange(255) % len(palette)]
+        self.scratch = {}  # resize_area 的中間緩衝區
+
+    def label_image(self, masks, classes, scores, size=None, boxes=None):
+        """(N,h,w) mask → 顯示尺寸 size=(w,h) 的調色盤索引圖 (uint8，0 為背景)；重疊處以分數高者為準
+
+        每個 mask 依分數由低到高以最近鄰取樣後覆寫，不建立 (N,h,w) 的暫存陣列；
+        有 boxes (mask 座標) 時只取樣各自的框 (外擴 BOX_MARGIN 像素) 範圍。
+        """
+        h, w = masks.shape[1:]
+        dw, dh = size if size else (w, h)
+        sx, sy = dw / w, dh / h
+        labels = np.zeros((dh, dw), dtype=np.uint8)
+        for k in np.argsort(scores, kind='stable'):
+            if boxes is None:
+                x1, y1, x2, y2 = 0, 0, dw, dh
+            else:
+                bx1, by1, bx2, by2 = boxes[k]
+                x1 = max(int(bx1 * sx) - BOX_MARGIN, 0)
+                y1 = max(int(by1 * sy) - BOX_MARGIN, 0)
+                x2 = min(int(np.ceil(bx2 * sx)) + BOX_MARGIN, dw)
+                y2 = min(int(np.ceil(by2 * sy)) + BOX_MARGIN, dh)
+                if x2 <= x1 or y2 <= y1:
+                    continue
+            ys = np.minimum((np.arange(y1, y2) / sy).astype(np.intp), h - 1)
+            xs = np.minimum((np.arange(x1, x2) / sx).astype(np.intp), w - 1)
+            # 先取列再取行，比 masks[k][ys[:, None], xs] 的二維索引快數倍
+            np.copyto(labels[y1:y2, x1:x2], np.uint8(classes[k] % len(self.palette) + 1),
+                      where=masks[k][ys][:, xs].astype(bool, copy=False))
+        return labels
+
+    def render(self, frame, detections, size=None, out=None):
+        """frame 為原始解析度 BGR；size=(w,h) 為顯示尺寸；回傳顯示尺寸的合成影像"""
+        h, w = frame.shape[:2]
+        dw, dh = size if size else (w, h)
+
+        if (dw, dh) != (w, h):
+            out = resize_area(frame, (dw, dh), out, self.scratch)
+        elif out is not None:
+            np.copyto(out, frame)
+        else:
+            out = frame.copy()
+
+        if not detections:
+            return out
+
+        classes = detections['classes']
+        scores = detections['scores']
+        masks = detections['masks']
+
+        if masks is not None and len(masks):
+            boxes = detections.get('boxes')
+            if boxes is not None and masks.shape[1:] != (h, w):
+                boxes = boxes * np.array([masks.shape[2] / w, masks.shape[1] / h] * 2, dtype=np.float32)
+            labels = self.label_image(masks, classes, scores, (dw, dh), boxes)
+            rows = np.flatnonzero(labels.any(axis=1))
+            if len(rows):
+                # 只在被 mask 覆蓋的外接矩形內混合
+                cols = np.flatnonzero(labels.any(axis=0))
+                y1, y2, x1, x2 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+                region, labels = out[y1:y2, x1:x2], labels[y1:y2, x1:x2]
+                # applyColorMap 以單通道索引查 3 通道表，比 cvtColor + 3 通道 LUT 快約 3 倍
+                colors = cv2.applyColorMap(labels, self.lut)
+                blended = cv2.addWeighted(region, 1.0 - self.alpha, colors, self.alpha, 0)
+                cv2.copyTo(blended, labels, region)
+
+        if self.draw_boxes:
+            sx, sy = dw / w, dh / h
+            names = detections.get('names', {})
+            ids = detections.get('ids')
+            for k, ((x1, y1, x2, y2), cls, score) in enumerate(zip(detections['boxes'], classes, scores)):
+                color = tuple(int(c) for c in self.palette[cls % len(self.palette)])
+                p1 = (int(x1 * sx), int(y1 * sy))
+                p2 = (int(x2 * sx), int(y2 * sy))
+                cv2.rectangle(out, p1, p2, color, 2)
+                if self.draw_labels:
+                    text = f"{names.get(int(cls), int(cls))} {score:.2f}"
+                    if ids is not None:
+                        text = f"#{ids[k]} {text}"
+                    cv2.putText(out, text, (p1[0], max(p1[1] - 5, 12)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        return out
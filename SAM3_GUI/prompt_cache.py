@@ -0,0 +1,117 @@
+import inspect
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt):
+    """將文字提示整理成快取鍵: 去空白、轉小寫、保留順序"""
+    if isinstance(prompt, str):
+        prompt = [prompt]
+    return tuple(" ".join(p.split()).lower() for p in prompt if p and p.strip())
+
+
+class PromptEmbeddingCache:
+    """文字提示 embedding 的 LRU 快取，同一組 prompt 只跑一次 text encoder"""
+
+    # SAM3SemanticPredictor 內部的文字編碼入口 (依序嘗試)
+    HOOKS = (
+        ("backbone", "forward_text"),
+        ("text_encoder", "forward"),
+    )
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.encode_fn = None
+        self.call_kwargs = None  # 模型實際呼叫時的 kwargs (如 device)，供預先編碼沿用
+        self.installed = False
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def wrap(self, encode_fn):
+        """包裝編碼函式；只快取 (text, device=...) 形式的呼叫，其餘直接透傳"""
+        cache = self
+
+        def cached_encode(text, *args, **kwargs):
+            if args or set(kwargs) - {"device"} or not text:
+                return encode_fn(text, *args, **kwargs)
+            cache.call_kwargs = kwargs
+            key = normalize_prompt(text)
+            value = cache.get(key)
+            if value is None:
+                value = encode_fn(text, **kwargs)
+                cache.put(key, value)
+            return value
+
+        cached_encode.__wrapped__ = encode_fn
+        return cached_encode
+
+    def install(self, predictor):
+        """在已載入的 predictor 上掛入快取，回傳是否成功"""
+        model = getattr(predictor, "model", None)
+        if model is None or self.installed:
+            return self.installed
+
+        for owner_name, method_name in self.HOOKS:
+            owner = getattr(model, owner_name, None)
+            fn = getattr(owner, method_name, None) if owner is not None else None
+            if callable(fn):
+                self.encode_fn = self.wrap(fn)
+                setattr(owner, method_name, self.encode_fn)
+                self.call_kwargs = self.install_kwargs(predictor, fn)
+                self.installed = True
+                break
+        return self.installed
+
+    @staticmethod
+    def install_kwargs(predictor, fn):
+        """掛入時推得模型呼叫的 kwargs: 編碼函式接受 device 且 predictor 已有 device 時為 {'device': ...}
+
+        推不出來時為 None，等第一次實際呼叫時由 wrap 記錄。
+        """
+        device = getattr(predictor, "device", None)
+        try:
+            accepts_device = "device" in inspect.signature(fn).parameters
+        except (TypeError, ValueError):
+            accepts_device = False
+        return {"device": device} if device is not None and accepts_device else None
+
+    def precompute(self, prompt):
+        """預先編碼 prompt (在推理執行緒呼叫)，之後的幀都會命中快取
+
+        還不知道模型呼叫時的 kwargs (call_kwargs) 時不預先編碼，以免以錯誤的參數 (如 device) 編碼；
+        第一幀照常編碼並寫入快取。
+        """
+        if not self.installed or not prompt or self.call_kwargs is None:
+            return False
+        key = normalize_prompt(prompt)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True
+        self.encode_fn(list(prompt), **self.call_kwargs)
+        return True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self.entries),
+        }
@@ -0,0 +1,132 @@
+import math
+
+import cv2
+import numpy as np
+
+from tracker import box_iou
+
+
+class RoiPlanner:
+    """依上一次偵測結果與範例框產生加邊界的 ROI；定期做一次全畫面以發現新物件"""
+
+    def __init__(self, pad=0.5, min_side=96, full_every=15, max_coverage=0.5):
+        self.pad = pad                    # 每邊外擴 box 邊長的比例
+        self.min_side = min_side          # ROI 最小邊長 (像素)
+        self.full_every = full_every      # 每幾幀強制全畫面
+        self.max_coverage = max_coverage  # ROI 總面積超過畫面此比例就直接全畫面
+        self.boxes = None
+        self.frames_since_full = 0
+
+    def reset(self):
+        self.boxes = None
+        self.frames_since_full = 0
+
+    def plan(self, shape, exemplar_boxes=None):
+        """回傳 ROI 清單 [(x1,y1,x2,y2), ...]；回傳 None 表示本幀做全畫面"""
+        h, w = shape[:2]
+        seeds = []
+        if self.boxes is not None:
+            seeds.extend(self.boxes.tolist())
+        if exemplar_boxes:
+            seeds.extend(exemplar_boxes)
+
+        if not seeds or self.frames_since_full >= self.full_every:
+            return None
+
+        rois = []
+        for x1, y1, x2, y2 in seeds:
+            bw, bh = x2 - x1, y2 - y1
+            pw = max(bw * self.pad, (self.min_side - bw) / 2, 0)
+            ph = max(bh * self.pad, (self.min_side - bh) / 2, 0)
+            rois.append([max(0, int(x1 - pw)), max(0, int(y1 - ph)),
+                         min(w, int(math.ceil(x2 + pw))), min(h, int(math.ceil(y2 + ph)))])
+        rois = merge_boxes(np.array(rois, dtype=np.int64))
+
+        area = ((rois[:, 2] - rois[:, 0]) * (rois[:, 3] - rois[:, 1])).sum()
+        if area > self.max_coverage * w * h:
+            return None
+        return [tuple(int(v) for v in r) for r in rois]
+
+    def update(self, detections, full_frame):
+        self.frames_since_full = 0 if full_frame else self.frames_since_full + 1
+        self.boxes = detections['boxes'].copy() if detections else None
+
+
+def merge_boxes(boxes):
+    """反覆合併互相重疊的 ROI，直到沒有重疊"""
+    boxes = boxes.copy()
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        for i in range(len(boxes)):
+            a = boxes[i]
+            overlap = ((boxes[:, 0] < a[2]) & (boxes[:, 2] > a[0]) &
+                       (boxes[:, 1] < a[3]) & (boxes[:, 3] > a[1]))
+            overlap[i] = False
+            if overlap.any():
+                members = np.append(np.flatnonzero(overlap), i)
+                group = boxes[members]
+                union = [group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max()]
+                boxes = np.vstack([np.delete(boxes, members, axis=0), union])
+                merged = True
+                break
+    return boxes
+
+
+def roi_imgsz(rois, max_imgsz, min_imgsz=224, patch=14):
+    """ROI 以接近原生解析度編碼: 最長邊向上取 patch 的倍數，限制在 [min, max]"""
+    side = max(max(x2 - x1, y2 - y1) for x1, y1, x2, y2 in rois)
+    side = int(math.ceil(side / patch) * patch)
+    return max(min_imgsz, min(max_imgsz, side))
+
+
+def merge_roi_detections(parts, shape, iou_threshold=0.7):
+    """把各 ROI 的結果平移回整張畫面座標並去除重複 (保留分數高者)"""
+    h, w = shape[:2]
+    boxes, scores, classes, masks = [], [], [], []
+    names = {}
+    for (x1, y1, x2, y2), det in parts:
+        if not det:
+            continue
+        names.update(det.get('names', {}))
+        boxes.append(det['boxes'] + np.array([x1, y1, x1, y1], dtype=np.float32))
+        scores.append(det['scores'])
+        classes.append(det['classes'])
+        if det.get('masks') is not None:
+            full = np.zeros((len(det['masks']), h, w), dtype=bool)
+            crop_masks = det['masks']
+            ch, cw = y2 - y1, x2 - x1
+            if crop_masks.shape[1:] != (ch, cw):
+                crop_masks = np.stack([cv2.resize(m.astype(np.uint8), (cw, ch),
+                                                  interpolation=cv2.INTER_NEAREST) > 0 for m in crop_masks])
+            full[:, y1:y2, x1:x2] = crop_masks
+            masks.append(full)
+        else:
+            masks.append(np.zeros((len(det['boxes']), h, w), dtype=bool))
+
+    if not boxes:
+        return None
+
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    classes = np.concatenate(classes)
+    masks = np.concatenate(masks)
+
+    order = np.argsort(-scores)
+    keep = []
+    iou = box_iou(boxes, boxes)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= (iou[i] > iou_threshold) & (classes == classes[i])
+    keep = np.array(keep)
+
+    return {
+        'boxes': boxes[keep],
+        'scores': scores[keep],
+        'classes': classes[keep],
+        'masks': masks[keep],
+        'names': names,
+    }
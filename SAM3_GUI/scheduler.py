@@ -0,0 +1,95 @@
+import threading
+
+
+class LatencyBudgetScheduler:
+    """以 glass-to-glass 延遲預算調度擷取與推理
+
+    - 擷取依需求觸發: 推理端空閒時才要求各攝影機送下一幀，不再擷取注定被丟掉的幀，
+      因此推理速率自動跟隨量測到的推理時間 (上限 max_fps)。
+    - 解析度: 延遲 EMA 超過預算時逐級降低 imgsz，低於預算一半一段時間後再逐級調回。
+    """
+
+    def __init__(self, budget_ms=None, max_fps=30, imgsz=1008, min_imgsz=392, step=140,
+                 alpha=0.2, settle_frames=15):
+        self.budget_ms = budget_ms  # None 表示不調整解析度，只做依需求擷取
+        self.max_fps = max_fps
+        self.levels = list(range(imgsz, min_imgsz - 1, -step)) or [imgsz]
+        self.level = 0
+        self.alpha = alpha
+        self.settle_frames = settle_frames  # 每次調整後至少觀察幾幀再調整
+        self.since_change = 0
+
+        self.ema_total_ms = None
+        self.ema_infer_ms = None
+        self.lock = threading.Lock()
+        self.demands = {}
+
+    # --- 依需求擷取 ---
+
+    def _event(self, camera_id):
+        with self.lock:
+            return self.demands.setdefault(camera_id, threading.Event())
+
+    def register(self, camera_id):
+        self._event(camera_id).set()  # 第一幀直接擷取
+
+    def request_frames(self):
+        with self.lock:
+            events = list(self.demands.values())
+        for event in events:
+            event.set()
+
+    def wait_for_demand(self, camera_id, timeout):
+        event = self._event(camera_id)
+        if event.wait(timeout):
+            event.clear()
+            return True
+        return False
+
+    @property
+    def min_interval(self):
+        return 1.0 / self.max_fps if self.max_fps else 0.0
+
+    # --- 量測與解析度調整 ---
+
+    def _ema(self, current, value):
+        return value if current is None else current + self.alpha * (value - current)
+
+    def observe_inference(self, infer_ms):
+        with self.lock:
+            self.ema_infer_ms = self._ema(self.ema_infer_ms, infer_ms)
+
+    def observe_total(self, total_ms):
+        with self.lock:
+            self.ema_total_ms = self._ema(self.ema_total_ms, total_ms)
+            self.since_change += 1
+
+    def imgsz(self):
+        return self.levels[self.level]
+
+    def update_imgsz(self):
+        """回傳新的 imgsz (需要變更時) 或 None"""
+        with self.lock:
+            if self.budget_ms is None or self.ema_total_ms is None:
+                return None
+            if self.since_change < self.settle_frames:
+                return None
+
+            level = self.level
+            if self.ema_total_ms > self.budget_ms and level < len(self.levels) - 1:
+                level += 1
+            elif self.ema_total_ms < self.budget_ms * 0.5 and level > 0:
+                level -= 1
+            if level == self.level:
+                return None
+
+            self.level = level
+            self.since_change = 0
+            self.ema_total_ms = None  # 換解析度後重新量測
+            return self.levels[level]
+
+    def status(self):
+        total = f"{self.ema_total_ms:.0f}" if self.ema_total_ms is not None else "-"
+        infer = f"{self.ema_infer_ms:.0f}" if self.ema_infer_ms is not None else "-"
+        budget = f"{self.budget_ms:.0f}" if self.budget_ms else "off"
+        return f"budget {budget} ms | g2g {total} ms | infer {infer} ms | imgsz {self.imgsz()}"
@@ -0,0 +1,185 @@
+import cv2
+import numpy as np
+
+
+def box_iou(a, b):
+    """(N,4) 與 (M,4) xyxy → (N,M) IoU"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class KeyframeTracker:
+    """每 N 幀 (或場景變化時) 跑一次完整 SAM3，其間以光流傳遞 mask/box 並維持物件 ID
+
+    N 依關鍵幀時量到的漂移自動調整: 傳遞後的 box 與新偵測結果的 IoU 越低，N 越小。
+    """
+
+    def __init__(self, interval=5, min_interval=1, max_interval=30,
+                 scene_threshold=25.0, drift_low=0.1, drift_high=0.3, max_side=640):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.scene_threshold = scene_threshold  # 縮圖平均灰階差超過此值視為換場景
+        self.drift_low = drift_low
+        self.drift_high = drift_high
+        self.max_side = max_side
+        self.next_id = 1
+        self.last_drift = 0.0
+        self.reset()
+
+    def reset(self):
+        self.detections = None
+        self.prev_gray = None
+        self.key_thumb = None
+        self.points = None       # (K,1,2) float32，灰階縮圖座標
+        self.point_owner = None  # (K,) 每個點屬於哪個物件
+        self.frames_since_key = 0
+        self.force_keyframe = True
+
+    def _gray(self, frame):
+        h, w = frame.shape[:2]
+        self.scale = min(1.0, self.max_side / max(h, w))
+        if self.scale < 1.0:
+            frame = cv2.resize(frame, (int(w * self.scale), int(h * self.scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    @staticmethod
+    def _thumb(gray):
+        return cv2.resize(gray, (64, 48), interpolation=cv2.INTER_AREA)
+
+    def needs_keyframe(self, frame):
+        if self.force_keyframe or self.detections is None or self.frames_since_key >= self.interval:
+            return True
+        gray = self._gray(frame)
+        diff = float(cv2.absdiff(self._thumb(gray), self.key_thumb).mean())
+        return diff > self.scene_threshold
+
+    def _assign_ids(self, detections):
+        boxes = detections['boxes']
+        ids = np.zeros(len(boxes), dtype=np.int32)
+        matched_iou = []
+
+        if self.detections is not None and len(self.detections['boxes']):
+            iou = box_iou(self.detections['boxes'], boxes)
+            # 貪婪配對: 由高 IoU 開始
+            while iou.size and iou.max() > 0.3:
+                i, j = np.unravel_index(iou.argmax(), iou.shape)
+                ids[j] = self.detections['ids'][i]
+                matched_iou.append(float(iou[i, j]))
+                iou[i, :] = 0
+                iou[:, j] = 0
+
+        for j in np.flatnonzero(ids == 0):
+            ids[j] = self.next_id
+            self.next_id += 1
+        return ids, matched_iou
+
+    def _adapt_interval(self, matched_iou):
+        """依傳遞中的物件與新偵測結果的 IoU 調整 N；沒配對到 (或關鍵幀沒有偵測結果) 的物件 IoU 視為 0
+
+        傳遞的物件全部遺失時 drift = 1.0，N 減半。
+        """
+        tracked = len(self.detections['boxes']) if self.detections else 0
+        if not tracked or self.frames_since_key == 0:
+            return
+        self.last_drift = 1.0 - float(np.sum(matched_iou)) / max(tracked, len(matched_iou))
+        if self.last_drift > self.drift_high:
+            self.interval = max(self.min_interval, self.interval // 2)
+        elif self.last_drift < self.drift_low:
+            self.interval = min(self.max_interval, self.interval + 1)
+
+    def _seed_points(self, gray, detections):
+        points, owners = [], []
+        masks = detections.get('masks')
+        for k, (x1, y1, x2, y2) in enumerate(detections['boxes'] * self.scale):
+            region = np.zeros(gray.shape, dtype=np.uint8)
+            if masks is not None:
+                m = masks[k].astype(np.uint8)
+                if m.shape != gray.shape:
+                    m = cv2.resize(m, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_NEAREST)
+                region[m > 0] = 255
+            else:
+                region[int(y1):int(y2), int(x1):int(x2)] = 255
+            found = cv2.goodFeaturesToTrack(gray, maxCorners=30, qualityLevel=0.01, minDistance=5, mask=region)
+            if found is not None:
+                points.append(found.astype(np.float32))
+                owners.extend([k] * len(found))
+        if points:
+            self.points = np.concatenate(points)
+            self.point_owner = np.array(owners, dtype=np.int32)
+        else:
+            self.points = None
+            self.point_owner = None
+
+    def update_keyframe(self, frame, detections):
+        """完整推理後呼叫：配對 ID、依漂移調整 N、重新取追蹤點；回傳帶 ids 的 detections"""
+        gray = self._gray(frame)
+        if detections:
+            detections = dict(detections)
+            ids, matched_iou = self._assign_ids(detections)
+            detections['ids'] = ids
+            self._adapt_interval(matched_iou)
+            self._seed_points(gray, detections)
+        else:
+            self._adapt_interval([])
+            self.points = None
+
+        self.detections = detections
+        self.prev_gray = gray
+        self.key_thumb = self._thumb(gray)
+        self.frames_since_key = 0
+        self.force_keyframe = False
+        return detections
+
+    def propagate(self, frame):
+        """非關鍵幀：以 LK 光流估計每個物件的位移並平移 box/mask"""
+        gray = self._gray(frame)
+        self.frames_since_key += 1
+        detections = self.detections
+        if not detections or self.points is None or len(self.points) == 0:
+            self.prev_gray = gray
+            return detections
+
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None)
+        back, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, nxt, None)
+        fb_error = np.linalg.norm((back - self.points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < 1.0)
+
+        # 超過一半的點遺失，下一幀直接做關鍵幀
+        if good.mean() < 0.5:
+            self.force_keyframe = True
+
+        motion = (nxt - self.points).reshape(-1, 2)
+        detections = dict(detections)
+        boxes = detections['boxes'].copy()
+        masks = detections.get('masks')
+        masks = masks.copy() if masks is not None else None
+        h, w = frame.shape[:2]
+
+        for k in range(len(boxes)):
+            sel = good & (self.point_owner == k)
+            if not sel.any():
+                continue
+            dx, dy = np.median(motion[sel], axis=0) / self.scale
+            boxes[k] += (dx, dy, dx, dy)
+            if masks is not None and (abs(dx) >= 0.5 or abs(dy) >= 0.5):
+                mh, mw = masks[k].shape
+                shift = np.float32([[1, 0, dx * mw / w], [0, 1, dy * mh / h]])
+                masks[k] = cv2.warpAffine(masks[k].astype(np.uint8), shift, (mw, mh),
+                                          flags=cv2.INTER_NEAREST) > 0
+
+        detections['boxes'] = boxes
+        detections['masks'] = masks
+        self.detections = detections
+        self.points = nxt[good].reshape(-1, 1, 2)
+        self.point_owner = self.point_owner[good]
+        self.prev_gray = gray
+        return detections
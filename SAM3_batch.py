@@ -0,0 +1,310 @@
+"""SAM3 無介面批次分割 (圖片資料夾 / 影片檔)
+
+解碼、推理、寫檔各自一個執行緒，以有上限的佇列串接；結果寫到 runs/segment/predictN。
+輸出檔名取自輸入相對於所有輸入共同上層資料夾的路徑，並保留原副檔名
+(a/img1.jpg → a__img1_jpg.jpg、x.mp4 → x_mp4.mp4)，不同資料夾的同名檔案或同名不同格式不會互相覆蓋。
+除了標註後的 JPEG/MP4，每個輸入另存 .rle (RLE mask、box、分數、prompt)，
+可用 mask_store.MaskStoreReader 依幀號讀回重新繪製或篩選，不需 GPU。
+有任何一幀推理失敗的輸入不記入 processed.txt (--resume 時重新處理)，結束時列出並以 exit code 1 結束。
+
+用法:
+    python SAM3_batch.py images/ line_video.mp4 --prompt dice
+    python SAM3_batch.py images/ --prompt dice --resume     # 沿用最新的 predictN，跳過已完成的輸入
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from queue import Queue
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "SAM3_GUI"))
+import device_profile
+import model_loader
+from mask_store import MaskStoreWriter
+from overlay import OverlayRenderer, extract_detections
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v"}
+MANIFEST = "processed.txt"  # 已完成的輸入 (每行一個絕對路徑)
+DONE = None  # 佇列結束標記
+
+
+def collect_inputs(paths):
+    inputs = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            inputs.extend(sorted(f for f in p.iterdir() if f.suffix.lower() in IMAGE_EXTS | VIDEO_EXTS))
+        elif p.suffix.lower() in IMAGE_EXTS | VIDEO_EXTS:
+            inputs.append(p)
+        else:
+            print(f"略過不支援的輸入: {p}")
+    return [p.resolve() for p in inputs]
+
+
+def output_names(inputs):
+    """每個輸入的輸出檔名 (不含副檔名)；依完整輸入清單計算，--resume 時與第一次執行相同"""
+    try:
+        root = Path(os.path.commonpath([p.parent for p in inputs]))
+    except ValueError:  # 空清單或 Windows 上位於不同磁碟
+        root = None
+    names = {}
+    used = set()
+    for path in inputs:
+        relative = path.relative_to(root) if root else path.relative_to(path.anchor)
+        base = "__".join(relative.parent.parts + (f"{relative.stem}_{relative.suffix.lstrip('.').lower()}",))
+        name, n = base, 2
+        while name in used:
+            name, n = f"{base}_{n}", n + 1
+        used.add(name)
+        names[path] = name
+    return names
+
+
+def run_dir_for(project, name, resume):
+    """與 ultralytics 相同的命名: predict, predict2, predict3 ..."""
+    project = Path(project)
+
+    def candidate(i):
+        return project / (name if i == 1 else f"{name}{i}")
+
+    i = 1
+    while candidate(i).exists():
+        i += 1
+    if resume and i > 1:
+        return candidate(i - 1)
+    return candidate(i)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.busy = {'decode': 0.0, 'infer': 0.0, 'write': 0.0}
+
+    def add(self, stage, seconds, frames=0):
+        with self.lock:
+            self.busy[stage] += seconds
+            self.frames += frames
+
+
+def run_stage(name, target, in_q, out_q, stop, errors, *args):
+    """執行一個階段；不論正常結束或例外，都往下游送出 DONE
+
+    例外時記錄到 errors 並設定 stop (上游停止產生新資料)，再把輸入佇列讀到 DONE 為止，
+    讓上游卡在 put 的執行緒能結束；main 在 join 後以非零 exit code 結束。
+    """
+    try:
+        target(*args)
+    except BaseException as e:
+        errors.append((name, e))
+        print(f"{name} 階段失敗:")
+        traceback.print_exc()
+        stop.set()
+        if in_q is not None:
+            while in_q.get() is not DONE:
+                pass
+    finally:
+        if out_q is not None:
+            out_q.put(DONE)
+
+
+def decode_stage(inputs, out_q, stats, stop):
+    for path in inputs:
+        if stop.is_set():
+            break
+        start = time.perf_counter()
+        if path.suffix.lower() in IMAGE_EXTS:
+            frame = cv2.imread(str(path))
+            stats.add('decode', time.perf_counter() - start)
+            if frame is None:
+                print(f"無法讀取: {path}")
+                continue
+            out_q.put(('frame', path, 0, frame))
+            out_q.put(('end', path, None, None))
+            continue
+
+        cap = cv2.VideoCapture(str(path))
+        if not cap.isOpened():
+            print(f"無法開啟影片: {path}")
+            continue
+        out_q.put(('start', path, cap.get(cv2.CAP_PROP_FPS) or 30.0, None))
+        index = 0
+        while not stop.is_set():
+            ret, frame = cap.read()
+            stats.add('decode', time.perf_counter() - start)
+            if not ret:
+                break
+            out_q.put(('frame', path, index, frame))
+            index += 1
+            start = time.perf_counter()
+        cap.release()
+        if not stop.is_set():
+            out_q.put(('end', path, None, None))
+
+
+def inference_stage(predictor, prompt, in_q, out_q, stats, stop):
+    while True:
+        item = in_q.get()
+        if item is DONE:
+            break
+        if stop.is_set():
+            continue  # 其他階段已失敗: 只把佇列讀完
+        kind, path, index, frame = item
+        if kind != 'frame':
+            out_q.put(item)
+            continue
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            predictor.set_image(frame)
+            results = predictor(text=prompt)
+            detections = extract_detections(results[0]) if results else None
+        except Exception as e:
+            print(f"推理失敗 {path.name}#{index}: {e}")
+            detections = None
+            failed = True
+        stats.add('infer', time.perf_counter() - start)
+        out_q.put(('frame', path, index, (frame, detections, failed)))
+
+
+def write_stage(run_dir, names, in_q, stats, stop, prompt, failed, save_masks=True):
+    """寫出標註結果與 mask；有任何一幀推理失敗的輸入加入 failed (path → 失敗幀數)，不寫入 manifest"""
+    renderer = OverlayRenderer()
+    writers = {}
+    stores = {}
+    video_fps = {}
+    manifest = open(run_dir / MANIFEST, "a", encoding="utf-8")
+    try:
+        while True:
+            item = in_q.get()
+            if item is DONE:
+                break
+            if stop.is_set():
+                continue  # 其他階段已失敗: 未完成的輸入不寫入 manifest，續跑時重新處理
+            kind, path, index, payload = item
+            start = time.perf_counter()
+
+            if kind == 'start':
+                video_fps[path] = index
+            elif kind == 'frame':
+                frame, detections, frame_failed = payload
+                if frame_failed:
+                    failed[path] = failed.get(path, 0) + 1
+                if save_masks:
+                    store = stores.get(path)
+                    if store is None:
+                        store = stores[path] = MaskStoreWriter(run_dir / f"{names[path]}.rle")
+                    store.write(index, detections, prompt)
+                annotated = renderer.render(frame, detections)
+                if path.suffix.lower() in IMAGE_EXTS:
+                    cv2.imwrite(str(run_dir / f"{names[path]}.jpg"), annotated)
+                else:
+                    writer = writers.get(path)
+                    if writer is None:
+                        h, w = annotated.shape[:2]
+                        writer = cv2.VideoWriter(str(run_dir / f"{names[path]}.mp4"),
+                                                 cv2.VideoWriter_fourcc(*"mp4v"),
+                                                 video_fps.get(path, 30.0), (w, h))
+                        writers[path] = writer
+                    writer.write(annotated)
+                stats.add('write', time.perf_counter() - start, frames=1)
+            else:
+                # 一個輸入全部寫完才記錄，中斷後續跑時會重新處理
+                writer = writers.pop(path, None)
+                if writer is not None:
+                    writer.release()
+                store = stores.pop(path, None)
+                if store is not None:
+                    store.close()
+                video_fps.pop(path, None)
+                if path not in failed:  # 推理失敗的輸入不記錄，--resume 時重新處理
+                    manifest.write(f"{path}\n")
+                    manifest.flush()
+                stats.add('write', time.perf_counter() - start)
+    finally:
+        for writer in writers.values():
+            writer.release()
+        for store in stores.values():
+            store.close()
+        manifest.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="圖片資料夾、圖片或影片檔")
+    parser.add_argument("--prompt", nargs="+", default=["dice"], help="文字提示")
+    parser.add_argument("--model", default="sam3.pt")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--project", default="runs/segment")
+    parser.add_argument("--name", default="predict")
+    parser.add_argument("--resume", action="store_true", help="沿用最新的輸出資料夾並跳過已完成的輸入")
+    parser.add_argument("--no-masks", action="store_true", help="不輸出 .rle mask 結果檔")
+    parser.add_argument("--queue-size", type=int, default=8, help="各階段之間的佇列上限")
+    parser.add_argument("--profile", default="auto", choices=["auto", *device_profile.PROFILES])
+    parser.add_argument("--imgsz", type=int)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--warmup", type=int, default=1, help="開始計時前以假畫面暖機的次數")
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.inputs)
+    run_dir = run_dir_for(args.project, args.name, args.resume)
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = run_dir / MANIFEST
+    done = set(manifest.read_text(encoding="utf-8").split("\n")) if manifest.exists() else set()
+    pending = [p for p in inputs if str(p) not in done]
+    print(f"輸出: {run_dir} | 輸入 {len(inputs)} 個，略過已完成 {len(inputs) - len(pending)} 個")
+    if not pending:
+        return
+
+    profile = device_profile.resolve_profile(args.profile, imgsz=args.imgsz, threads=args.threads)
+    predictor, startup = model_loader.load_predictor(args.model, profile, conf=args.conf)
+    startup.update(model_loader.warmup(predictor, args.warmup, prompt=args.prompt))
+    print(f"執行設定: {device_profile.describe(profile)}")
+    print(f"啟動計時: {model_loader.format_startup(startup)}")
+
+    stats = Stats()
+    decoded_q = Queue(maxsize=args.queue_size)
+    result_q = Queue(maxsize=args.queue_size)
+    stop = threading.Event()
+    errors = []
+    failed = {}  # path → 推理失敗的幀數
+    stages = [
+        threading.Thread(target=run_stage, daemon=True, args=(
+            'decode', decode_stage, None, decoded_q, stop, errors, pending, decoded_q, stats, stop)),
+        threading.Thread(target=run_stage, daemon=True, args=(
+            'infer', inference_stage, decoded_q, result_q, stop, errors,
+            predictor, args.prompt, decoded_q, result_q, stats, stop)),
+        threading.Thread(target=run_stage, daemon=True, args=(
+            'write', write_stage, result_q, None, stop, errors,
+            run_dir, output_names(inputs), result_q, stats, stop, args.prompt, failed, not args.no_masks)),
+    ]
+
+    start = time.perf_counter()
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+    elapsed = time.perf_counter() - start
+
+    fps = stats.frames / elapsed if elapsed > 0 else 0.0
+    print(f"完成 {stats.frames} 幀，耗時 {elapsed:.1f}s，吞吐量 {fps:.2f} FPS")
+    for stage, busy in stats.busy.items():
+        per_frame = busy / stats.frames * 1000 if stats.frames else 0.0
+        print(f"  {stage:<6} {busy:7.1f}s  ({per_frame:.1f} ms/frame, 使用率 {busy / elapsed:.0%})")
+    for path, count in failed.items():
+        print(f"推理失敗: {path} ({count} 幀)；未記入 {MANIFEST}，可用 --resume 重新處理")
+    for name, error in errors:
+        print(f"錯誤: {name} 階段 {type(error).__name__}: {error}；未完成的輸入未記入 {MANIFEST}，可用 --resume 續跑")
+    if errors or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
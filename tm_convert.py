@@ -0,0 +1,163 @@
+"""把 Teachable Machine 的 keras_model.h5 轉成 TFLite (float16 / int8)，並與 Keras 比較
+
+- float16: 權重存成 float16，檔案約為一半，CPU 上仍以 float32 計算
+- int8: 權重與激活值都量化成 int8，需要一個校正圖片資料夾 (建議 100~300 張實際畫面)；
+  輸入輸出維持 float32，app 不必改前處理
+- 轉出的檔案放在模型旁邊 (keras_model_float16.tflite / keras_model_int8.tflite)，
+  app 以 TM_BACKEND=float16 / int8 (及 TM_THREADS) 切換，見 tm_engine.load_engine
+- --compare 會為每個 backend 各開一個子行程，量載入時間、常駐記憶體、單張延遲與 top-1 與 Keras 的一致率
+
+用法:
+    python tm_convert.py HarryAIProject/keras_model.h5 --calib captures/ --compare captures/ --threads 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def tflite_path(model_path, kind):
+    return f"{os.path.splitext(model_path)[0]}_{kind}.tflite"
+
+
+def convert(model_path, kind, calib_files=()):
+    """kind: "float16" 或 "int8"；回傳寫出的 .tflite 路徑"""
+    import cv2
+    import tensorflow as tf
+    from tm_engine import load_keras_model, preprocess_frame
+
+    model = load_keras_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if kind == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        if not calib_files:
+            raise ValueError("int8 conversion needs calibration images (--calib)")
+        _, height, width, channels = model.input_shape
+
+        def representative_dataset():
+            # 與 app 推理時相同的前處理，量化範圍才會對得上實際輸入
+            data = np.empty((1, height, width, channels), dtype=np.float32)
+            for path in calib_files:
+                image = cv2.imread(path)
+                if image is not None:
+                    preprocess_frame(image, data[0])
+                    yield [data]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    output = tflite_path(model_path, kind)
+    with open(output, 'wb') as f:
+        f.write(converter.convert())
+    return output
+
+
+def resident_mb():
+    """目前的常駐記憶體 (MB)；沒有 psutil 時讀 /proc (Linux)，都沒有時回傳 nan
+
+    不用 getrusage 的 ru_maxrss：Linux 上子行程 exec 後會沿用父行程的峰值。
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return float('nan')
+
+
+def probe(model_path, backend, files, threads, runs):
+    """在目前行程載入一個 backend 並量測 (由 --compare 在子行程呼叫)"""
+    start = time.perf_counter()
+    import cv2
+    from tm_engine import load_engine
+    engine = load_engine(model_path, backend=backend, threads=threads)
+    load_s = time.perf_counter() - start
+
+    top1 = []
+    for path in files:
+        image = cv2.imread(path)
+        top1.append(engine.classify(image, top_k=1)[0][0] if image is not None else None)
+
+    data = engine.buffer[:1]
+    if files:
+        engine.preprocess(cv2.imread(files[0]), data[0])
+    timings = []
+    for _ in range(runs):
+        engine.predict(data)
+        timings.append(engine.last_ms)
+    return {
+        'backend': backend,
+        'model': engine.model_path,
+        'load_s': load_s,
+        'rss_mb': resident_mb(),
+        'latency_ms': float(np.median(timings)),
+        'top1': top1,
+    }
+
+
+def compare(model_path, backends, files, threads, runs):
+    """每個 backend 各開一個子行程 (記憶體與載入時間才不會互相影響)"""
+    reports = []
+    for backend in backends:
+        command = [sys.executable, os.path.abspath(__file__), model_path, '--probe', backend,
+                   '--runs', str(runs), '--images', *files]
+        if threads:
+            command += ['--threads', str(threads)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = reports[0]['top1']
+    print(f"{'backend':<10}{'size MB':>9}{'load s':>9}{'RSS MB':>9}{'latency ms':>12}{'top-1 agree':>13}")
+    for report in reports:
+        size = os.path.getsize(report['model']) / 2 ** 20
+        agree = np.mean([a == b for a, b in zip(report['top1'], reference)]) if reference else float('nan')
+        print(f"{report['backend']:<10}{size:>9.2f}{report['load_s']:>9.2f}{report['rss_mb']:>9.0f}"
+              f"{report['latency_ms']:>12.2f}{agree:>13.1%}")
+    return reports
+
+
+def main():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="keras_model.h5 → TFLite float16 / int8 與比較")
+    parser.add_argument("model", help="keras_model.h5")
+    parser.add_argument("--types", nargs="+", choices=["float16", "int8"], default=["float16", "int8"])
+    parser.add_argument("--calib", nargs="+", default=[], help="int8 校正用的圖片資料夾或 glob")
+    parser.add_argument("--calib-limit", type=int, default=300, help="最多使用的校正圖片數")
+    parser.add_argument("--compare", nargs="+", default=[], help="比較 top-1 一致率用的圖片資料夾或 glob")
+    parser.add_argument("--threads", type=int, help="TFLite interpreter 執行緒數")
+    parser.add_argument("--runs", type=int, default=50, help="延遲量測次數")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--images", nargs="*", default=[], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    from tm_engine import list_images
+
+    if args.probe:
+        print(json.dumps(probe(args.model, args.probe, args.images, args.threads, args.runs)))
+        return
+
+    calib_files = list_images(args.calib, args.calib_limit)
+    for kind in args.types:
+        if kind == 'int8' and not calib_files:
+            print("int8: skipped, no calibration images (--calib)")
+            continue
+        start = time.perf_counter()
+        output = convert(args.model, kind, calib_files)
+        print(f"{kind}: {output} ({os.path.getsize(output) / 2 ** 20:.2f} MB, {time.perf_counter() - start:.1f} s)")
+
+    if args.compare:
+        backends = ['keras'] + [kind for kind in args.types if os.path.exists(tflite_path(args.model, kind))]
+        compare(args.model, backends, list_images(args.compare), args.threads, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""Teachable Machine (Keras) 分類引擎：AIProject / HarryAIProject 各 demo app 共用
+
+- keras_model.h5 與 labels.txt 只載入一次，標籤去掉前面的類別編號 ("0 Cat" → "Cat")
+- 輸入寫進預先配置的 float32 緩衝區，不再每幀建立 np.ndarray((1,224,224,3))
+- 以 tf.function 追蹤過的 model(x, training=False) 推理，不經 model.predict
+  (predict 每次呼叫都會建立 data adapter 與 callbacks，單張影像時這些額外成本比推理本身還大)
+- 前處理直接在 OpenCV 陣列上完成 (preprocess_frame)：中心裁切 (view) → INTER_AREA 縮小 →
+  原地換色 → 正規化直接寫進緩衝區，不經 PIL 與 Lanczos；PIL 版本 (preprocess_pil) 保留做比對
+- TFLiteEngine 以 TFLite interpreter 執行 tm_convert.py 轉出的 float16 / int8 模型，
+  有安裝 ai-edge-litert 或 tflite-runtime 時完全不必載入 TensorFlow
+
+用法:
+    engine = load_engine("keras_model.h5")               # TM_BACKEND=int8 時改用 keras_model_int8.tflite
+    for name, score in engine.classify(frame, top_k=3):   # BGR ndarray 或 PIL RGB 影像
+        ...
+"""
+import glob
+import os
+import threading
+import time
+import warnings
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def strip_label(line):
+    """labels.txt 的一行 "0 Class 2" → "Class 2" (沒有編號時原樣回傳)"""
+    line = line.strip()
+    index, _, name = line.partition(" ")
+    return name if index.isdigit() and name else line
+
+
+def load_labels(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [strip_label(line) for line in f if line.strip()]
+
+
+def find_model(*candidates):
+    """回傳第一個存在的 keras_model.h5 (及同資料夾的 labels.txt)；都不存在時回傳 (None, None)"""
+    for path in candidates:
+        if path and os.path.isdir(path):
+            path = os.path.join(path, "keras_model.h5")
+        if path and os.path.exists(path):
+            return path, os.path.join(os.path.dirname(path), "labels.txt")
+    return None, None
+
+
+def list_images(paths, limit=None):
+    """資料夾 (遞迴) 或 glob pattern → 排序後的圖片路徑"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, '**', '*')
+        files.extend(f for f in glob.glob(path, recursive=True) if f.lower().endswith(IMAGE_EXTENSIONS))
+    files = sorted(set(files))
+    return files[:limit] if limit else files
+
+
+def fit_box(width, height, size):
+    """與 ImageOps.fit 相同的置中裁切範圍 (x, y, w, h)，裁切後長寬比等於 size=(w, h)"""
+    ratio = size[0] / size[1]
+    if width / height > ratio:
+        crop_w, crop_h = round(height * ratio), height
+    else:
+        crop_w, crop_h = width, round(width / ratio)
+    return (width - crop_w) // 2, (height - crop_h) // 2, crop_w, crop_h
+
+
+def preprocess_frame(image, out, bgr=True):
+    """uint8 影像 (BGR 或 RGB) → 中心裁切 → 縮放 → RGB [-1, 1]，寫入 out (h, w, 3) float32
+
+    裁切只是 view，縮放只產生一張輸入尺寸的 uint8 影像，換色在這張小圖上原地完成，
+    正規化直接寫進 out，不另外配置 float 陣列。
+    縮小用 INTER_AREA (抗鋸齒)；比輸入尺寸還小的畫面放大時 INTER_AREA 會退化成雙線性，
+    改用 INTER_CUBIC，結果較接近原本的 Lanczos。
+    """
+    height, width = out.shape[:2]
+    x, y, crop_w, crop_h = fit_box(image.shape[1], image.shape[0], (width, height))
+    crop = image[y:y + crop_h, x:x + crop_w]
+    interpolation = cv2.INTER_AREA if crop_w >= width else cv2.INTER_CUBIC
+    small = cv2.resize(crop, (width, height), interpolation=interpolation)
+    if bgr:
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=small)
+    np.multiply(small, 1 / 127.5, out=out, casting='unsafe')
+    out -= 1.0
+    return out
+
+
+def preprocess_pil(image, out):
+    """原本各 app 的做法: ImageOps.fit (Lanczos) → (x / 127.5) - 1；image 為 PIL 影像或 BGR ndarray"""
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    image = ImageOps.fit(image.convert("RGB"), (out.shape[1], out.shape[0]), Image.Resampling.LANCZOS)
+    out[...] = (np.asarray(image).astype(np.float32) / 127.5) - 1
+    return out
+
+
+def load_keras_model(path):
+    import tensorflow as tf
+    tf.get_logger().setLevel('ERROR')
+    warnings.filterwarnings("ignore")
+    try:
+        from tf_keras.models import load_model  # TF 2.16+ 的 Keras 3 無法讀取 Teachable Machine 的 h5
+    except ImportError:
+        from tensorflow.keras.models import load_model
+    return load_model(path, compile=False)
+
+
+class TMEngine:
+    """載入一次、可在多個執行緒呼叫 (緩衝區以 lock 保護) 的 Teachable Machine 分類器"""
+
+    def __init__(self, model_path, labels_path=None, batch_size=1):
+        import tensorflow as tf
+
+        labels_path = labels_path or os.path.join(os.path.dirname(model_path), "labels.txt")
+        self.model_path = model_path
+        self.model = load_keras_model(model_path)
+        self.labels = load_labels(labels_path)
+
+        _, height, width, channels = self.model.input_shape
+        self.input_size = (width, height)
+        self.buffer = np.empty((batch_size, height, width, channels), dtype=np.float32)
+        self.lock = threading.Lock()
+
+        # batch 維度不固定，不同 batch 大小不會重新追蹤
+        signature = [tf.TensorSpec((None, height, width, channels), tf.float32)]
+        self.forward = tf.function(lambda x: self.model(x, training=False), input_signature=signature)
+        self.forward(tf.zeros((1, height, width, channels), tf.float32))  # 先追蹤，第一幀不必等
+        self.last_ms = 0.0
+
+    def preprocess(self, image, out):
+        """中心裁切縮放到模型輸入尺寸並正規化到 [-1, 1]，寫入 out (height, width, 3) float32
+
+        image: OpenCV 的 BGR ndarray，或 PIL RGB 影像
+        """
+        if isinstance(image, np.ndarray):
+            return preprocess_frame(image, out)
+        return preprocess_frame(np.asarray(image.convert("RGB")), out, bgr=False)
+
+    def predict(self, batch):
+        """已正規化的 (n, h, w, 3) float32 → (n, 類別數) 機率"""
+        start = time.perf_counter()
+        probs = self.forward(batch).numpy()
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return probs
+
+    def top_k(self, probs, k=1):
+        """單張影像的機率 → [(標籤, 分數), ...] 由高到低"""
+        k = min(k, len(probs))
+        order = np.argpartition(-probs, k - 1)[:k]
+        order = order[np.argsort(-probs[order])]
+        return [(self.labels[i] if i < len(self.labels) else str(i), float(probs[i])) for i in order]
+
+    def classify(self, image, top_k=1):
+        with self.lock:
+            data = self.buffer[:1]
+            self.preprocess(image, data[0])
+            probs = self.predict(data)[0]
+        return self.top_k(probs, top_k)
+
+    def classify_batch(self, images, top_k=1):
+        """多張影像一次推理 (最多 batch_size 張一組)"""
+        results = []
+        with self.lock:
+            for start in range(0, len(images), len(self.buffer)):
+                chunk = images[start:start + len(self.buffer)]
+                data = self.buffer[:len(chunk)]
+                for slot, image in zip(data, chunk):
+                    self.preprocess(image, slot)
+                results.extend(self.top_k(p, top_k) for p in self.predict(data))
+        return results
+
+
+def load_interpreter(path, threads=None):
+    """優先用輕量的 ai-edge-litert / tflite-runtime，都沒有時才用 TensorFlow 內建的 tf.lite"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=threads)
+
+
+class TFLiteEngine(TMEngine):
+    """與 TMEngine 相同的介面，推理改由 TFLite interpreter 執行 (threads: interpreter 執行緒數)"""
+
+    def __init__(self, model_path, labels_path=None, batch_size=1, threads=None):
+        labels_path = labels_path or os.path.join(os.path.dirname(model_path), "labels.txt")
+        self.model_path = model_path
+        self.model = None
+        self.labels = load_labels(labels_path)
+        self.interpreter = load_interpreter(model_path, threads)
+
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        _, height, width, channels = self.input_detail['shape']
+        self.input_size = (int(width), int(height))
+        self.buffer = np.empty((batch_size, height, width, channels), dtype=np.float32)
+        self.lock = threading.Lock()
+        self.batch = 0
+        self.resize(batch_size)
+        self.last_ms = 0.0
+
+    def resize(self, batch):
+        """輸入 batch 大小改變時才重新配置 interpreter 的張量"""
+        if batch != self.batch:
+            _, height, width, channels = self.input_detail['shape']
+            self.interpreter.resize_tensor_input(self.input_detail['index'], (batch, height, width, channels))
+            self.interpreter.allocate_tensors()
+            self.batch = batch
+
+    def predict(self, batch):
+        start = time.perf_counter()
+        self.resize(len(batch))
+        dtype = self.input_detail['dtype']
+        if dtype != np.float32:  # 整數輸入的模型: 依輸入的 scale / zero point 量化
+            scale, zero_point = self.input_detail['quantization']
+            batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max)
+        self.interpreter.set_tensor(self.input_detail['index'], batch.astype(dtype, copy=False))
+        self.interpreter.invoke()
+        probs = self.interpreter.get_tensor(self.output_detail['index'])
+        if probs.dtype != np.float32:
+            scale, zero_point = self.output_detail['quantization']
+            probs = (probs.astype(np.float32) - zero_point) * scale
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return probs
+
+
+def load_engine(model_path, labels_path=None, batch_size=1, backend=None, threads=None):
+    """依副檔名或 backend 選擇推理引擎
+
+    backend: "keras" / "float16" / "int8"，預設讀環境變數 TM_BACKEND (沒設定時為 keras)；
+    float16 / int8 會使用 keras_model.h5 旁邊由 tm_convert.py 轉出的 keras_model_<backend>.tflite，
+    檔案不存在時退回 Keras。threads 預設讀 TM_THREADS。
+    """
+    backend = backend or os.environ.get("TM_BACKEND", "keras")
+    threads = threads or int(os.environ.get("TM_THREADS", 0)) or None
+    labels_path = labels_path or os.path.join(os.path.dirname(model_path), "labels.txt")
+    if backend != "keras" and not model_path.endswith(".tflite"):
+        tflite_path = f"{os.path.splitext(model_path)[0]}_{backend}.tflite"
+        if os.path.exists(tflite_path):
+            model_path = tflite_path
+        else:
+            print(f"{tflite_path} not found, using the Keras model")
+    if model_path.endswith(".tflite"):
+        return TFLiteEngine(model_path, labels_path, batch_size, threads)
+    return TMEngine(model_path, labels_path, batch_size)
+
+
+def benchmark(engine, runs=50):
+    """單張推理延遲 (ms, 中位數)；Keras 引擎另外量 model.predict 做比較"""
+    data = engine.buffer[:1]
+    data[...] = 0.0
+    name = 'tflite' if engine.model is None else 'tf.function'
+    timings = {name: []}
+    if engine.model is not None:
+        engine.model.predict(data, verbose=0)
+        timings['predict'] = []
+    engine.predict(data)
+    for _ in range(runs):
+        if engine.model is not None:
+            start = time.perf_counter()
+            engine.model.predict(data, verbose=0)
+            timings['predict'].append((time.perf_counter() - start) * 1000)
+        engine.predict(data)
+        timings[name].append(engine.last_ms)
+    return {name: float(np.median(values)) for name, values in timings.items()}
+
+
+def check_preprocess(engine, images, runs=50):
+    """preprocess_frame 與 preprocess_pil 的一致性與速度
+
+    回傳 {'max_diff', 'mean_diff', 'prob_diff', 'top1_agree', 'pil_ms', 'opencv_ms'}；
+    像素差以 [-1, 1] 的數值計，prob_diff 是同一個模型輸出機率的最大差，
+    top1_agree 是兩種前處理的 top-1 類別相同的比例。
+    """
+    ref = np.empty_like(engine.buffer[:1])
+    fast = np.empty_like(ref)
+    diffs, agree = [], 0
+    for image in images:
+        preprocess_pil(image, ref[0])
+        preprocess_frame(image, fast[0])
+        diff = np.abs(ref - fast)
+        ref_probs, fast_probs = engine.predict(ref)[0], engine.predict(fast)[0]
+        diffs.append((float(diff.max()), float(diff.mean()), float(np.abs(ref_probs - fast_probs).max())))
+        agree += int(np.argmax(ref_probs) == np.argmax(fast_probs))
+
+    timings = {'pil': [], 'opencv': []}
+    for _ in range(runs):
+        for image in images:
+            start = time.perf_counter()
+            preprocess_pil(image, ref[0])
+            timings['pil'].append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            preprocess_frame(image, fast[0])
+            timings['opencv'].append((time.perf_counter() - start) * 1000)
+    return {
+        'max_diff': max(d[0] for d in diffs),
+        'mean_diff': float(np.mean([d[1] for d in diffs])),
+        'prob_diff': max(d[2] for d in diffs),
+        'top1_agree': agree / len(images),
+        'pil_ms': float(np.median(timings['pil'])),
+        'opencv_ms': float(np.median(timings['opencv'])),
+    }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Teachable Machine 分類 / 延遲比較")
+    parser.add_argument("model", nargs="?", default="keras_model.h5", help="keras_model.h5 或 .tflite")
+    parser.add_argument("images", nargs="*", help="要分類的圖片")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--backend", choices=["keras", "float16", "int8"], help="預設讀 TM_BACKEND")
+    parser.add_argument("--threads", type=int, help="TFLite interpreter 執行緒數")
+    parser.add_argument("--bench", type=int, default=0, help="比較 model.predict 與 tf.function 的次數")
+    parser.add_argument("--check-preprocess", type=int, default=0, metavar="RUNS",
+                        help="比較 OpenCV 與 PIL 前處理的差異、top-1 一致率與速度 (沒給圖片時用 1280x720 隨機畫面)")
+    args = parser.parse_args()
+
+    engine = load_engine(args.model, backend=args.backend, threads=args.threads)
+    images = []
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"{path}: cannot read")
+            continue
+        images.append(image)
+        results = ", ".join(f"{name} {score:.2%}" for name, score in engine.classify(image, args.top_k))
+        print(f"{path}: {results}")
+    if args.bench:
+        for name, ms in benchmark(engine, args.bench).items():
+            print(f"{name:<12} {ms:.2f} ms")
+    if args.check_preprocess:
+        if not images:
+            rng = np.random.default_rng(0)
+            images = [cv2.GaussianBlur(rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8), (0, 0), 3)
+                      for _ in range(8)]
+        report = check_preprocess(engine, images, args.check_preprocess)
+        print(f"max |diff| {report['max_diff']:.4f}  mean |diff| {report['mean_diff']:.4f}  "
+              f"max |prob diff| {report['prob_diff']:.4f}  top-1 agree {report['top1_agree']:.0%}")
+        print(f"pil        {report['pil_ms']:.2f} ms")
+        print(f"opencv     {report['opencv_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()